@@ -52,7 +52,6 @@ def main():
         mesh_width, mesh_height,
         generate_numpy_begin(mesh.buffer),
         tile_width, tile_height,
-        generate_numpy_begin(image.coordinate_image),
         generate_numpy_begin(image.buffer)
     )
 
@@ -205,7 +205,6 @@ def render_mesh(mesh):
             generate_numpy_begin(mesh.bounds),
             tile_width, tile_height,
             tile.bounds,
-            generate_numpy_begin(tile.coordinate_image),
             generate_numpy_begin(tile.buffer)
         )
 
@@ -186,7 +186,6 @@ def render_mesh(mesh):
             generate_numpy_begin(mesh.bounds),
             tile_rows, tile_columns,
             tile.bounds,
-            generate_numpy_begin(tile.coordinate_image),
             generate_numpy_begin(tile.buffer)
         )
 
@@ -77,12 +77,10 @@ def render_frame(frame_no, frame_count):
         cache = render_mesh(mesh)
         cache.composite_into(canvas)
 
-    buffer = array_view(canvas.downsample(1))
-    buffer = np.clip(buffer, 0., 1.)
-    buffer = (255 * buffer).astype(np.uint8)
+    buffer = canvas.downsample_to_pixels(1)
 
     frame_path = 'render/008/frame_{:03}.tiff'.format(frame_no)
-    save_array_as_image(pixel_view(buffer), frame_path, 'RGBA')
+    save_array_as_image(buffer, frame_path, 'RGBA')
 
     return frame_path
 
@@ -0,0 +1,136 @@
+from handsome.MicropolygonMesh import MicropolygonMesh
+from handsome.Pixel import FloatPixel
+from handsome.TileCache import TileCache
+from handsome.tile_order import TILE_ORDERS
+from handsome.util import render_mesh
+from collections import OrderedDict
+import math
+import numpy as np
+import time
+
+# Compares the tile orders of TileCache on one large mesh. Each order is
+# scored by replaying the mesh data its fill reads, tile by tile, through a
+# least recently used cache of 64 byte lines the size of a typical L2 cache,
+# and by timing render_mesh. Every line misses once whatever the order, so
+# the orders differ in the misses on lines read before and since evicted.
+
+LINE_BYTES = 64
+CACHE_BYTES = 2 ** 20
+
+
+def main():
+    mesh = make_mesh(384)
+    tile_shape = (16, 16)
+
+    # Touch the lazy arrays up front so they are not built inside the timings
+    mesh.bounds
+    mesh.inverter_coefficients
+
+    bins = mesh.tile_bins(tile_shape)
+    arrays = (mesh.buffer, mesh.bounds, mesh.inverter_coefficients)
+
+    print('{:>8} {:>12} {:>10} {:>10} {:>10}'.format('order', 'lines read', 'misses', 'repeated', 'ms'))
+
+    for order in TILE_ORDERS:
+        cache = TileCache(tile_shape, 2, FloatPixel, tile_order=order)
+        origins = cache.order_origins(bins.origins())
+
+        misses, reads, lines = count_misses(origins, bins, arrays, mesh.buffer.shape[1])
+
+        timings = [ ]
+
+        for _ in range(3):
+            cache = TileCache(tile_shape, 2, FloatPixel, tile_order=order)
+
+            start = time.perf_counter()
+            render_mesh(mesh, tile_shape, 2, cache=cache)
+            timings.append(time.perf_counter() - start)
+
+            cache.clear()
+
+        print('{:>8} {:>12} {:>10} {:>10} {:>10.1f}'.format(
+            order, reads, misses, misses - lines, 1000 * min(timings)
+        ))
+
+
+# A mesh of n by n cells swept around a quarter circle with the near edge
+# closer to the camera than the far one, so it takes the rational fill.
+def make_mesh(n):
+    mesh = MicropolygonMesh((n, n))
+
+    u, v = np.meshgrid(np.linspace(0, 1, n + 1), np.linspace(1, 0, n + 1))
+
+    angle = .5 * math.pi * u
+    radius = 64 + 896 * v
+    z = 1 + .5 * u
+
+    mesh.buffer[:,:]['position']['x'] = z * (32 + radius * np.cos(angle))
+    mesh.buffer[:,:]['position']['y'] = z * (32 + radius * np.sin(angle))
+    mesh.buffer[:,:]['position']['z'] = z
+    mesh.buffer[:,:]['position']['w'] = 1
+
+    mesh.buffer[:,:]['color']['R'] = u
+    mesh.buffer[:,:]['color']['G'] = v
+    mesh.buffer[:,:]['color']['A'] = 1
+
+    return mesh
+
+
+# Replays the lines of the vertices, bounds and inverter coefficients each
+# binned cell reads. Returns the misses, the total lines read and the number
+# of distinct lines.
+def count_misses(origins, bins, arrays, mesh_columns):
+    lru = OrderedDict()
+    seen = set()
+    capacity = CACHE_BYTES // LINE_BYTES
+    misses, reads = 0, 0
+
+    vertices, bounds, coefficients = arrays
+
+    for origin in origins:
+        cells = bins.get_cells(origin).astype(np.int64)
+        rows, columns = np.divmod(cells, mesh_columns - 1)
+
+        first = rows * mesh_columns + columns
+        corners = np.concatenate([ first, first + 1, first + mesh_columns, first + mesh_columns + 1 ])
+
+        lines = np.concatenate([
+            lines_of(vertices, corners),
+            lines_of(bounds, cells),
+            lines_of(coefficients, cells),
+        ])
+
+        lines = lines.tolist()
+        seen.update(lines)
+
+        for line in lines:
+            reads += 1
+
+            if line in lru:
+                lru.move_to_end(line)
+                continue
+
+            misses += 1
+            lru[line] = None
+
+            if len(lru) > capacity:
+                lru.popitem(last=False)
+
+    return misses, reads, len(seen)
+
+
+def lines_of(array, indices):
+    begin = array.ctypes.data + indices * array.itemsize
+    end = begin + array.itemsize - 1
+
+    first, last = begin // LINE_BYTES, end // LINE_BYTES
+    lines = [ first ]
+
+    for k in range(1, int((last - first).max()) + 1):
+        lines.append(np.where(first + k <= last, first + k, first))
+
+    return np.unique(np.concatenate(lines))
+
+
+if __name__ == '__main__':
+    main()
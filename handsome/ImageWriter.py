@@ -0,0 +1,447 @@
+__all__ = [
+    'BMPWriter',
+    'ImageWriter',
+    'NPYWriter',
+    'PAMWriter',
+    'PNGWriter',
+    'PPMWriter',
+    'RawImageWriter',
+    'TIFFWriter',
+    'open_image_writer',
+]
+
+from .Exceptions import HandsomeException
+from .Pixel import Pixel
+
+import ctypes
+import numpy as np
+import queue
+import struct
+import threading
+import zlib
+
+class ImageWriter:
+    '''ImageWriter - Writes an image to path in bands of rows, top to bottom
+
+    write_rows takes bands of Pixels, width wide, in the order they are
+    resolved, so the whole image never has to be in memory. mode is 'RGBA'
+    or 'RGB', which drops alpha. With background set, bands are encoded and
+    written on a thread of their own, overlapping with whatever produces
+    the next band; at most two bands wait for it at a time.
+
+    path may also be a binary file object, such as a pipe to an encoder,
+    which is left open on close. Only TIFFWriter needs to seek in it.
+    '''
+
+    def __init__(self, path, width, height, mode='RGBA', background=False):
+        if mode not in ('RGBA', 'RGB'):
+            raise HandsomeException('unsupported image mode', { 'mode' : mode })
+
+        self.path = path
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.rows_written = 0
+
+        self.owns_file = not hasattr(path, 'write')
+        self.file = open(path, 'wb') if self.owns_file else path
+        self.write_header()
+
+        self.queue = None
+        self.thread = None
+        self.error = None
+
+        if background:
+            self.queue = queue.Queue(maxsize=2)
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+    def write_rows(self, pixels):
+        '''Appends the rows of pixels, a (rows, width) array of Pixels'''
+        if pixels.dtype != Pixel or pixels.ndim != 2 or pixels.shape[1] != self.width:
+            raise HandsomeException(
+                'rows must be Pixels as wide as the image',
+                { 'dtype' : pixels.dtype, 'shape' : pixels.shape, 'width' : self.width }
+            )
+
+        if self.rows_written + len(pixels) > self.height:
+            raise HandsomeException(
+                'more rows than the image holds',
+                { 'rows_written' : self.rows_written, 'rows' : len(pixels), 'height' : self.height }
+            )
+
+        self.rows_written += len(pixels)
+        data = self.channels(pixels)
+
+        if self.queue is None:
+            self.write_band(data)
+            return
+
+        if self.error is not None:
+            raise self.error
+
+        self.queue.put(data)
+
+
+    def close(self):
+        if self.file is None:
+            return
+
+        try:
+            if self.thread is not None:
+                self.queue.put(None)
+                self.thread.join()
+
+                if self.error is not None:
+                    raise self.error
+
+            if self.rows_written != self.height:
+                raise HandsomeException(
+                    'image closed before all of its rows were written',
+                    { 'rows_written' : self.rows_written, 'height' : self.height }
+                )
+
+            self.write_trailer()
+        finally:
+            self.release_file()
+
+
+    def abort(self):
+        '''Stops writing, leaving the file incomplete'''
+        if self.file is None:
+            return
+
+        if self.thread is not None:
+            self.error = self.error or HandsomeException('writer aborted', { 'path' : self.path })
+            self.queue.put(None)
+            self.thread.join()
+
+        self.release_file()
+
+
+    def release_file(self):
+        if self.owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+        self.file = None
+
+
+    def channels(self, pixels):
+        # A contiguous (rows, width, channels) uint8 copy of pixels, which
+        # the background thread can own.
+        data = pixels.view(np.uint8).reshape(pixels.shape + (4,))
+
+        if self.mode == 'RGB':
+            data = data[..., :3]
+
+        return np.array(data, order='C')
+
+
+    def run(self):
+        while True:
+            data = self.queue.get()
+
+            if data is None:
+                return
+
+            if self.error is not None:
+                continue
+
+            try:
+                self.write_band(data)
+            except Exception as error:
+                self.error = error
+
+
+    @property
+    def samples_per_pixel(self):
+        return len(self.mode)
+
+
+    def write_header(self):
+        raise NotImplementedError
+
+
+    def write_band(self, data):
+        raise NotImplementedError
+
+
+    def write_trailer(self):
+        raise NotImplementedError
+
+
+class PNGWriter(ImageWriter):
+    '''PNGWriter - Streams rows into a PNG, one deflate stream across all bands'''
+
+    def __init__(self, path, width, height, mode='RGBA', background=False, level=6):
+        self.compressor = zlib.compressobj(level)
+        super().__init__(path, width, height, mode, background)
+
+
+    def write_header(self):
+        color_type = 6 if self.mode == 'RGBA' else 2
+
+        self.file.write(b'\x89PNG\r\n\x1a\n')
+        self.write_chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, color_type, 0, 0, 0))
+
+
+    def write_band(self, data):
+        # Every row goes out unfiltered, behind a zero filter type byte.
+        rows = data.reshape(len(data), -1)
+        filtered = np.zeros((len(rows), rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 1:] = rows
+
+        compressed = self.compressor.compress(filtered.tobytes())
+
+        if compressed:
+            self.write_chunk(b'IDAT', compressed)
+
+
+    def write_trailer(self):
+        self.write_chunk(b'IDAT', self.compressor.flush())
+        self.write_chunk(b'IEND', b'')
+
+
+    def write_chunk(self, kind, data):
+        self.file.write(struct.pack('>I', len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff))
+
+
+class TIFFWriter(ImageWriter):
+    '''TIFFWriter - Streams rows into an uncompressed baseline TIFF, in strips
+
+    Strips are written as the bands arrive, and the directory describing
+    them goes at the end of the file. Baseline strips all hold the same
+    number of rows but the last, so the first band sets the strip height,
+    and rows of later bands short of a whole strip wait for the next band.
+    '''
+
+    def __init__(self, path, width, height, mode='RGBA', background=False):
+        self.strip_offsets = [ ]
+        self.strip_byte_counts = [ ]
+        self.rows_per_strip = None
+        self.pending = None
+
+        super().__init__(path, width, height, mode, background)
+
+
+    def write_header(self):
+        # Little endian, with the directory offset filled in on close
+        self.file.write(b'II*\x00\x00\x00\x00\x00')
+
+
+    def write_band(self, data):
+        if self.rows_per_strip is None:
+            self.rows_per_strip = len(data)
+
+        if self.pending is not None:
+            data = np.concatenate([ self.pending, data ])
+            self.pending = None
+
+        whole = len(data) // self.rows_per_strip * self.rows_per_strip
+
+        for begin in range(0, whole, self.rows_per_strip):
+            self.write_strip(data[begin:begin + self.rows_per_strip])
+
+        if whole < len(data):
+            self.pending = data[whole:]
+
+
+    def write_strip(self, strip):
+        self.strip_offsets.append(self.file.tell())
+        self.strip_byte_counts.append(strip.nbytes)
+
+        self.file.write(strip.tobytes())
+
+
+    def write_trailer(self):
+        SHORT, LONG = 3, 4
+        samples = self.samples_per_pixel
+
+        if self.pending is not None:
+            self.write_strip(self.pending)
+            self.pending = None
+
+        entries = [
+            (256, LONG,  [ self.width ]),
+            (257, LONG,  [ self.height ]),
+            (258, SHORT, [ 8 ] * samples),
+            (259, SHORT, [ 1 ]),
+            (262, SHORT, [ 2 ]),
+            (273, LONG,  self.strip_offsets),
+            (277, SHORT, [ samples ]),
+            (278, LONG,  [ self.rows_per_strip or self.height ]),
+            (279, LONG,  self.strip_byte_counts),
+            (284, SHORT, [ 1 ]),
+        ]
+
+        if self.mode == 'RGBA':
+            # Unassociated alpha, as the canvases hold straight colour
+            entries.append((338, SHORT, [ 2 ]))
+
+        if self.file.tell() % 2:
+            self.file.write(b'\x00')
+
+        directory = self.file.tell()
+        overflow = directory + 2 + 12 * len(entries) + 4
+
+        table, data = [ ], [ ]
+
+        for tag, kind, values in entries:
+            fmt = '<{}{}'.format(len(values), 'H' if kind == SHORT else 'I')
+            packed = struct.pack(fmt, *values)
+
+            if len(packed) <= 4:
+                table.append(struct.pack('<HHI', tag, kind, len(values)) + packed.ljust(4, b'\x00'))
+            else:
+                table.append(struct.pack('<HHII', tag, kind, len(values), overflow))
+                data.append(packed)
+                overflow += len(packed)
+
+        self.file.write(struct.pack('<H', len(entries)))
+        self.file.write(b''.join(table))
+        self.file.write(struct.pack('<I', 0))
+        self.file.write(b''.join(data))
+
+        self.file.seek(4)
+        self.file.write(struct.pack('<I', directory))
+
+
+# The RawImageFormat values of capi.raw_image_header
+raw_image_formats = {
+    'bmp' : 0,
+    'ppm' : 1,
+    'pam' : 2,
+    'npy' : 3,
+}
+
+
+class RawImageWriter(ImageWriter):
+    '''RawImageWriter - Streams rows into an uncompressed image, packed natively
+
+    Subclasses name format, one of raw_image_formats. The header only needs
+    the size of the image and the rows follow it as they arrive, converted
+    to the layout of the format in one native pass, so there is no encoding
+    to speak of and these write to pipes as readily as to files.
+    '''
+
+    format = None
+
+    def write_header(self):
+        from .capi import raw_image_header
+
+        header = ctypes.create_string_buffer(256)
+        length = raw_image_header(
+            raw_image_formats[self.format],
+            self.width, self.height, self.samples_per_pixel,
+            header, len(header)
+        )
+
+        if length < 0:
+            raise HandsomeException(
+                'format cannot hold the image',
+                { 'format' : self.format, 'mode' : self.mode, 'width' : self.width, 'height' : self.height }
+            )
+
+        self.file.write(header.raw[:length])
+
+
+    def channels(self, pixels):
+        from .capi import generate_numpy_begin, pack_raw_image_rows, raw_image_row_bytes
+
+        if pixels.strides[1] != pixels.itemsize or pixels.strides[0] % pixels.itemsize:
+            pixels = np.ascontiguousarray(pixels)
+
+        image_format = raw_image_formats[self.format]
+        row_bytes = raw_image_row_bytes(image_format, self.width, self.samples_per_pixel)
+        data = np.empty((len(pixels), row_bytes), dtype=np.uint8)
+
+        pack_raw_image_rows(
+            image_format,
+            generate_numpy_begin(pixels), pixels.strides[0] // pixels.itemsize,
+            len(pixels), self.width, self.samples_per_pixel,
+            generate_numpy_begin(data)
+        )
+
+        return data
+
+
+    def write_band(self, data):
+        self.file.write(data)
+
+
+    def write_trailer(self):
+        pass
+
+
+class BMPWriter(RawImageWriter):
+    '''BMPWriter - Streams rows into a top down 24 or 32 bit BMP'''
+    format = 'bmp'
+
+
+class PPMWriter(RawImageWriter):
+    '''PPMWriter - Streams rows into a binary PPM, which holds no alpha'''
+    format = 'ppm'
+
+    def __init__(self, path, width, height, mode='RGB', background=False):
+        if mode != 'RGB':
+            raise HandsomeException('PPM images are RGB only', { 'mode' : mode })
+
+        super().__init__(path, width, height, mode, background)
+
+
+class PAMWriter(RawImageWriter):
+    '''PAMWriter - Streams rows into a PAM, as RGB or RGB_ALPHA tuples'''
+    format = 'pam'
+
+
+class NPYWriter(RawImageWriter):
+    '''NPYWriter - Streams rows into a .npy of a (height, width, channels) uint8 array'''
+    format = 'npy'
+
+
+image_writers = {
+    '.bmp'  : BMPWriter,
+    '.npy'  : NPYWriter,
+    '.pam'  : PAMWriter,
+    '.png'  : PNGWriter,
+    '.ppm'  : PPMWriter,
+    '.tif'  : TIFFWriter,
+    '.tiff' : TIFFWriter,
+}
+
+
+def open_image_writer(path, width, height, mode='RGBA', background=False, format=None):
+    '''Opens the ImageWriter for format, an extension such as 'png', or else path's extension'''
+    import os
+
+    if format is None:
+        extension = os.path.splitext(str(path))[1].lower()
+    else:
+        extension = '.' + format.lower().lstrip('.')
+
+    cls = image_writers.get(extension)
+
+    if cls is None:
+        raise HandsomeException(
+            'no streaming writer for this extension',
+            { 'path' : path, 'extensions' : tuple(image_writers) }
+        )
+
+    return cls(path, width, height, mode, background)
@@ -1,8 +1,12 @@
 __all__ = [ 'MicropolygonMesh' ]
 
+import ctypes
 import numpy as np
 from .Pixel import FloatPixel
-from handsome.capi import fill_bounds_buffer, generate_numpy_begin
+from handsome.capi import (
+    fill_bounds_buffer, fill_bounds_pyramid, fill_inverter_coefficients,
+    generate_numpy_begin
+)
 
 # TODO: Flexible vertex types
 
@@ -22,12 +26,40 @@ Vertex = np.dtype([
     align=True
 )
 
+# Mirrors RationalBilinearCoefficients in cpp_src/RationalBilinearInverter.hpp
+InverterCoefficients = np.dtype([
+        ('quadratic', np.float64, (3, 3)),
+        ('origin',    np.float64, 4),
+        ('u_axis',    np.float64, 4),
+        ('v_axis',    np.float64, 4),
+        ('twist',     np.float64, 4),
+    ],
+    align=True
+)
+
+# Mirrors MeshReference in _capi.cpp
+MeshReference = np.dtype([
+        ('mesh',         np.uintp),
+        ('bounds',       np.uintp),
+        ('pyramid',      np.uintp),
+        ('coefficients', np.uintp),
+        ('rows',         np.int32),
+        ('columns',      np.int32),
+        ('affine',       np.int32),
+    ],
+    align=True
+)
+
 class MicropolygonMesh:
     def __init__(self, shape, vertex_type=Vertex):
         self.shape = shape
         self.__outer_bounds = None
         self.__buffer = None
         self.__bounds = None
+        self.__is_affine = None
+        self.__bounds_pyramid = None
+        self.__inverter_coefficients = None
+        self.__tile_bins = { }
 
     @property
     def buffer(self):
@@ -49,17 +81,90 @@ class MicropolygonMesh:
         bounds_rows, bounds_columns = mesh_rows - 1, mesh_columns - 1
 
         self.__bounds = np.zeros((bounds_rows, bounds_columns), dtype=Position)
+        is_affine = ctypes.c_int(0)
 
         outer_bounds = fill_bounds_buffer(
             mesh_rows, mesh_columns,
             generate_numpy_begin(buffer),
             generate_numpy_begin(self.__bounds),
+            ctypes.byref(is_affine),
         )
 
         self.__outer_bounds = outer_bounds
+        self.__is_affine = bool(is_affine.value)
         return self.__bounds
 
     @property
     def outer_bounds(self):
         bounds = self.bounds
         return self.__outer_bounds
+
+    @property
+    def bounds_pyramid(self):
+        '''Levels 1 and up of a min/max pyramid over bounds, concatenated
+
+        Level k has ceil(rows / 2^k) x ceil(columns / 2^k) boxes, each the
+        union of the boxes of the level below it that it covers, where level 0
+        is bounds itself. The last level is a single box.
+        '''
+        if self.__bounds_pyramid is not None:
+            return self.__bounds_pyramid
+
+        bounds = self.bounds
+        rows, columns = bounds.shape
+        size = 0
+
+        while rows > 1 or columns > 1:
+            rows, columns = (rows + 1) // 2, (columns + 1) // 2
+            size += rows * columns
+
+        pyramid = np.zeros(size, dtype=Position)
+
+        if size:
+            fill_bounds_pyramid(
+                bounds.shape[0], bounds.shape[1],
+                generate_numpy_begin(bounds),
+                generate_numpy_begin(pyramid),
+            )
+
+        self.__bounds_pyramid = pyramid
+        return pyramid
+
+    @property
+    def is_affine(self):
+        '''True when every vertex shares one z and w, as in flat 2D meshes'''
+        bounds = self.bounds
+        return self.__is_affine
+
+    @property
+    def inverter_coefficients(self):
+        if self.__inverter_coefficients is not None:
+            return self.__inverter_coefficients
+
+        buffer = self.buffer
+        mesh_rows, mesh_columns = buffer.shape
+
+        self.__inverter_coefficients = np.zeros(
+            (mesh_rows - 1, mesh_columns - 1),
+            dtype=InverterCoefficients
+        )
+
+        fill_inverter_coefficients(
+            mesh_rows, mesh_columns,
+            generate_numpy_begin(buffer),
+            generate_numpy_begin(self.__inverter_coefficients),
+        )
+
+        return self.__inverter_coefficients
+
+    def tile_bins(self, tile_shape):
+        from .TileBins import TileBins
+
+        tile_shape = tuple(tile_shape)
+        bins = self.__tile_bins.get(tile_shape)
+
+        if bins is not None:
+            return bins
+
+        bins = self.__tile_bins[tile_shape] = TileBins(self.bounds, self.outer_bounds, tile_shape)
+        return bins
@@ -1,6 +1,7 @@
+from handsome.Exceptions import HandsomeException
 from handsome.TransformStack import TransformStack
 from handsome.Pixel import array_view, pixel_view
-from handsome.util import color, n_wise, render_mesh
+from handsome.util import color, n_wise, render_mesh, render_mesh_to_canvas, render_meshes
 
 import numpy as np
 import os
@@ -8,12 +9,13 @@ import sweatervest
 
 __all__ = [
     'render_scene',
+    'render_scene_buckets',
     'make_canvas',
     'MeshExtractor',
 ]
 
 
-def render_scene(scene, sample_rate=4, mesh_extractor=None):
+def render_scene(scene, sample_rate=4, mesh_extractor=None, depth=False, direct=False):
     canvas = make_canvas(scene.data['canvas'], sample_rate)
 
     if mesh_extractor is None:
@@ -24,14 +26,172 @@ def render_scene(scene, sample_rate=4, mesh_extractor=None):
 
     meshes = list(meshes)
 
+    if depth and direct:
+        # Direct rendering blends each mesh over the canvas as it goes, so
+        # there is no shared depth buffer to test against.
+        raise HandsomeException(
+            'depth and direct rendering cannot be combined',
+            { 'depth' : depth, 'direct' : direct }
+        )
+
+    if depth:
+        # Every mesh is depth tested into one cache, which only composites
+        # correctly when the meshes are opaque.
+        cache = render_meshes(meshes, sample_rate=sample_rate, depth=True)
+        cache.composite_into(canvas)
+        cache.clear()
+        return canvas
+
+    if direct:
+        for mesh in meshes:
+            render_mesh_to_canvas(mesh, canvas)
+
+        return canvas
+
     for mesh in meshes:
         cache = render_mesh(mesh, sample_rate=sample_rate)
         cache.composite_into(canvas)
+        cache.clear()
 
     return canvas
 
 
-def make_canvas(canvas, sample_rate=4):
+def render_scene_buckets(
+    scene, sample_rate=4, mesh_extractor=None,
+    bucket_shape=(64, 64), tile_shape=(16, 16), path=None,
+    writer=None, srgb=False, dither=False
+):
+    '''Renders scene one screen bucket at a time, returning its pixels
+
+    Meshes are sorted into buckets of bucket_shape pixels by their outer
+    bounds. Each bucket is then supersampled at sample_rate, every mesh
+    over it composited in scene order, downsampled into the returned Tile
+    and released before the next, so only one bucket of samples is ever
+    held. Meshes over several buckets are filled in each only from their
+    cells binned to it. The result matches downsampling render_scene with
+    direct set. With path given, the pixels are memory mapped from that
+    file and written back a row of buckets at a time.
+
+    With writer, an ImageWriter, each row of buckets is instead resolved
+    to 8 bit Pixels, as Tile.downsample_to_pixels does with srgb and
+    dither, and handed to writer as soon as it is done, and nothing is
+    returned. Buckets a multiple of 8 pixels on a side keep the dither
+    pattern continuous across them.
+    '''
+    from handsome.Pixel import FloatPixel, Pixel
+    from handsome.Tile import Tile
+    from sweatervest.util import color_to_float
+
+    canvas = scene.data['canvas']
+
+    if isinstance(canvas, Tile):
+        if canvas.sample_rate != sample_rate:
+            raise HandsomeException(
+                'canvas sample rate does not match',
+                { 'sample_rate' : sample_rate, 'canvas.sample_rate' : canvas.sample_rate }
+            )
+
+        origin, extents, color = canvas.origin, canvas.shape, None
+    else:
+        origin, extents = (0, 0), canvas['extents']
+        color = color_to_float(canvas.get('color', None))
+
+    out = Tile(origin, extents, 1, dtype=FloatPixel, path=path)
+
+    if mesh_extractor is None:
+        mesh_extractor = MeshExtractor(scene)
+
+    meshes = list(mesh_extractor.extract_meshes(scene.data['top']))
+    buckets = bucket_meshes(meshes, out, bucket_shape)
+
+    # Rows of buckets go from the top down, the order of the rows of out.
+    origins = sorted(buckets, key=lambda origin: (-origin[1], origin[0]))
+    band = None
+
+    for k, origin in enumerate(origins):
+        bucket = Tile(origin, bucket_shape, sample_rate, dtype=FloatPixel)
+
+        if color is None:
+            bucket_slice, canvas_slice = bucket.intersection_slices(canvas)
+            bucket.buffer[bucket_slice] = canvas.buffer[canvas_slice]
+        else:
+            bucket.buffer[:] = color
+
+        for mesh_index in buckets[origin]:
+            render_mesh_to_canvas(meshes[mesh_index], bucket, tile_shape)
+
+        if writer is None:
+            pixels = bucket.downsample(1)
+        else:
+            pixels = bucket.downsample_to_pixels(1, srgb=srgb, dither=dither)
+
+        bucket.release()
+
+        out_slice, pixel_slice = out.intersection_slices(
+            Tile(origin, bucket_shape, 1, dtype=FloatPixel)
+        )
+
+        row_done = k + 1 == len(origins) or origins[k + 1][1] != origin[1]
+
+        if writer is None:
+            out.buffer[out_slice] = pixels[pixel_slice]
+
+            if row_done:
+                out.evict_rows(out_slice[0].start, out_slice[0].stop)
+
+            continue
+
+        # The rows of out under this row of buckets, with the band's rows
+        # counted from the first of them
+        if band is None:
+            band = np.zeros((out_slice[0].stop - out_slice[0].start, out.shape[0]), dtype=Pixel)
+
+        band[:, out_slice[1]] = pixels[pixel_slice]
+
+        if row_done:
+            writer.write_rows(band)
+            band = None
+
+    if writer is not None:
+        return None
+
+    return out
+
+
+# Indices into meshes, in order, of those whose outer bounds overlap each
+# bucket over image, keyed by bucket origin. Buckets no mesh reaches are
+# still listed, as they hold the canvas background.
+def bucket_meshes(meshes, image, bucket_shape):
+    import math
+
+    width, height = bucket_shape
+    left, bottom = image.origin
+    right, top = left + image.shape[0], bottom + image.shape[1]
+
+    buckets = {
+        (x, y) : [ ]
+        for x in range(left // width * width, right, width)
+        for y in range(bottom // height * height, top, height)
+    }
+
+    for k, mesh in enumerate(meshes):
+        b = mesh.outer_bounds
+
+        x0 = max(int(math.floor(b.left / width)) * width, left // width * width)
+        y0 = max(int(math.floor(b.bottom / height)) * height, bottom // height * height)
+        x1 = min(int(math.floor(b.right / width)) * width, right - 1)
+        y1 = min(int(math.floor(b.top / height)) * height, top - 1)
+
+        for x in range(x0, x1 + 1, width):
+            for y in range(y0, y1 + 1, height):
+                buckets[(x, y)].append(k)
+
+    return buckets
+
+
+# With path given, the canvas is an np.memmap of that file rather than held
+# in memory, for images too large to supersample in RAM.
+def make_canvas(canvas, sample_rate=4, path=None):
     from handsome.Tile import Tile
     from handsome.Pixel import FloatPixel
     from sweatervest.util import color_to_float
@@ -43,8 +203,10 @@ def make_canvas(canvas, sample_rate=4):
 
     color = color_to_float(canvas.get('color', None))
 
-    out = Tile((0, 0), extents, sample_rate, dtype=FloatPixel)
-    out.buffer[:,:] = color
+    out = Tile((0, 0), extents, sample_rate, dtype=FloatPixel, path=path)
+
+    for band in out.row_bands():
+        out.buffer[band] = color
 
     return out
 
@@ -3,19 +3,39 @@ __all__ =  [ 'Tile' ]
 from .Coordinate import Coordinate
 from .Exceptions import HandsomeException
 from .Interval import Interval
-from .Pixel import Pixel, array_view, pixel_view
+from .Pixel import FloatPixel, HalfPixel, Pixel, array_view, pixel_view
+from .TileBufferPool import tile_buffer_pool
+from .filters import filter_taps
 from .capi import generate_numpy_begin, c_void_p
-from handsome.capi import Rectangle, downsample_tile, generate_numpy_begin
+from handsome.capi import (
+    Rectangle, composite_over, composite_over_premultiplied, composite_pixels,
+    downsample_tile, downsample_tile_filtered, downsample_tile_filtered_half,
+    downsample_tile_half, downsample_to_pixels, generate_numpy_begin
+)
 import math
+import mmap
 import numpy as np
+import os
+import threading
 
 from functools import cached_property
 
 class Tile:
-    def __init__(self, origin, shape, sample_rate = 1, dtype=Pixel):
+    '''Tile - Rectangle of samples at sample_rate per unit, origin at its lower left
+
+    The buffer comes from pool, or, with path given, is an np.memmap of that
+    file, opened when first touched and created if it does not exist. File
+    backed tiles suit canvases too large to hold in memory: compositing and
+    downsampling walk them in row bands, handing each band back to the
+    operating system once done.
+    '''
+
+    def __init__(self, origin, shape, sample_rate = 1, dtype=Pixel, pool=None, path=None):
         self.shape = shape
         self.sample_rate = sample_rate
         self.dtype = dtype
+        self.pool = pool if pool is not None else tile_buffer_pool
+        self.path = path
 
         self.set_origin(origin)
 
@@ -23,6 +43,17 @@ class Tile:
         self.__tile_bounds = None
 
         self.__buffer_ptr = None
+        self.__buffer_finalizer = None
+        self.__depth_buffer = None
+        self.__coverage = None
+
+        self.__spill_file = None
+        self.__spill_slot = None
+        self.__depth_spill_file = None
+        self.__depth_spill_slot = None
+        self.__spilled = False
+        self.__depth_spilled = False
+        self.__on_page_in = None
 
 
     def set_origin(self, origin):
@@ -78,21 +109,178 @@ class Tile:
         if self.__buffer is not None:
             return self.__buffer
 
-        dtype = self.dtype
         shape = (self.shape[1] * self.sample_rate, self.shape[0] * self.sample_rate)
-        cacher = tile_cachers.get((shape, dtype))
+        on_page_in = None
+
+        with tile_buffer_lock:
+            if self.__buffer is not None:
+                return self.__buffer
+
+            if self.path is not None:
+                buffer = open_memmap(self.path, shape, self.dtype)
+
+                self.__buffer_ptr = generate_numpy_begin(buffer)
+                self.__buffer = buffer
+
+                return buffer
 
-        if cacher is None:
-            cacher = tile_cachers[(shape, dtype)] = make_tile_cacher(shape, dtype)
+            ptr, buffer, slot = self.pool.acquire(shape, self.dtype)
 
-        ptr, buffer = next(cacher)
+            if self.__spilled:
+                self.__spill_file.read(self.__spill_slot, buffer)
+                self.__spilled = False
 
-        self.__buffer_ptr = ptr
-        self.__buffer = buffer
+                if self.__depth_spilled:
+                    self.__depth_buffer = np.empty(shape, dtype=np.float32)
+                    self.__depth_spill_file.read(self.__depth_spill_slot, self.__depth_buffer)
+                    self.__depth_spilled = False
+
+                on_page_in, self.__on_page_in = self.__on_page_in, None
+
+            self.__buffer_ptr = ptr
+            self.__buffer = buffer
+
+            # A tile dropped without release() still returns its buffer to
+            # the pool, once neither it nor any view of its buffer is left.
+            self.__buffer_finalizer = self.pool.release_when_unused(buffer, slot)
+
+        # Called outside the lock, as it may spill other tiles.
+        if on_page_in is not None:
+            on_page_in(self)
 
         return buffer
 
 
+    @property
+    def is_resident(self):
+        return self.__buffer is not None
+
+
+    @property
+    def is_file_backed(self):
+        return self.path is not None
+
+
+    def row_bands(self, band_bytes=int(4 * 2 ** 20)):
+        '''Yields slices of about band_bytes of whole buffer rows, top to bottom
+
+        For file backed tiles, each band is written back and dropped from
+        memory once the caller moves on to the next one.
+        '''
+        rows = self.shape[1] * self.sample_rate
+        row_bytes = self.shape[0] * self.sample_rate * np.dtype(self.dtype).itemsize
+        band_rows = max(band_bytes // row_bytes, 1)
+
+        for begin in range(0, rows, band_rows):
+            end = min(begin + band_rows, rows)
+            yield np.s_[begin:end]
+            self.evict_rows(begin, end)
+
+
+    def evict_rows(self, begin, end):
+        '''Writes buffer rows [begin, end) of a file backed tile back to its
+        file and drops them from memory; they are read back when next used.
+        Does nothing for pooled tiles.
+        '''
+        buffer = self.__buffer
+
+        if self.path is None or buffer is None:
+            return
+
+        mapping = getattr(buffer, '_mmap', None)
+
+        if mapping is None:
+            return
+
+        row_bytes = buffer.strides[0]
+        page = mmap.PAGESIZE
+
+        start = begin * row_bytes // page * page
+        stop = min(-(-end * row_bytes // page) * page, len(mapping))
+
+        mapping.flush(start, stop - start)
+
+        if hasattr(mapping, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+            mapping.madvise(mmap.MADV_DONTNEED, start, stop - start)
+
+
+    def release(self):
+        '''Returns the buffer to its pool
+
+        The tile's contents are lost, and views of the old buffer must not be
+        used afterwards. Touching buffer again acquires a fresh, zeroed one.
+        A file backed tile instead writes its buffer back to the file, which
+        is mapped again when next touched.
+        '''
+        with tile_buffer_lock:
+            if self.path is not None and self.__buffer is not None:
+                self.__buffer.flush()
+
+            finalizer = self.__buffer_finalizer
+
+            self.__buffer = None
+            self.__buffer_ptr = None
+            self.__buffer_finalizer = None
+            self.__depth_buffer = None
+            self.__coverage = None
+
+            self.__spill_file = None
+            self.__spill_slot = None
+            self.__depth_spill_file = None
+            self.__depth_spill_slot = None
+            self.__spilled = False
+            self.__depth_spilled = False
+            self.__on_page_in = None
+
+        if finalizer is not None:
+            finalizer()
+
+
+    def spill(self, spill_file, depth_spill_file=None, on_page_in=None):
+        '''Copies the buffer out to spill_file and returns it to its pool
+
+        The depth buffer, if any, goes to depth_spill_file when one is given
+        and stays in memory otherwise. Touching buffer or depth_buffer again
+        reads the contents back in and then calls on_page_in with the tile.
+        As with release, views of the old buffers must not be used afterwards.
+        '''
+        if self.path is not None:
+            # The file is its own spill space.
+            self.release()
+            return
+
+        with tile_buffer_lock:
+            buffer, finalizer = self.__buffer, self.__buffer_finalizer
+
+            if buffer is None:
+                return
+
+            if self.__spill_file is not spill_file:
+                self.__spill_file = spill_file
+                self.__spill_slot = spill_file.allocate()
+
+            spill_file.write(self.__spill_slot, buffer)
+            self.__spilled = True
+            self.__on_page_in = on_page_in
+
+            depth_buffer = self.__depth_buffer
+
+            if depth_buffer is not None and depth_spill_file is not None:
+                if self.__depth_spill_file is not depth_spill_file:
+                    self.__depth_spill_file = depth_spill_file
+                    self.__depth_spill_slot = depth_spill_file.allocate()
+
+                depth_spill_file.write(self.__depth_spill_slot, depth_buffer)
+                self.__depth_buffer = None
+                self.__depth_spilled = True
+
+            self.__buffer = None
+            self.__buffer_ptr = None
+            self.__buffer_finalizer = None
+
+        finalizer()
+
+
     @property
     def buffer_ptr(self):
         if self.__buffer_ptr is not None:
@@ -103,6 +291,91 @@ class Tile:
         return self.__buffer_ptr
 
 
+    @property
+    def depth_buffer(self):
+        if self.__depth_buffer is not None:
+            return self.__depth_buffer
+
+        if self.__depth_spilled:
+            # Paging the tile in reads its depth back too.
+            self.buffer
+
+            if self.__depth_buffer is not None:
+                return self.__depth_buffer
+
+        shape = (self.shape[1] * self.sample_rate, self.shape[0] * self.sample_rate)
+        self.__depth_buffer = np.full(shape, np.inf, dtype=np.float32)
+
+        return self.__depth_buffer
+
+
+    @property
+    def coverage_buffer(self):
+        '''(row_begin, row_end, column_begin, column_end) of the samples written
+
+        The native fillers grow this rectangle as they write samples, and
+        compositing and downsampling skip everything outside it. It starts
+        out empty on a tile whose buffer has never been touched, and as the
+        whole tile otherwise, since its contents are then unknown. Call
+        mark_dirty after writing the buffer from Python.
+        '''
+        if self.__coverage is not None:
+            return self.__coverage
+
+        rows, columns = self.shape[1] * self.sample_rate, self.shape[0] * self.sample_rate
+
+        pristine = self.__buffer is None and not self.__spilled and (
+            self.path is None or not os.path.exists(self.path)
+        )
+
+        if pristine:
+            coverage = (rows, 0, columns, 0)
+        else:
+            coverage = (0, rows, 0, columns)
+
+        self.__coverage = np.array(coverage, dtype=np.int32)
+
+        return self.__coverage
+
+
+    def add_coverage(self, written):
+        '''Grows the coverage to take in written, a slice of buffer'''
+        coverage = self.__coverage
+
+        if coverage is None:
+            return
+
+        rows, columns = written
+
+        coverage[0] = min(coverage[0], rows.start)
+        coverage[1] = max(coverage[1], rows.stop)
+        coverage[2] = min(coverage[2], columns.start)
+        coverage[3] = max(coverage[3], columns.stop)
+
+
+    def mark_dirty(self):
+        '''Counts the whole tile as written, whatever the fillers recorded'''
+        self.__coverage = None
+
+
+    @property
+    def is_empty(self):
+        coverage = self.__coverage
+
+        return coverage is not None and (
+            coverage[1] <= coverage[0] or coverage[3] <= coverage[2]
+        )
+
+
+    @property
+    def dirty_slice(self):
+        '''Slice of buffer holding every written sample, or None if there are none'''
+        if self.__coverage is None:
+            return np.s_[:, :]
+
+        return coverage_slice(self.__coverage)
+
+
     @cached_property
     def coordinate_image(self):
         return make_coordinate_image(self.origin, self.shape, self.sample_rate)
@@ -122,34 +395,253 @@ class Tile:
 
         return self.__tile_bounds
 
-    def downsample(self, sample_rate):
+    def downsample(self, sample_rate, filter='box', radius=None, threads=None):
+        '''Resamples the tile down to sample_rate
+
+        The default box filter averages each block of samples under an
+        output sample. filter may instead name another of filters.FILTERS,
+        a separable Gaussian, Mitchell-Netravali or Lanczos filter of
+        radius output samples, its default if None, run as two one
+        dimensional passes. With threads, bands of output rows are filtered on that
+        many threads at once.
+        '''
         downrate = int(math.ceil(self.sample_rate / sample_rate))
 
-        in_height, in_width = self.buffer.shape
+        if filter != 'box' or radius is not None:
+            return self.downsample_filtered(downrate, filter, radius, threads)
+
+        in_height = self.shape[1] * self.sample_rate
+        in_width = self.shape[0] * self.sample_rate
+
+        out_height = int(math.ceil(in_height / downrate))
+        out_width = int(math.ceil(in_width / downrate))
+
+        # HalfPixel tiles downsample to HalfPixels, summing in float.
+        if self.dtype == HalfPixel:
+            out_dtype, downsample = np.float16, downsample_tile_half
+        else:
+            out_dtype, downsample = np.float32, downsample_tile
+
+        out = np.zeros(shape=(out_height, out_width, 4), dtype=out_dtype)
+
+        dirty = self.dirty_slice
+
+        if dirty is None:
+            return pixel_view(out)
+
+        # Only the whole output rows over the written samples are filtered,
+        # which keeps both sides contiguous.
+        out_begin = (dirty[0].start or 0) // downrate
+        out_end = int(math.ceil((dirty[0].stop or in_height) / downrate))
+
         buffer = array_view(self.buffer)
 
-        new_shape = [
-            int(math.ceil(o / downrate))
-            for o in buffer.shape
-        ]
+        def filter_band(band_begin, band_end):
+            in_begin = band_begin * downrate
+            in_end = min(band_end * downrate, in_height)
 
-        new_shape[-1] = buffer.shape[-1]
-        out_height, out_width = new_shape[:2]
+            downsample(
+                generate_numpy_begin(buffer[in_begin:in_end]),
+                in_width, in_end - in_begin,
+                downrate, downrate,
+                generate_numpy_begin(out[band_begin:band_end]),
+                out_width, band_end - band_begin
+            )
 
-        out = np.zeros(shape=new_shape, dtype=np.float32)
+        def rows_read(band_end):
+            return min(band_end * downrate, in_height)
 
-        downsample_tile(
-            generate_numpy_begin(buffer),
-            in_width, in_height,
-            downrate, downrate,
-            generate_numpy_begin(out),
-            out_width, out_height
-        )
+        self.filter_bands(out_begin, out_end, downrate, filter_band, rows_read, threads)
 
         return pixel_view(out)
 
 
-    def composite_from(self, from_tile):
+    def downsample_filtered(self, downrate, filter, radius=None, threads=None):
+        weights, first = filter_taps(filter, downrate, radius)
+        taps = len(weights)
+
+        in_height = self.shape[1] * self.sample_rate
+        in_width = self.shape[0] * self.sample_rate
+
+        out_height = int(math.ceil(in_height / downrate))
+        out_width = int(math.ceil(in_width / downrate))
+
+        if self.dtype == HalfPixel:
+            out_dtype, downsample = np.float16, downsample_tile_filtered_half
+        else:
+            out_dtype, downsample = np.float32, downsample_tile_filtered
+
+        out = np.zeros(shape=(out_height, out_width, 4), dtype=out_dtype)
+
+        dirty = self.dirty_slice
+
+        if dirty is None:
+            return pixel_view(out)
+
+        # Only the output rows whose taps reach the written samples are
+        # filtered.
+        dirty_begin = dirty[0].start or 0
+        dirty_end = dirty[0].stop or in_height
+
+        out_begin = max(-((first + taps - 1 - dirty_begin) // downrate), 0)
+        out_end = min((dirty_end - 1 - first) // downrate + 1, out_height)
+
+        buffer_ptr = generate_numpy_begin(array_view(self.buffer))
+        weights_ptr = generate_numpy_begin(weights)
+        out_ptr = generate_numpy_begin(out)
+
+        def filter_band(band_begin, band_end):
+            downsample(
+                buffer_ptr, in_width, in_height,
+                out_ptr, out_width,
+                band_begin, band_end,
+                weights_ptr, taps, first, downrate
+            )
+
+        def rows_read(band_end):
+            return min(max(band_end * downrate + first, 0), in_height)
+
+        self.filter_bands(out_begin, out_end, downrate, filter_band, rows_read, threads)
+
+        return pixel_view(out)
+
+
+    def downsample_to_pixels(
+        self, sample_rate=1, filter='box', radius=None,
+        srgb=False, dither=False, threads=None, rows=None
+    ):
+        '''Downsamples straight to 8 bit Pixels in one pass
+
+        Filters as downsample does, then clamps to [0, 1], applies the sRGB
+        transfer function to the colour channels if srgb is set, and rounds
+        to bytes, through an 8 x 8 ordered dither if dither is set, without
+        any full size float temporaries. With rows, a (begin, end) pair,
+        only those rows of the output are made.
+        '''
+        if self.dtype not in native_pixel_formats:
+            raise HandsomeException(
+                'only FloatPixel and HalfPixel tiles downsample to pixels',
+                { 'dtype' : self.dtype }
+            )
+
+        downrate = int(math.ceil(self.sample_rate / sample_rate))
+        weights, first = filter_taps(filter, downrate, radius)
+        taps = len(weights)
+
+        in_height = self.shape[1] * self.sample_rate
+        in_width = self.shape[0] * self.sample_rate
+
+        out_height = int(math.ceil(in_height / downrate))
+        out_width = int(math.ceil(in_width / downrate))
+
+        rows_begin, rows_end = (0, out_height) if rows is None else rows
+
+        if not 0 <= rows_begin <= rows_end <= out_height:
+            raise HandsomeException(
+                'rows must lie within the output',
+                { 'rows' : rows, 'out_height' : out_height }
+            )
+
+        out = np.zeros(shape=(rows_end - rows_begin, out_width, 4), dtype=np.uint8)
+
+        dirty = self.dirty_slice
+
+        if dirty is None:
+            return out.view(Pixel)[..., 0]
+
+        # Rows away from the written samples would come out as zero before
+        # quantizing too, so they are left as they are.
+        dirty_begin = dirty[0].start or 0
+        dirty_end = dirty[0].stop or in_height
+
+        out_begin = max(-((first + taps - 1 - dirty_begin) // downrate), rows_begin, 0)
+        out_end = min((dirty_end - 1 - first) // downrate + 1, rows_end, out_height)
+
+        buffer_ptr = generate_numpy_begin(array_view(self.buffer))
+        weights_ptr = generate_numpy_begin(weights)
+        in_format = native_pixel_formats[self.dtype]
+
+        # The native filter indexes out by whole image rows, so it is handed
+        # where row 0 would be.
+        out_ptr = c_void_p(out.ctypes.data - rows_begin * out.strides[0])
+
+        def filter_band(band_begin, band_end):
+            downsample_to_pixels(
+                buffer_ptr, in_format, in_width, in_height,
+                out_ptr, out_width,
+                band_begin, band_end,
+                weights_ptr, taps, first, downrate,
+                int(srgb), int(dither)
+            )
+
+        def rows_read(band_end):
+            return min(max(band_end * downrate + first, 0), in_height)
+
+        self.filter_bands(out_begin, out_end, downrate, filter_band, rows_read, threads)
+
+        return out.view(Pixel)[..., 0]
+
+
+    def filter_bands(self, out_begin, out_end, downrate, filter_band, rows_read, threads=None):
+        # Calls filter_band(begin, end) over bands of the output rows
+        # [out_begin, out_end), on threads threads at once if given, as the
+        # native filters release the GIL. Bands read at most about 4MB of
+        # input, so a file backed tile is never read in all at once, and
+        # once a group of bands is done the input rows before
+        # rows_read(end) of the last of them are handed back.
+        rows = out_end - out_begin
+
+        if rows <= 0:
+            return
+
+        row_bytes = self.shape[0] * self.sample_rate * downrate * np.dtype(self.dtype).itemsize
+        band_rows = max(int(4 * 2 ** 20) // row_bytes, 1)
+
+        if threads is None or threads <= 1:
+            threads = 1
+        else:
+            # Rows cost the same to filter, so one band a thread balances,
+            # and fewer bands means fewer input rows read twice by the
+            # separable filters, whose bands overlap.
+            band_rows = max(min(band_rows, -(-rows // threads)), 1)
+
+        bands = [
+            (begin, min(begin + band_rows, out_end))
+            for begin in range(out_begin, out_end, band_rows)
+        ]
+
+        evicted = 0
+
+        def evict(band_end):
+            nonlocal evicted
+
+            done = rows_read(band_end)
+
+            if done > evicted:
+                self.evict_rows(evicted, done)
+                evicted = done
+
+        if threads == 1:
+            for band in bands:
+                filter_band(*band)
+                evict(band[1])
+            return
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        # File backed tiles go a group of bands at a time, so the rows in
+        # memory stay bounded; others are handed out all at once.
+        group = threads if self.path is not None else len(bands)
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for k in range(0, len(bands), group):
+                batch = bands[k:k + group]
+
+                list(executor.map(lambda band: filter_band(*band), batch))
+                evict(batch[-1][1])
+
+
+    def composite_from(self, from_tile, premultiplied=False):
         if self.sample_rate != from_tile.sample_rate:
             raise HandsomeException(
                 'sample rates do not match',
@@ -165,18 +657,115 @@ class Tile:
             return
 
         target_slice, source_slice = slices
+        dirty = from_tile.dirty_slice
+
+        if dirty is None:
+            return
+
+        slices = clip_slices(target_slice, source_slice, dirty)
+
+        if slices is None:
+            return
+
+        target_slice, source_slice = slices
+
+        composite_buffers(
+            self.buffer[target_slice],
+            from_tile.buffer[source_slice],
+            premultiplied
+        )
+
+        self.add_coverage(target_slice)
+
+
+def open_memmap(path, shape, dtype):
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    mode = 'r+' if os.path.exists(path) and os.path.getsize(path) == size else 'w+'
+
+    return np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+
+def coverage_slice(coverage):
+    row_begin, row_end, column_begin, column_end = (int(c) for c in coverage)
+
+    if row_end <= row_begin or column_end <= column_begin:
+        return None
+
+    return np.s_[row_begin:row_end, column_begin:column_end]
+
+
+# Narrows a pair of equally sized slices, as intersection_slices returns, to
+# where the source side falls inside clip. Returns None if nothing is left.
+def clip_slices(target_slice, source_slice, clip):
+    target_out, source_out = [ ], [ ]
+
+    for target, source, bound in zip(target_slice, source_slice, clip):
+        start = max(source.start, bound.start or 0)
+        stop = source.stop if bound.stop is None else min(source.stop, bound.stop)
+
+        if stop <= start:
+            return None
+
+        target_start = target.start + start - source.start
+
+        target_out.append(slice(target_start, target_start + stop - start))
+        source_out.append(slice(start, stop))
+
+    return tuple(target_out), tuple(source_out)
 
-        alpha = np.copy(from_tile.buffer[source_slice]['A'])
-        alpha = alpha.reshape(alpha.shape + (1,))
 
-        target = array_view(self.buffer[target_slice])
+# Blends source over target in place. FloatPixel and HalfPixel buffers, in
+# any mix, blend natively and without temporaries, converting HalfPixels to
+# float as they are read; other pixel types fall back to NumPy.
+def composite_buffers(target, source, premultiplied=False):
+    target_format = native_pixel_formats.get(target.dtype)
+    source_format = native_pixel_formats.get(source.dtype)
 
-        target[:] = (
-            (1 - alpha) * target
-            + alpha * array_view(from_tile.buffer[source_slice])
+    if target_format == 0 and source_format == 0:
+        composite = composite_over_premultiplied if premultiplied else composite_over
+        rows, columns = target.shape
+
+        composite(
+            generate_numpy_begin(target), target.strides[0] // target.itemsize,
+            generate_numpy_begin(source), source.strides[0] // source.itemsize,
+            rows, columns
         )
 
+        return
+
+    if target_format is not None and source_format is not None:
+        rows, columns = target.shape
+
+        composite_pixels(
+            generate_numpy_begin(target), target.strides[0] // target.itemsize, target_format,
+            generate_numpy_begin(source), source.strides[0] // source.itemsize, source_format,
+            rows, columns,
+            int(premultiplied)
+        )
+
+        return
+
+    alpha = np.copy(source['A'])
+    alpha = alpha.reshape(alpha.shape + (1,))
+
+    target = array_view(target)
+    source = array_view(source)
+
+    if premultiplied:
+        target[:] = source + (1 - alpha) * target
+    else:
+        target[:] = (1 - alpha) * target + alpha * source
+
 
+# PixelFormat values in _capi.cpp
+native_pixel_formats = {
+    FloatPixel : 0,
+    HalfPixel  : 1,
+}
+
+
+# The C samplers generate these positions themselves (SampleGrid in
+# _capi.cpp), so keep the two layouts in step.
 def make_coordinate_image(origin, shape, sample_rate):
     width, height = shape
 
@@ -193,11 +782,8 @@ def make_coordinate_image(origin, shape, sample_rate):
     shape = (len(ys), len(xs))
     out = np.zeros(shape, dtype=Coordinate)
 
-    for x in range(len(xs)):
-        out[:,x]['y'] = ys
-
-    for y in range(len(ys)):
-        out[y,:]['x'] = xs
+    out['x'] = xs[np.newaxis,:]
+    out['y'] = ys[:,np.newaxis]
 
     return out
 
@@ -215,30 +801,6 @@ def strides(start, stop, step=1):
         yield (end, stop)
 
 
-tile_cachers = { }
-
-
-def make_tile_cacher(shape, dtype, cache_size=int(4 * 2 ** 20)):
-    from functools import reduce
-    from operator import mul
-
-    item_size = dtype.itemsize
-
-    if not isinstance(item_size, int):
-        item_size = dtype().itemsize
-
-    items_per_tile = reduce(mul, shape)
-    tile_size = item_size * items_per_tile
-    tiles_per_cache = max(int(cache_size // tile_size), 1)
-
-    while True:
-        cache = np.zeros(tiles_per_cache * items_per_tile, dtype=dtype)
-        begin = generate_numpy_begin(cache)
-
-        for offset in range(tiles_per_cache):
-            start, end = offset * items_per_tile, (offset + 1) * items_per_tile
-
-            ptr = c_void_p(begin.value + start * item_size)
-            out = cache[start:end].reshape(shape)
-
-            yield (ptr, out)
+# Guards the lazy acquisition of tile buffers, so a tile touched from two
+# threads at once does not take two buffers from its pool.
+tile_buffer_lock = threading.Lock()
@@ -0,0 +1,94 @@
+__all__ = [ 'TileBins' ]
+
+import math
+import numpy as np
+
+from .capi import count_tile_bins, fill_tile_bins, generate_numpy_begin
+
+class TileBins:
+    '''TileBins - Index from tiles of a given shape to the cells of a bounds grid that overlap them
+
+    For a mesh the grid is its bounds buffer, one cell per micropolygon.
+    Cells are flat indices into the grid. The bins for the tile with index
+    (x, y) are cells[offsets[k]:offsets[k + 1]], where k is the row-major
+    position of (x, y) in the grid of tiles covering outer_bounds.
+    '''
+
+    def __init__(self, bounds, outer_bounds, tile_shape):
+        self.tile_shape = tile_shape
+
+        width, height = tile_shape
+
+        self.left   = int(math.floor(outer_bounds.left / width))
+        self.bottom = int(math.floor(outer_bounds.bottom / height))
+        self.columns = int(math.floor(outer_bounds.right / width)) - self.left + 1
+        self.rows    = int(math.floor(outer_bounds.top / height)) - self.bottom + 1
+
+        mesh_rows, mesh_columns = bounds.shape[0] + 1, bounds.shape[1] + 1
+        bounds_ptr = generate_numpy_begin(bounds)
+
+        counts = np.zeros(self.rows * self.columns, dtype=np.int32)
+
+        count_tile_bins(
+            mesh_rows, mesh_columns,
+            bounds_ptr,
+            width, height,
+            self.left, self.bottom,
+            self.columns, self.rows,
+            generate_numpy_begin(counts)
+        )
+
+        self.offsets = np.zeros(len(counts) + 1, dtype=np.int32)
+        np.cumsum(counts, out=self.offsets[1:])
+
+        self.cells = np.zeros(self.offsets[-1], dtype=np.int32)
+
+        fill_tile_bins(
+            mesh_rows, mesh_columns,
+            bounds_ptr,
+            width, height,
+            self.left, self.bottom,
+            self.columns, self.rows,
+            generate_numpy_begin(self.offsets),
+            generate_numpy_begin(self.cells)
+        )
+
+
+    def get_cells(self, origin):
+        width, height = self.tile_shape
+
+        x = int(origin[0] // width) - self.left
+        y = int(origin[1] // height) - self.bottom
+
+        if not (0 <= x < self.columns and 0 <= y < self.rows):
+            return self.cells[:0]
+
+        k = y * self.columns + x
+        return self.cells[self.offsets[k]:self.offsets[k + 1]]
+
+
+    def origins(self, bounds=None):
+        '''Origins of the tiles with at least one cell, of those overlapping
+        the Rectangle bounds if given
+        '''
+        width, height = self.tile_shape
+        counts = (self.offsets[1:] - self.offsets[:-1]).reshape(self.rows, self.columns)
+
+        x0, y0 = 0, 0
+
+        if bounds is not None:
+            x0 = max(int(math.floor(bounds.left / width)) - self.left, 0)
+            y0 = max(int(math.floor(bounds.bottom / height)) - self.bottom, 0)
+            x1 = min(int(math.ceil(bounds.right / width)) - self.left, self.columns)
+            y1 = min(int(math.ceil(bounds.top / height)) - self.bottom, self.rows)
+
+            if x1 <= x0 or y1 <= y0:
+                return
+
+            counts = counts[y0:y1, x0:x1]
+
+        columns = counts.shape[1]
+
+        for k in np.flatnonzero(counts):
+            y, x = divmod(int(k), columns)
+            yield ((self.left + x0 + x) * width, (self.bottom + y0 + y) * height)
@@ -0,0 +1,198 @@
+__all__ = [ 'TileBufferPool', 'tile_buffer_pool' ]
+
+from .Exceptions import HandsomeException
+from .capi import c_void_p, generate_numpy_begin
+
+from collections import OrderedDict
+
+import numpy as np
+import threading
+import weakref
+
+class TileBufferPool:
+    '''TileBufferPool - Recycles tile buffers of each (shape, dtype) from shared slabs
+
+    Buffers are cut from slabs of about slab_size bytes. A released buffer
+    goes back to its slab and is handed out again, zeroed, before any new
+    slab is allocated.
+
+    Slabs whose buffers are all free are kept for reuse, and dropped least
+    recently emptied first whenever the pool holds more than max_bytes.
+    Allocating a slab that would take the pool past max_bytes when nothing
+    is left to drop raises HandsomeException. max_bytes of None leaves the
+    pool unbounded.
+    '''
+
+    def __init__(self, slab_size=int(4 * 2 ** 20), max_bytes=None):
+        self.slab_size = slab_size
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+
+        self.slabs = { }
+        self.empty_slabs = OrderedDict()
+
+        self.bytes_held = 0
+        self.bytes_in_use = 0
+
+
+    @property
+    def bytes_free(self):
+        return self.bytes_held - self.bytes_in_use
+
+
+    @property
+    def slab_count(self):
+        return sum(len(slabs) for slabs in self.slabs.values())
+
+
+    def stats(self):
+        with self.lock:
+            return {
+                'bytes_in_use' : self.bytes_in_use,
+                'bytes_free'   : self.bytes_free,
+                'slab_count'   : self.slab_count,
+            }
+
+
+    def acquire(self, shape, dtype):
+        '''Returns (ptr, buffer, slot) for a zeroed buffer; pass slot to release'''
+        key = (tuple(shape), np.dtype(dtype))
+
+        with self.lock:
+            slab = self.find_slab(key)
+
+            if slab is None:
+                slab = self.allocate_slab(key)
+
+            if len(slab.free) == slab.count:
+                self.empty_slabs.pop(id(slab), None)
+
+            index = slab.free.pop()
+            self.bytes_in_use += slab.buffer_size
+
+        ptr, buffer = slab.get_buffer(index)
+        buffer.fill(0)
+
+        return ptr, buffer, (slab, index)
+
+
+    def release_when_unused(self, buffer, slot):
+        '''Releases slot once buffer, from acquire, and every view of it are collected
+
+        Returns the weakref.finalize doing so, which releases the slot
+        straight away when called.
+        '''
+        return weakref.finalize(buffer.base, self.release, slot)
+
+
+    def release(self, slot):
+        slab, index = slot
+
+        with self.lock:
+            slab.free.append(index)
+            self.bytes_in_use -= slab.buffer_size
+
+            if len(slab.free) == slab.count:
+                self.empty_slabs[id(slab)] = slab
+                self.evict(self.max_bytes)
+
+
+    def trim(self):
+        '''Drops every slab whose buffers are all free'''
+        with self.lock:
+            self.evict(0)
+
+
+    def find_slab(self, key):
+        # Partly used slabs are filled first so empty ones stay evictable.
+        best = None
+
+        for slab in self.slabs.get(key, ()):
+            free = len(slab.free)
+
+            if free and (best is None or free < len(best.free)):
+                best = slab
+
+        return best
+
+
+    def allocate_slab(self, key):
+        shape, dtype = key
+        slab = Slab(shape, dtype, self.slab_size)
+
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes - slab.size)
+
+            if self.bytes_held + slab.size > self.max_bytes:
+                raise HandsomeException(
+                    'tile buffer pool is full',
+                    {
+                        'max_bytes'    : self.max_bytes,
+                        'bytes_in_use' : self.bytes_in_use,
+                        'slab_size'    : slab.size,
+                    }
+                )
+
+        slab.allocate()
+
+        self.slabs.setdefault(key, [ ]).append(slab)
+        self.bytes_held += slab.size
+
+        return slab
+
+
+    def evict(self, limit):
+        if limit is None:
+            return
+
+        while self.bytes_held > limit and self.empty_slabs:
+            _, slab = self.empty_slabs.popitem(last=False)
+
+            slabs = self.slabs[slab.key]
+            slabs.remove(slab)
+
+            if not slabs:
+                del self.slabs[slab.key]
+
+            self.bytes_held -= slab.size
+
+
+class Slab:
+    def __init__(self, shape, dtype, slab_size):
+        self.key = (shape, dtype)
+
+        self.items_per_buffer = int(np.prod(shape))
+        self.buffer_size = self.items_per_buffer * dtype.itemsize
+        self.count = max(int(slab_size // self.buffer_size), 1)
+        self.size = self.count * self.buffer_size
+
+        self.array = None
+        self.free = list(reversed(range(self.count)))
+
+
+    def allocate(self):
+        self.array = np.zeros(self.count * self.items_per_buffer, dtype=self.key[1])
+        self.begin = generate_numpy_begin(self.array)
+
+
+    def get_buffer(self, index):
+        start = index * self.items_per_buffer
+        end = start + self.items_per_buffer
+
+        ptr = c_void_p(self.begin.value + start * self.key[1].itemsize)
+        buffer = np.asarray(BufferLease(self.array[start:end].reshape(self.key[0])))
+
+        return ptr, buffer
+
+
+class BufferLease:
+    # The base of every buffer a pool hands out. numpy keeps it alive for as
+    # long as any view of the buffer is, so a slot released once its lease
+    # is collected is never handed out again while still in use.
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.__array_interface__ = buffer.__array_interface__
+
+
+tile_buffer_pool = TileBufferPool()
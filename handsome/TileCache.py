@@ -1,14 +1,47 @@
 from .Coordinate import Coordinate
 from .Pixel import Pixel
 from .Tile import Tile
+from .tile_order import order_origins
+
+from collections import OrderedDict
+
+import numpy as np
+import threading
 
 class TileCache:
-    def __init__(self, tile_shape, sample_rate=1, dtype=Pixel):
+    '''TileCache - Tiles of one shape and sample rate, created on demand
+
+    With max_resident_tiles set, only that many of the most recently used
+    tiles keep their buffers in memory. Colder tiles are spilled, depth
+    buffers included, to memory-mapped scratch files in scratch_directory
+    (the system temporary directory by default) and read back in when next
+    used. Tiles of a bounded cache should be taken from get_tile and used
+    before the next call to it, so they cannot be filled from several
+    threads at once.
+
+    tile_order, one of tile_order.TILE_ORDERS, sets the order in which
+    get_tiles_for_bounds and render_mesh visit tiles.
+    '''
+
+    def __init__(
+        self, tile_shape, sample_rate=1, dtype=Pixel, pool=None,
+        max_resident_tiles=None, scratch_directory=None, tile_order='hilbert'
+    ):
         self.tiles = { }
+        self.lock = threading.Lock()
 
         self.tile_shape = tile_shape
         self.sample_rate = sample_rate
         self.dtype = dtype
+        self.pool = pool
+
+        self.max_resident_tiles = max_resident_tiles
+        self.scratch_directory = scratch_directory
+        self.tile_order = tile_order
+
+        self.recent_tiles = OrderedDict()
+        self.spill_file = None
+        self.depth_spill_file = None
 
 
     def tile_origin_for_coordinate(self, coordinate):
@@ -22,28 +55,136 @@ class TileCache:
 
     def get_tile(self, coordinate):
         origin = self.tile_origin_for_coordinate(coordinate)
-        tile = self.tiles.get(origin)
 
-        if tile is not None:
-            return tile
+        if self.max_resident_tiles is None:
+            tile = self.tiles.get(origin)
+
+            if tile is not None:
+                return tile
 
-        tile = Tile(origin, self.tile_shape, self.sample_rate, self.dtype)
+        with self.lock:
+            tile = self.tiles.get(origin)
+
+            if tile is None:
+                tile = Tile(origin, self.tile_shape, self.sample_rate, self.dtype, self.pool)
+                self.tiles[origin] = tile
+
+            if self.max_resident_tiles is not None:
+                self.mark_recent(tile)
 
-        self.tiles[origin] = tile
         return tile
 
 
+    def page_in(self, tile):
+        # Tiles read back in by touching their buffers directly still count
+        # towards max_resident_tiles.
+        with self.lock:
+            if self.tiles.get(tile.origin) is tile:
+                self.mark_recent(tile)
+
+
+    def mark_recent(self, tile):
+        self.recent_tiles[tile.origin] = tile
+        self.recent_tiles.move_to_end(tile.origin)
+        self.spill_cold_tiles()
+
+
+    def spill_cold_tiles(self):
+        from .TileSpillFile import TileSpillFile
+
+        while len(self.recent_tiles) > self.max_resident_tiles:
+            _, tile = self.recent_tiles.popitem(last=False)
+
+            if not tile.is_resident:
+                continue
+
+            if self.spill_file is None:
+                self.spill_file = TileSpillFile(
+                    tile.buffer.shape, tile.buffer.dtype,
+                    self.scratch_directory
+                )
+
+                self.depth_spill_file = TileSpillFile(
+                    tile.buffer.shape, np.float32,
+                    self.scratch_directory
+                )
+
+            tile.spill(self.spill_file, self.depth_spill_file, self.page_in)
+
+
     def get_tiles_for_bounds(self, bounds):
         width, height = self.tile_shape
 
         left, bottom = self.tile_origin_for_coordinate((bounds.left, bounds.bottom))
         right, top   = self.tile_origin_for_coordinate((bounds.right + width, bounds.top + height))
 
-        for x in range(left, right, width):
-            for y in range(bottom, top, height):
-                yield self.get_tile((x, y))
+        origins = [
+            (x, y)
+            for x in range(left, right, width)
+            for y in range(bottom, top, height)
+        ]
+
+        for origin in self.order_origins(origins):
+            yield self.get_tile(origin)
+
+
+    def order_origins(self, origins):
+        '''Returns the tile origins in origins sorted into tile_order'''
+        return order_origins(origins, self.tile_shape, self.tile_order)
+
+
+    def composite_into(self, target, premultiplied=False):
+        if target.is_file_backed:
+            self.composite_into_file(target, premultiplied)
+            return
+
+        if self.max_resident_tiles is None:
+            for source in self.tiles.values():
+                target.composite_from(source, premultiplied)
+            return
+
+        for origin in list(self.tiles):
+            target.composite_from(self.get_tile(origin), premultiplied)
+
+
+    def composite_into_file(self, target, premultiplied=False):
+        # Rows of tiles are composited from the top down, and the target rows
+        # under each are evicted once it is done, so the target is only ever
+        # mapped in one band of tile rows at a time.
+        height = self.tile_shape[1]
+        top = target.origin[1] + target.shape[1]
+        rows = target.shape[1] * target.sample_rate
+
+        origins = sorted(self.tiles, key=lambda origin: (-origin[1], origin[0]))
+
+        for k, origin in enumerate(origins):
+            if self.max_resident_tiles is None:
+                source = self.tiles[origin]
+            else:
+                source = self.get_tile(origin)
+
+            target.composite_from(source, premultiplied)
+
+            if k + 1 == len(origins) or origins[k + 1][1] != origin[1]:
+                begin = (top - origin[1] - height) * target.sample_rate
+                end = (top - origin[1]) * target.sample_rate
+
+                target.evict_rows(max(begin, 0), min(end, rows))
+
+
+    def clear(self):
+        '''Drops every tile, returning their buffers to the pool'''
+        with self.lock:
+            tiles = list(self.tiles.values())
+            self.tiles.clear()
+            self.recent_tiles.clear()
+
+            spill_files = (self.spill_file, self.depth_spill_file)
+            self.spill_file = self.depth_spill_file = None
 
+        for tile in tiles:
+            tile.release()
 
-    def composite_into(self, target):
-        for source in self.tiles.values():
-            target.composite_from(source)
+        for spill_file in spill_files:
+            if spill_file is not None:
+                spill_file.close()
@@ -0,0 +1,74 @@
+__all__ = [ 'TileSpillFile' ]
+
+import numpy as np
+import os
+import tempfile
+import weakref
+
+class TileSpillFile:
+    '''TileSpillFile - Memory-mapped scratch file holding tile buffers moved out of RAM
+
+    Records are buffers of one shape and dtype, addressed by the slot
+    allocate() returns. The file doubles in size whenever it runs out of
+    slots, and is deleted by close() or once the object is collected.
+    '''
+
+    def __init__(self, shape, dtype, directory=None, capacity=16):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+        fd, self.path = tempfile.mkstemp(prefix='handsome_tiles_', suffix='.bin', dir=directory)
+        os.close(fd)
+
+        self.finalizer = weakref.finalize(self, remove_file, self.path)
+
+        self.records = None
+        self.capacity = 0
+        self.count = 0
+
+        self.grow(capacity)
+
+
+    def grow(self, capacity):
+        record_size = self.dtype.itemsize * int(np.prod(self.shape))
+
+        # Drop the old mapping before resizing the file under it.
+        self.records = None
+
+        with open(self.path, 'r+b') as f:
+            f.truncate(capacity * record_size)
+
+        self.records = np.memmap(
+            self.path, dtype=self.dtype, mode='r+',
+            shape=(capacity,) + self.shape
+        )
+
+        self.capacity = capacity
+
+
+    def allocate(self):
+        if self.count == self.capacity:
+            self.grow(2 * self.capacity)
+
+        self.count += 1
+        return self.count - 1
+
+
+    def write(self, slot, buffer):
+        self.records[slot] = buffer
+
+
+    def read(self, slot, out):
+        out[...] = self.records[slot]
+
+
+    def close(self):
+        self.records = None
+        self.finalizer()
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -4,6 +4,7 @@ from .Micropolygon import Micropolygon
 from .MicropolygonMesh import MicropolygonMesh, Position
 from .Pixel import FloatPixel, array_view, pixel_view
 from .Tile import Tile
+from .TileBufferPool import TileBufferPool
 from .TileCache import TileCache
 from .capi import fill_micropolygon_mesh, generate_numpy_begin
 from .util import save_array_as_image, point, parse_color, normalize
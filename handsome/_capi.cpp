@@ -1,4 +1,15 @@
 #include <algorithm>
+#include <cmath>
+#include <cstdio>
+#include <cstring>
+#include <limits>
+#include <vector>
+
+#include "BatchInverter.hpp"
+#include "BilinearInverter.hpp"
+#include "BitmapWriter.hpp"
+#include "HalfPixel.hpp"
+#include "Quantize.hpp"
 #include "RationalBilinearInverter.hpp"
 
 typedef Vec2 Coordinate;
@@ -15,6 +26,42 @@ struct Rectangle {
   float left, bottom, right, top;
 };
 
+// One mesh of a fill_micropolygon_meshes call. affine is the flag
+// fill_bounds_buffer reports for the mesh, pyramid the output of
+// fill_bounds_pyramid for its bounds, or null, and coefficients the output
+// of fill_inverter_coefficients for it, or null.
+struct MeshReference {
+  Vertex const * mesh;
+  BoundingBox const * bounds;
+  BoundingBox const * pyramid;
+  RationalBilinearCoefficients const * coefficients;
+  int rows, columns;
+  int affine;
+};
+
+// The samples of a tile a fill has written, as the rectangle
+// [row_begin, row_end) x [column_begin, column_end). It is empty while
+// row_end <= row_begin, and starts out as (rows, 0, columns, 0), so that
+// writes only ever grow it.
+struct Coverage {
+  Coverage(int rows, int columns)
+    : row_begin(rows), row_end(0), column_begin(columns), column_end(0)
+  { }
+
+  void add(int i, int j) {
+    row_begin = (std::min)(row_begin, i);
+    row_end = (std::max)(row_end, i + 1);
+    column_begin = (std::min)(column_begin, j);
+    column_end = (std::max)(column_end, j + 1);
+  }
+
+  int row_begin, row_end, column_begin, column_end;
+};
+
+struct InverterSolution {
+  float alpha, u, v;
+};
+
 inline std::ostream & operator << (std::ostream & out, Vertex const & v) {
   out << "Vertex(position=" << v.position
     << ", color=" << v.color
@@ -48,94 +95,259 @@ namespace {
     return points_are_close(v.position, p);
   }
 
+  // floor(value) clamped to [low, high]; NaN maps to low.
+  inline int clamped_floor(float value, int low, int high) {
+    if (!(value > low)) { return low; }
+    if (!(value < high)) { return high; }
+    return static_cast<int>(std::floor(value));
+  }
+
+  struct SampleWindow {
+    int row_begin, row_end, column_begin, column_end;
+
+    bool empty() const { return row_end <= row_begin || column_end <= column_begin; }
+  };
+
+  // Sample positions of a tile, laid out as make_coordinate_image in Tile.py
+  // lays them out: row i, column j sits at x = left + j * dx and
+  // y = bottom + (rows - 1 - i) * dy, evaluated in double as numpy.linspace
+  // does and then rounded to float. Only one row and one column of positions
+  // are stored, rather than a coordinate for every sample.
+  struct SampleGrid {
+    SampleGrid(Rectangle const & bounds, int rows, int columns)
+      : xs(columns), ys(rows)
+    {
+      double dx = (static_cast<double>(bounds.right) - bounds.left) / columns,
+             dy = (static_cast<double>(bounds.top) - bounds.bottom) / rows;
+
+      for (int j = 0; j < columns; ++j) { xs[j] = static_cast<float>(j * dx + bounds.left); }
+      for (int i = 0; i < rows; ++i) { ys[i] = static_cast<float>((rows - 1 - i) * dy + bounds.bottom); }
+    }
+
+    float x(int j) const { return xs[j]; }
+    float y(int i) const { return ys[i]; }
+
+    std::vector<float> xs, ys;
+  };
+
+  // Sample (i, j) of a tile lies at x = left + j * dx, y = top - (i + 1) * dy.
+  // The window is padded by one sample on each side so rounding in the
+  // sample positions can never drop a sample the bounds test would accept.
+  inline SampleWindow sample_window_for_bounds(
+    Vec4 const & bounding_box,
+    Rectangle const & tile_bounds,
+    int rows, int columns
+  )
+  {
+    float dx = (tile_bounds.right - tile_bounds.left) / columns,
+          dy = (tile_bounds.top - tile_bounds.bottom) / rows;
+
+    SampleWindow out;
+
+    out.column_begin = clamped_floor((bounding_box.x() - tile_bounds.left) / dx - 1, 0, columns);
+    out.column_end   = clamped_floor((bounding_box.z() - tile_bounds.left) / dx + 2, 0, columns);
+    out.row_begin    = clamped_floor((tile_bounds.top - bounding_box.w()) / dy - 2, 0, rows);
+    out.row_end      = clamped_floor((tile_bounds.top - bounding_box.y()) / dy + 1, 0, rows);
+
+    return out;
+  }
+
+  inline Pixel interpolate_color(
+    Vertex const & lower_left,  Vertex const & upper_left,
+    Vertex const & lower_right, Vertex const & upper_right,
+    float u, float v
+  )
+  {
+    float up = (1.f - u),
+          vp = (1.f - v)
+    ;
+
+    Vec4 bottom = up * lower_left.color + u * lower_right.color,
+         top    = up * upper_left.color + u * upper_right.color
+    ;
+
+    return vp * bottom + v * top;
+  }
+
+  // While every w is positive, z / w over the patch is a weighted average of
+  // the corner ratios, so the smallest of them bounds the nearest hit.
+  inline float nearest_depth(
+    Vertex const & lower_left,  Vertex const & upper_left,
+    Vertex const & lower_right, Vertex const & upper_right
+  )
+  {
+    Vertex const * corners[4] = { &lower_left, &upper_left, &lower_right, &upper_right };
+    float out = std::numeric_limits<float>::infinity();
+
+    for (int i = 0; i < 4; ++i) {
+      Point const & p = corners[i]->position;
+
+      if (!(p.w() > 0.f)) { return -std::numeric_limits<float>::infinity(); }
+      out = (std::min)(out, p.z() / p.w());
+    }
+
+    return out;
+  }
+
+  // depth may be null. Otherwise it holds one entry per tile sample; a hit is
+  // only written when its depth is no farther than the stored one, which it
+  // then replaces.
+  template <typename Out>
   void _fill_micropolygon(
     Vertex const & lower_left,  Vertex const & upper_left,
     Vertex const & lower_right, Vertex const & upper_right,
     Vec4 const & bounding_box,
+    RationalBilinearCoefficients const * precomputed,
+    Rectangle const & tile_bounds,
     int rows, int columns,
-    Coordinate const * coordinates,
-    Pixel * tile
+    SampleGrid const & samples,
+    Out * tile,
+    float * depth,
+    Coverage & coverage
   )
   {
-    for (int i = 0; i < rows; ++i) {
-      Vec2 const * coordinate_row = coordinates + i * columns;
-      Pixel * image_row = tile + i * columns;
+    SampleWindow window = sample_window_for_bounds(bounding_box, tile_bounds, rows, columns);
 
-      for (int j = 0; j < columns; ++j) {
-        Coordinate const & c = *(coordinate_row + j);
+    if (window.empty()) { return; }
+
+    RationalBilinearCoefficients local;
+
+    if (!precomputed) {
+      local.setup(
+        lower_left.position, lower_right.position,
+        upper_left.position, upper_right.position
+      );
+    }
+
+    RationalBilinearCoefficients const & coefficients = precomputed ? *precomputed : local;
+
+    float nearest = depth
+      ? nearest_depth(lower_left, upper_left, lower_right, upper_right)
+      : 0.f;
+
+    for (int i = window.row_begin; i < window.row_end; ++i) {
+      Out * image_row = tile + i * columns;
+      float * depth_row = depth ? depth + i * columns : 0;
+      float y = samples.y(i);
+
+      for (int j = window.column_begin; j < window.column_end; ++j) {
+        Coordinate c(samples.x(j), y);
 
         bool skip =
           c.x() < bounding_box.x() || bounding_box.z() < c.x()
-            || c.y() < bounding_box.y() || bounding_box.w() < c.y();
+            || c.y() < bounding_box.y() || bounding_box.w() < c.y()
+            || (depth_row && nearest > *(depth_row + j));
 
         if (skip) { continue; }
 
-        RationalBilinearInverter rbi(
-          c,
-          lower_left.position, lower_right.position,
-          upper_left.position, upper_right.position
-        );
+        RationalBilinearInverter rbi(c, coefficients);
 
         if (rbi.empty()) { continue; }
 
-        Vec2 const & uv = rbi.front().second;
+        if (depth_row) {
+          float alpha = rbi.front().first;
 
-        float u = uv.x(),
-              v = uv.y(),
-              up = (1.f - u),
-              vp = (1.f - v)
-        ;
+          if (alpha > *(depth_row + j)) { continue; }
+          *(depth_row + j) = alpha;
+        }
 
-        Vec4 bottom = up * lower_left.color + u * lower_right.color,
-             top    = up * upper_left.color + u * upper_right.color
-        ;
+        Vec2 const & uv = rbi.front().second;
 
-        *(image_row + j) = vp * bottom + v * top;
+        coverage.add(i, j);
+
+        store_pixel(*(image_row + j), interpolate_color(
+          lower_left, upper_left,
+          lower_right, upper_right,
+          uv.x(), uv.y()
+        ));
       }
     }
   }
 
-  void _fill_micropolygon_mesh(
-    int mesh_rows, int mesh_columns,
-    Vertex const * mesh, BoundingBox const * bounds,
-    int tile_rows, int tile_columns,
+  template <typename Out>
+  void _fill_micropolygon_batched(
+    Vertex const & lower_left,  Vertex const & upper_left,
+    Vertex const & lower_right, Vertex const & upper_right,
+    Vec4 const & bounding_box,
+    RationalBilinearCoefficients const * precomputed,
     Rectangle const & tile_bounds,
-    Coordinate * coordinates,
-    Pixel * tile
+    int rows, int columns,
+    SampleGrid const & samples,
+    Out * tile,
+    float * depth,
+    Coverage & coverage
   )
   {
-    int bounds_columns = mesh_columns - 1;
+    SampleWindow window = sample_window_for_bounds(bounding_box, tile_bounds, rows, columns);
 
-    for (int i = 1; i < mesh_rows; ++i) {
-      Vertex const * lower_row = mesh + i * mesh_columns;
-      BoundingBox const * bounds_row = bounds + (i - 1) * bounds_columns;
+    if (window.empty()) { return; }
 
-      for (int j = 1; j < mesh_columns; ++j) {
-        Vertex const
-          * lower_right = lower_row + j,
-          * lower_left  = lower_right - 1,
-          * upper_right = lower_right - mesh_columns,
-          * upper_left  = lower_left - mesh_columns
-        ;
+    BatchInverterCoefficients coefficients(
+      lower_left.position, lower_right.position,
+      upper_left.position, upper_right.position,
+      bounding_box.x(), bounding_box.y()
+    );
+
+    float nearest = depth
+      ? nearest_depth(lower_left, upper_left, lower_right, upper_right)
+      : 0.f;
 
-        Vec4 const & poly_bounds = *(bounds_row + j - 1);
+    // Samples of the whole window that survive the bounds and depth tests
+    // are batched together, so micropolygons only a few samples wide still
+    // fill complete vector lanes.
+    int const batch_size = 64;
+
+    float xs[batch_size], ys[batch_size],
+          us[batch_size], vs[batch_size], alphas[batch_size];
+
+    int hits[batch_size], indices[batch_size];
+
+    int window_columns = window.column_end - window.column_begin,
+        window_size = (window.row_end - window.row_begin) * window_columns,
+        position = 0;
+
+    while (position < window_size) {
+      int count = 0;
+
+      for (; position < window_size && count < batch_size; ++position) {
+        int i = window.row_begin + position / window_columns,
+            j = window.column_begin + position % window_columns,
+            index = i * columns + j;
+
+        float x = samples.x(j), y = samples.y(i);
 
         bool skip =
-          tile_bounds.right < poly_bounds.x()
-            || poly_bounds.z() < tile_bounds.left
-            || tile_bounds.top < poly_bounds.y()
-            || poly_bounds.w() < tile_bounds.bottom
-        ;
+          x < bounding_box.x() || bounding_box.z() < x
+            || y < bounding_box.y() || bounding_box.w() < y
+            || (depth && nearest > *(depth + index));
 
         if (skip) { continue; }
 
-        _fill_micropolygon(
-          *lower_left, *upper_left,
-          *lower_right, *upper_right,
-          poly_bounds,
-          tile_rows, tile_columns,
-          coordinates, tile
-        );
+        xs[count] = x;
+        ys[count] = y;
+        indices[count] = index;
+        ++count;
+      }
+
+      invert_batch(coefficients, count, xs, ys, hits, us, vs, alphas);
+
+      for (int k = 0; k < count; ++k) {
+        if (!hits[k]) { continue; }
+
+        int index = indices[k];
+
+        if (depth) {
+          if (alphas[k] > *(depth + index)) { continue; }
+          *(depth + index) = alphas[k];
+        }
+
+        coverage.add(index / columns, index % columns);
+
+        store_pixel(*(tile + index), interpolate_color(
+          lower_left, upper_left,
+          lower_right, upper_right,
+          us[k], vs[k]
+        ));
       }
     }
   }
@@ -144,159 +356,1439 @@ namespace {
     return Vec2(point.x() / point.z(), point.y() / point.z());
   }
 
-  inline Vec4 make_bounding_box(Vec2 const & left, Vec2 const & right) {
-    Vec4 out(
-      left.x(), left.y(),
-      right.x(), right.y()
+  // For meshes whose vertices all share one z and w (see fill_bounds_buffer),
+  // where screen space is an affine image of the mesh and every hit has the
+  // same depth, so no rational inversion is needed.
+  template <typename Out>
+  void _fill_micropolygon_affine(
+    Vertex const & lower_left,  Vertex const & upper_left,
+    Vertex const & lower_right, Vertex const & upper_right,
+    Vec4 const & bounding_box,
+    RationalBilinearCoefficients const * precomputed,
+    Rectangle const & tile_bounds,
+    int rows, int columns,
+    SampleGrid const & samples,
+    Out * tile,
+    float * depth,
+    Coverage & coverage
+  )
+  {
+    SampleWindow window = sample_window_for_bounds(bounding_box, tile_bounds, rows, columns);
+
+    if (window.empty()) { return; }
+
+    Point const & position = lower_left.position;
+    float alpha = position.z() / position.w();
+
+    if (position.w() == 0.f || !(alpha >= 1.f - 1e-3f)) { return; }
+
+    BilinearCoefficients coefficients(
+      to_projection_plane(lower_left.position), to_projection_plane(lower_right.position),
+      to_projection_plane(upper_left.position), to_projection_plane(upper_right.position)
     );
 
-    if (out.z() < out.x()) { std::swap(out.x(), out.z()); }
-    if (out.w() < out.y()) { std::swap(out.y(), out.w()); }
+    for (int i = window.row_begin; i < window.row_end; ++i) {
+      Out * image_row = tile + i * columns;
+      float * depth_row = depth ? depth + i * columns : 0;
+      float y = samples.y(i);
 
-    return out;
+      for (int j = window.column_begin; j < window.column_end; ++j) {
+        Coordinate c(samples.x(j), y);
+
+        bool skip =
+          c.x() < bounding_box.x() || bounding_box.z() < c.x()
+            || c.y() < bounding_box.y() || bounding_box.w() < c.y()
+            || (depth_row && alpha > *(depth_row + j));
+
+        if (skip) { continue; }
+
+        Vec2 uv;
+
+        if (!coefficients.invert(c, uv)) { continue; }
+
+        if (depth_row) { *(depth_row + j) = alpha; }
+
+        coverage.add(i, j);
+
+        store_pixel(*(image_row + j), interpolate_color(
+          lower_left, upper_left,
+          lower_right, upper_right,
+          uv.x(), uv.y()
+        ));
+      }
+    }
   }
 
-  inline Vec4 combine_bounding_boxes(Vec4 const & left, Vec4 const & right) {
-    return Vec4(
-      (std::min)(left.x(), right.x()),
-      (std::min)(left.y(), right.y()),
-      (std::max)(left.z(), right.z()),
-      (std::max)(left.w(), right.w())
+  // Fillers write Out samples: Pixel for FloatPixel tiles, HalfPixel for
+  // HalfPixel ones.
+  template <typename Out>
+  using MicropolygonFiller = void (*)(
+    Vertex const &, Vertex const &,
+    Vertex const &, Vertex const &,
+    Vec4 const &,
+    RationalBilinearCoefficients const *,
+    Rectangle const &,
+    int, int,
+    SampleGrid const &,
+    Out *,
+    float *,
+    Coverage &
+  );
+
+  inline bool overlaps_tile(BoundingBox const & b, Rectangle const & tile_bounds) {
+    return !(
+      tile_bounds.right < b.x()
+        || b.z() < tile_bounds.left
+        || tile_bounds.top < b.y()
+        || b.w() < tile_bounds.bottom
     );
   }
 
-  BoundingBox _fill_bounds_buffer(
-    int mesh_rows, int mesh_columns,
-    Vertex const * mesh,
-    BoundingBox * bounds
+  // Level k of a bounds pyramid covers blocks of 2^k x 2^k cells of the
+  // bounds grid, level 0 being the grid itself. fill_bounds_pyramid stores
+  // levels 1 and up one after another, ending with a single box.
+  struct PyramidLevel {
+    BoundingBox const * boxes;
+    int rows, columns;
+  };
+
+  int const max_pyramid_levels = 32;
+
+  inline int pyramid_levels(
+    int bounds_rows, int bounds_columns,
+    BoundingBox const * bounds, BoundingBox const * pyramid,
+    PyramidLevel * levels
   )
   {
-    int bounds_rows = mesh_rows - 1,
-      bounds_columns = mesh_columns - 1;
+    PyramidLevel level = { bounds, bounds_rows, bounds_columns };
+    int count = 0;
 
-    Vec2 left = to_projection_plane(mesh->position),
-      right(0, 0);
+    levels[count++] = level;
 
-    BoundingBox total(left.x(), left.y(), left.x(), left.y());
+    while (level.rows > 1 || level.columns > 1) {
+      level.rows = (level.rows + 1) / 2;
+      level.columns = (level.columns + 1) / 2;
+      level.boxes = pyramid;
 
-    for (int j = 1; j < mesh_columns; ++j) {
-      right = to_projection_plane((mesh + j)->position);
-      *(bounds + j - 1) = make_bounding_box(left, right);
-      total = combine_bounding_boxes(total, *(bounds + j - 1));
-      left = right;
+      pyramid += level.rows * level.columns;
+      levels[count++] = level;
     }
 
-    for(int i = 1; i < mesh_rows; ++i) {
-      Vec4 * lower_bounds = bounds + i * bounds_columns,
-           * upper_bounds = lower_bounds - bounds_columns;
+    return count;
+  }
 
-      Vertex const * lower_row = mesh + i * mesh_columns;
-      left = to_projection_plane(lower_row->position);
+  template <typename Out, MicropolygonFiller<Out> fill_micropolygon>
+  inline void _fill_mesh_cell(
+    int mesh_columns,
+    Vertex const * mesh, BoundingBox const & poly_bounds,
+    RationalBilinearCoefficients const * coefficients,
+    int i, int j,
+    int tile_rows, int tile_columns,
+    Rectangle const & tile_bounds,
+    SampleGrid const & samples,
+    Out * tile,
+    float * depth,
+    Coverage & coverage
+  )
+  {
+    Vertex const
+      * lower_right = mesh + (i + 1) * mesh_columns + j + 1,
+      * lower_left  = lower_right - 1,
+      * upper_right = lower_right - mesh_columns,
+      * upper_left  = lower_left - mesh_columns
+    ;
 
-      for (int j = 1; j < mesh_columns; ++j) {
-        right = to_projection_plane((lower_row + j)->position);
+    fill_micropolygon(
+      *lower_left, *upper_left,
+      *lower_right, *upper_right,
+      poly_bounds,
+      coefficients ? coefficients + i * (mesh_columns - 1) + j : 0,
+      tile_bounds,
+      tile_rows, tile_columns,
+      samples, tile,
+      depth,
+      coverage
+    );
+  }
 
-        Vec4 b = make_bounding_box(left, right);
-        if (i < bounds_rows) { *lower_bounds = b; }
-        *upper_bounds = combine_bounding_boxes(*upper_bounds, b);
+  // The pyramid is descended down to blocks of 2^block_level x 2^block_level
+  // cells; cells inside the blocks that survive are then tested one by one.
+  int const block_level = 3;
 
-        total = combine_bounding_boxes(total, *upper_bounds);
+  // Appends the blocks of block_level under block (i, j) of the given level
+  // whose bounds overlap the tile. The caller has already tested (i, j).
+  void _collect_pyramid_blocks(
+    PyramidLevel const * levels, int level,
+    int i, int j,
+    Rectangle const & tile_bounds,
+    std::vector<int> & blocks
+  )
+  {
+    if (level == block_level) {
+      blocks.push_back(i * levels[level].columns + j);
+      return;
+    }
 
-        ++lower_bounds;
-        ++upper_bounds;
-        left = right;
+    PyramidLevel const & below = levels[level - 1];
+
+    int row_end = (std::min)(2 * i + 2, below.rows),
+        column_end = (std::min)(2 * j + 2, below.columns);
+
+    for (int bi = 2 * i; bi < row_end; ++bi) {
+      for (int bj = 2 * j; bj < column_end; ++bj) {
+        if (!overlaps_tile(*(below.boxes + bi * below.columns + bj), tile_bounds)) { continue; }
+        _collect_pyramid_blocks(levels, level - 1, bi, bj, tile_bounds, blocks);
       }
     }
-
-    return total;
   }
 
-  void _downsample_tile(
-    Vec4 const * in,
-    int in_width, int in_height,
-    int down_width, int down_height,
-    Vec4 * out,
-    int out_width, int out_height
+  // pyramid may be null, in which case every cell's bounds are tested.
+  // Otherwise it is the output of fill_bounds_pyramid for these bounds, and
+  // whole blocks of cells missing the tile are skipped with one test. Cells
+  // are filled in row-major order either way, so overlapping micropolygons
+  // resolve the same.
+  //
+  // coefficients may be null too. Otherwise it is the output of
+  // fill_inverter_coefficients for the mesh, which the rational filler reads
+  // instead of setting up each cell again for every tile it touches.
+  template <typename Out, MicropolygonFiller<Out> fill_micropolygon>
+  void _fill_micropolygon_mesh(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh, BoundingBox const * bounds,
+    BoundingBox const * pyramid,
+    RationalBilinearCoefficients const * coefficients,
+    int tile_rows, int tile_columns,
+    Rectangle const & tile_bounds,
+    SampleGrid const & samples,
+    Out * tile,
+    float * depth,
+    Coverage & coverage
   )
   {
-    float downsample_factor = 1. / static_cast<float>(down_width * down_height);
+    int bounds_rows = mesh_rows - 1,
+        bounds_columns = mesh_columns - 1;
 
-    for (int in_j = 0, out_j = 0; in_j < in_height && out_j < out_height; in_j += down_height, ++out_j) {
-      Vec4 * out_row = (out + out_j * out_width);
+    PyramidLevel levels[max_pyramid_levels];
+    int top = pyramid
+      ? pyramid_levels(bounds_rows, bounds_columns, bounds, pyramid, levels) - 1
+      : 0;
 
-      for (int in_i = 0, out_i = 0; in_i < in_width && out_i < out_width; in_i += down_width, ++out_i) {
-        Vec4 sample(0, 0, 0, 0);
+    if (top > block_level) {
+      if (!overlaps_tile(*levels[top].boxes, tile_bounds)) { return; }
 
-        int end_i = (std::min)(in_width, in_i + down_width),
-            end_j = (std::min)(in_height, in_j + down_height);
+      std::vector<int> blocks;
+      _collect_pyramid_blocks(levels, top, 0, 0, tile_bounds, blocks);
+      std::sort(blocks.begin(), blocks.end());
 
-        for (int j = in_j; j < end_j; ++j) {
-          Vec4 const * in_row = in + j * in_width;
+      int block_columns = levels[block_level].columns,
+          block_size = 1 << block_level;
 
-          for (int i = in_i; i < end_i; ++i) {
-            sample += *(in_row + i);
+      // Walk one row of blocks at a time, cell row by cell row, so cells
+      // come out in row-major order.
+      for (std::vector<int>::const_iterator first = blocks.begin(); first != blocks.end(); ) {
+        int block_row = *first / block_columns;
+
+        std::vector<int>::const_iterator last = first;
+        while (last != blocks.end() && *last / block_columns == block_row) { ++last; }
+
+        int row_end = (std::min)((block_row + 1) * block_size, bounds_rows);
+
+        for (int i = block_row * block_size; i < row_end; ++i) {
+          BoundingBox const * bounds_row = bounds + i * bounds_columns;
+
+          for (std::vector<int>::const_iterator it = first; it != last; ++it) {
+            int column_begin = (*it % block_columns) * block_size,
+                column_end = (std::min)(column_begin + block_size, bounds_columns);
+
+            for (int j = column_begin; j < column_end; ++j) {
+              BoundingBox const & poly_bounds = *(bounds_row + j);
+
+              if (!overlaps_tile(poly_bounds, tile_bounds)) { continue; }
+
+              _fill_mesh_cell<Out, fill_micropolygon>(
+                mesh_columns, mesh, poly_bounds,
+                coefficients,
+                i, j,
+                tile_rows, tile_columns,
+                tile_bounds,
+                samples, tile,
+                depth,
+                coverage
+              );
+            }
           }
         }
 
-        *(out_row + out_i) = downsample_factor * sample;
+        first = last;
       }
-    }
-  }
 
-    void _print_coordinates(Coordinate const * coordinates, int length) {
-        length = (std::min)(length, 64);
+      return;
+    }
 
-        for (int i = 0; i < length; ++i) {
-            Coordinate const & c = coordinates[i];
+    for (int i = 0; i < bounds_rows; ++i) {
+      BoundingBox const * bounds_row = bounds + i * bounds_columns;
 
-            std::cout << "coordinates[" << i << "] = " << c << std::endl;
-        }
-    }
+      for (int j = 0; j < bounds_columns; ++j) {
+        BoundingBox const & poly_bounds = *(bounds_row + j);
 
-    void _print_vertices(Vertex const * vertices, int length) {
-        length = (std::min)(length, 64);
+        if (!overlaps_tile(poly_bounds, tile_bounds)) { continue; }
 
-        for (int i = 0; i < length; ++i) {
-            Vertex const & v = vertices[i];
-            std::cout << "vertices[" << i << "] = " << v << std::endl;
-        }
+        _fill_mesh_cell<Out, fill_micropolygon>(
+          mesh_columns, mesh, poly_bounds,
+          coefficients,
+          i, j,
+          tile_rows, tile_columns,
+          tile_bounds,
+          samples, tile,
+          depth,
+          coverage
+        );
+      }
     }
-}
+  }
 
-extern "C" {
-  void fill_micropolygon_mesh(
+  template <typename Out, MicropolygonFiller<Out> fill_micropolygon>
+  void _fill_micropolygon_mesh_bin(
     int mesh_rows, int mesh_columns,
     Vertex const * mesh, BoundingBox const * bounds,
+    RationalBilinearCoefficients const * coefficients,
+    int const * cells, int cell_count,
     int tile_rows, int tile_columns,
-    Rectangle tile_bounds,
-    Coordinate * coordinates,
-    Pixel * tile
+    Rectangle const & tile_bounds,
+    Out * tile,
+    float * depth,
+    Coverage & coverage
   )
   {
-    _fill_micropolygon_mesh(
-      mesh_rows, mesh_columns,
-      mesh, bounds,
-      tile_rows, tile_columns,
-      tile_bounds,
-      coordinates, tile
-    );
+    SampleGrid samples(tile_bounds, tile_rows, tile_columns);
+    int bounds_columns = mesh_columns - 1;
+
+    for (int k = 0; k < cell_count; ++k) {
+      int cell = *(cells + k),
+          i = cell / bounds_columns + 1,
+          j = cell % bounds_columns + 1;
+
+      Vertex const
+        * lower_right = mesh + i * mesh_columns + j,
+        * lower_left  = lower_right - 1,
+        * upper_right = lower_right - mesh_columns,
+        * upper_left  = lower_left - mesh_columns
+      ;
+
+      fill_micropolygon(
+        *lower_left, *upper_left,
+        *lower_right, *upper_right,
+        *(bounds + cell),
+        coefficients ? coefficients + cell : 0,
+        tile_bounds,
+        tile_rows, tile_columns,
+        samples, tile,
+        depth,
+        coverage
+      );
+    }
   }
 
-  Rectangle fill_bounds_buffer(
-    int mesh_rows, int mesh_columns,
-    Vertex const * mesh,
-    BoundingBox * bounds
+  // Picks the filler for each mesh: fill_affine where the mesh is flagged
+  // affine, fill_micropolygon otherwise.
+  template <
+    typename Out,
+    MicropolygonFiller<Out> fill_micropolygon, MicropolygonFiller<Out> fill_affine
+  >
+  void _fill_micropolygon_meshes(
+    MeshReference const * meshes,
+    int const * indices, int index_count,
+    int tile_rows, int tile_columns,
+    Rectangle const & tile_bounds,
+    Out * tile,
+    float * depth,
+    Coverage & coverage
+  )
+  {
+    SampleGrid samples(tile_bounds, tile_rows, tile_columns);
+
+    for (int k = 0; k < index_count; ++k) {
+      MeshReference const & m = *(meshes + *(indices + k));
+
+      if (m.affine) {
+        _fill_micropolygon_mesh<Out, fill_affine>(
+          m.rows, m.columns,
+          m.mesh, m.bounds,
+          m.pyramid,
+          m.coefficients,
+          tile_rows, tile_columns,
+          tile_bounds,
+          samples, tile,
+          depth,
+          coverage
+        );
+      }
+      else {
+        _fill_micropolygon_mesh<Out, fill_micropolygon>(
+          m.rows, m.columns,
+          m.mesh, m.bounds,
+          m.pyramid,
+          m.coefficients,
+          tile_rows, tile_columns,
+          tile_bounds,
+          samples, tile,
+          depth,
+          coverage
+        );
+      }
+    }
+  }
+
+  struct TileRange {
+    int left, bottom, right, top;
+
+    bool empty() const { return right < left || top < bottom; }
+  };
+
+  // Tiles are closed rectangles [k * width, (k + 1) * width], matching the
+  // overlap test in _fill_micropolygon_mesh, so a cell lying exactly on a
+  // tile edge is binned into both neighbours.
+  inline TileRange tile_range_for_bounds(
+    BoundingBox const & b,
+    int tile_width, int tile_height,
+    int bin_left, int bin_bottom,
+    int bin_columns, int bin_rows
+  )
+  {
+    TileRange out;
+
+    out.left   = -clamped_floor(-b.x() / tile_width + bin_left, -bin_columns - 1, 0) - 1;
+    out.bottom = -clamped_floor(-b.y() / tile_height + bin_bottom, -bin_rows - 1, 0) - 1;
+    out.right  = clamped_floor(b.z() / tile_width - bin_left, -1, bin_columns - 1);
+    out.top    = clamped_floor(b.w() / tile_height - bin_bottom, -1, bin_rows - 1);
+
+    out.left   = (std::max)(out.left, 0);
+    out.bottom = (std::max)(out.bottom, 0);
+
+    return out;
+  }
+
+  void _count_tile_bins(
+    int mesh_rows, int mesh_columns,
+    BoundingBox const * bounds,
+    int tile_width, int tile_height,
+    int bin_left, int bin_bottom,
+    int bin_columns, int bin_rows,
+    int * counts
+  )
+  {
+    int cell_count = (mesh_rows - 1) * (mesh_columns - 1);
+
+    std::fill(counts, counts + bin_rows * bin_columns, 0);
+
+    for (int cell = 0; cell < cell_count; ++cell) {
+      TileRange r = tile_range_for_bounds(
+        *(bounds + cell),
+        tile_width, tile_height,
+        bin_left, bin_bottom,
+        bin_columns, bin_rows
+      );
+
+      if (r.empty()) { continue; }
+
+      for (int y = r.bottom; y <= r.top; ++y) {
+        int * count_row = counts + y * bin_columns;
+
+        for (int x = r.left; x <= r.right; ++x) {
+          ++*(count_row + x);
+        }
+      }
+    }
+  }
+
+  void _fill_tile_bins(
+    int mesh_rows, int mesh_columns,
+    BoundingBox const * bounds,
+    int tile_width, int tile_height,
+    int bin_left, int bin_bottom,
+    int bin_columns, int bin_rows,
+    int const * offsets,
+    int * cells
+  )
+  {
+    int cell_count = (mesh_rows - 1) * (mesh_columns - 1);
+    std::vector<int> cursors(offsets, offsets + bin_rows * bin_columns);
+
+    for (int cell = 0; cell < cell_count; ++cell) {
+      TileRange r = tile_range_for_bounds(
+        *(bounds + cell),
+        tile_width, tile_height,
+        bin_left, bin_bottom,
+        bin_columns, bin_rows
+      );
+
+      if (r.empty()) { continue; }
+
+      for (int y = r.bottom; y <= r.top; ++y) {
+        int * cursor_row = cursors.data() + y * bin_columns;
+
+        for (int x = r.left; x <= r.right; ++x) {
+          *(cells + (*(cursor_row + x))++) = cell;
+        }
+      }
+    }
+  }
+
+  void _fill_inverter_coefficients(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh,
+    RationalBilinearCoefficients * coefficients
+  )
+  {
+    for (int i = 1; i < mesh_rows; ++i) {
+      Vertex const * lower_row = mesh + i * mesh_columns;
+
+      for (int j = 1; j < mesh_columns; ++j) {
+        Vertex const
+          * lower_right = lower_row + j,
+          * lower_left  = lower_right - 1,
+          * upper_right = lower_right - mesh_columns,
+          * upper_left  = lower_left - mesh_columns
+        ;
+
+        coefficients->setup(
+          lower_left->position, lower_right->position,
+          upper_left->position, upper_right->position
+        );
+
+        ++coefficients;
+      }
+    }
+  }
+
+  int copy_solutions(RationalBilinearInverter const & rbi, InverterSolution * out) {
+    for (auto it = rbi.begin(); it != rbi.end(); ++it, ++out) {
+      out->alpha = it->first;
+      out->u = it->second.x();
+      out->v = it->second.y();
+    }
+
+    return rbi.size();
+  }
+
+  inline Vec4 make_bounding_box(Vec2 const & left, Vec2 const & right) {
+    Vec4 out(
+      left.x(), left.y(),
+      right.x(), right.y()
+    );
+
+    if (out.z() < out.x()) { std::swap(out.x(), out.z()); }
+    if (out.w() < out.y()) { std::swap(out.y(), out.w()); }
+
+    return out;
+  }
+
+  inline Vec4 combine_bounding_boxes(Vec4 const & left, Vec4 const & right) {
+    return Vec4(
+      (std::min)(left.x(), right.x()),
+      (std::min)(left.y(), right.y()),
+      (std::max)(left.z(), right.z()),
+      (std::max)(left.w(), right.w())
+    );
+  }
+
+  inline bool shares_depth(Vertex const & vertex, Point const & first) {
+    return vertex.position.z() == first.z() && vertex.position.w() == first.w();
+  }
+
+  BoundingBox _fill_bounds_buffer(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh,
+    BoundingBox * bounds,
+    bool & affine
+  )
+  {
+    Point const & first = mesh->position;
+    affine = true;
+
+    int bounds_rows = mesh_rows - 1,
+      bounds_columns = mesh_columns - 1;
+
+    Vec2 left = to_projection_plane(mesh->position),
+      right(0, 0);
+
+    BoundingBox total(left.x(), left.y(), left.x(), left.y());
+
+    for (int j = 1; j < mesh_columns; ++j) {
+      affine = affine && shares_depth(*(mesh + j), first);
+      right = to_projection_plane((mesh + j)->position);
+      *(bounds + j - 1) = make_bounding_box(left, right);
+      total = combine_bounding_boxes(total, *(bounds + j - 1));
+      left = right;
+    }
+
+    for(int i = 1; i < mesh_rows; ++i) {
+      Vec4 * lower_bounds = bounds + i * bounds_columns,
+           * upper_bounds = lower_bounds - bounds_columns;
+
+      Vertex const * lower_row = mesh + i * mesh_columns;
+      left = to_projection_plane(lower_row->position);
+
+      affine = affine && shares_depth(*lower_row, first);
+
+      for (int j = 1; j < mesh_columns; ++j) {
+        affine = affine && shares_depth(*(lower_row + j), first);
+        right = to_projection_plane((lower_row + j)->position);
+
+        Vec4 b = make_bounding_box(left, right);
+        if (i < bounds_rows) { *lower_bounds = b; }
+        *upper_bounds = combine_bounding_boxes(*upper_bounds, b);
+
+        total = combine_bounding_boxes(total, *upper_bounds);
+
+        ++lower_bounds;
+        ++upper_bounds;
+        left = right;
+      }
+    }
+
+    return total;
+  }
+
+  void _fill_bounds_pyramid(
+    int bounds_rows, int bounds_columns,
+    BoundingBox const * bounds,
+    BoundingBox * pyramid
+  )
+  {
+    BoundingBox const * below = bounds;
+    int rows = bounds_rows, columns = bounds_columns;
+
+    while (rows > 1 || columns > 1) {
+      int level_rows = (rows + 1) / 2,
+          level_columns = (columns + 1) / 2;
+
+      BoundingBox * level = pyramid;
+
+      for (int i = 0; i < level_rows; ++i) {
+        int row_end = (std::min)(2 * i + 2, rows);
+
+        for (int j = 0; j < level_columns; ++j) {
+          int column_end = (std::min)(2 * j + 2, columns);
+          BoundingBox b = *(below + 2 * i * columns + 2 * j);
+
+          for (int bi = 2 * i; bi < row_end; ++bi) {
+            for (int bj = 2 * j; bj < column_end; ++bj) {
+              b = combine_bounding_boxes(b, *(below + bi * columns + bj));
+            }
+          }
+
+          *pyramid++ = b;
+        }
+      }
+
+      below = level;
+      rows = level_rows;
+      columns = level_columns;
+    }
+  }
+
+  // Writes filtered pixels to tiles of Out with store_pixel
+  struct StorePixel {
+    template <typename Out>
+    void operator () (Out & out, Vec4 const & pixel, int, int) const {
+      store_pixel(out, pixel);
+    }
+  };
+
+  // Box filters in into out, out_height rows of out_width pixels, passing
+  // each pixel through store(out, pixel, row, column) with rows counted
+  // from row_offset.
+  template <typename In, typename Out, typename Store>
+  void _downsample_tile(
+    In const * in,
+    int in_width, int in_height,
+    int down_width, int down_height,
+    Out * out,
+    int out_width, int out_height,
+    Store const & store, int row_offset
+  )
+  {
+    float downsample_factor = 1. / static_cast<float>(down_width * down_height);
+
+    for (int in_j = 0, out_j = 0; in_j < in_height && out_j < out_height; in_j += down_height, ++out_j) {
+      Out * out_row = (out + out_j * out_width);
+
+      for (int in_i = 0, out_i = 0; in_i < in_width && out_i < out_width; in_i += down_width, ++out_i) {
+        Vec4 sample(0, 0, 0, 0);
+
+        int end_i = (std::min)(in_width, in_i + down_width),
+            end_j = (std::min)(in_height, in_j + down_height);
+
+        for (int j = in_j; j < end_j; ++j) {
+          In const * in_row = in + j * in_width;
+
+          for (int i = in_i; i < end_i; ++i) {
+            sample += load_pixel(*(in_row + i));
+          }
+        }
+
+        store(*(out_row + out_i), downsample_factor * sample, row_offset + out_j, out_i);
+      }
+    }
+  }
+
+  // A separable reconstruction filter sampled for an integer downsampling
+  // step. Output pixel o reads the taps input samples from o * step + first
+  // on, along each axis, weighted by weights.
+  struct SeparableKernel {
+    float const * weights;
+    int taps, first, step;
+  };
+
+  // Filters output rows [out_begin, out_end) of the in_width x in_height
+  // samples in into out, which is out_width wide and holds every output row.
+  // Rows are filtered across first, into a scratch buffer of just the input
+  // rows the band reads, then down. Taps falling outside the input are
+  // dropped and the rest renormalized, so the edges keep their brightness.
+  // Each output pixel goes through store(out, pixel, row, column).
+  template <typename In, typename Out, typename Store>
+  void _downsample_tile_filtered(
+    In const * in,
+    int in_width, int in_height,
+    Out * out,
+    int out_width,
+    int out_begin, int out_end,
+    SeparableKernel const & kernel,
+    Store const & store
+  )
+  {
+    if (out_end <= out_begin) { return; }
+
+    int const taps = kernel.taps, first = kernel.first, step = kernel.step;
+
+    int in_begin = (std::max)(0, out_begin * step + first),
+        in_end = (std::min)(in_height, (out_end - 1) * step + first + taps);
+
+    if (in_end <= in_begin) { return; }
+
+    std::vector<Vec4> across(static_cast<size_t>(in_end - in_begin) * out_width);
+
+    for (int j = in_begin; j < in_end; ++j) {
+      In const * in_row = in + j * in_width;
+      Vec4 * across_row = across.data() + (j - in_begin) * out_width;
+
+      for (int i = 0; i < out_width; ++i) {
+        int begin = i * step + first;
+        int t0 = (std::max)(0, -begin),
+            t1 = (std::min)(taps, in_width - begin);
+
+        Vec4 sample(0, 0, 0, 0);
+        float weight = 0;
+
+        for (int t = t0; t < t1; ++t) {
+          sample += kernel.weights[t] * load_pixel(*(in_row + begin + t));
+          weight += kernel.weights[t];
+        }
+
+        *(across_row + i) = weight != 0.f ? (1.f / weight) * sample : sample;
+      }
+    }
+
+    for (int o = out_begin; o < out_end; ++o) {
+      int begin = o * step + first;
+      int t0 = (std::max)(in_begin - begin, 0),
+          t1 = (std::min)(taps, in_end - begin);
+
+      float weight = 0;
+
+      for (int t = t0; t < t1; ++t) {
+        weight += kernel.weights[t];
+      }
+
+      float scale = weight != 0.f ? 1.f / weight : 1.f;
+      Out * out_row = out + o * out_width;
+
+      for (int i = 0; i < out_width; ++i) {
+        Vec4 sample(0, 0, 0, 0);
+
+        for (int t = t0; t < t1; ++t) {
+          sample += kernel.weights[t] * across[(begin + t - in_begin) * out_width + i];
+        }
+
+        store(*(out_row + i), scale * sample, o, i);
+      }
+    }
+  }
+
+  // Alpha-over of source onto target in place, for the source alpha a.
+  // Straight alpha blends target = (1 - a) * target + a * source, as
+  // Tile.composite_from always has; premultiplied alpha blends
+  // target = source + (1 - a) * target. Strides are in pixels, so either
+  // side may be a view into a larger image.
+  template <bool premultiplied, typename Target, typename Source>
+  void _composite_over(
+    Target * target, int target_stride,
+    Source const * source, int source_stride,
+    int rows, int columns
+  )
+  {
+    for (int i = 0; i < rows; ++i) {
+      Target * target_row = target + i * target_stride;
+      Source const * source_row = source + i * source_stride;
+
+      for (int j = 0; j < columns; ++j) {
+        Vec4 s = load_pixel(*(source_row + j));
+        float alpha = s.w();
+
+        // Uncovered samples leave the target as it is.
+        if (!premultiplied && alpha == 0.f) { continue; }
+
+        Target & out = *(target_row + j);
+        Vec4 t = load_pixel(out);
+
+        if (premultiplied) {
+          store_pixel(out, s + (1.f - alpha) * t);
+        }
+        else {
+          store_pixel(out, (1.f - alpha) * t + alpha * s);
+        }
+      }
+    }
+  }
+
+  enum PixelFormat { float_pixel_format = 0, half_pixel_format = 1 };
+
+  template <bool premultiplied, typename Target>
+  void _composite_pixels(
+    Target * target, int target_stride,
+    void const * source, int source_stride, int source_format,
+    int rows, int columns
+  )
+  {
+    if (source_format == half_pixel_format) {
+      _composite_over<premultiplied>(
+        target, target_stride,
+        static_cast<HalfPixel const *>(source), source_stride,
+        rows, columns
+      );
+    }
+    else {
+      _composite_over<premultiplied>(
+        target, target_stride,
+        static_cast<Pixel const *>(source), source_stride,
+        rows, columns
+      );
+    }
+  }
+
+  template <bool premultiplied>
+  void _composite_pixels(
+    void * target, int target_stride, int target_format,
+    void const * source, int source_stride, int source_format,
+    int rows, int columns
+  )
+  {
+    if (target_format == half_pixel_format) {
+      _composite_pixels<premultiplied>(
+        static_cast<HalfPixel *>(target), target_stride,
+        source, source_stride, source_format,
+        rows, columns
+      );
+    }
+    else {
+      _composite_pixels<premultiplied>(
+        static_cast<Pixel *>(target), target_stride,
+        source, source_stride, source_format,
+        rows, columns
+      );
+    }
+  }
+
+  // The uncompressed formats raw_image_header and pack_raw_image_rows
+  // write: BMP, binary PPM, PAM and numpy's .npy.
+  enum RawImageFormat {
+    bmp_image_format = 0,
+    ppm_image_format = 1,
+    pam_image_format = 2,
+    npy_image_format = 3,
+  };
+
+  int _raw_image_row_bytes(int format, int width, int channels) {
+    if (format == bmp_image_format) {
+      return bitmap_row_bytes(width, channels);
+    }
+
+    return width * channels;
+  }
+
+  // The .npy header of a (height, width, channels) array of bytes: the
+  // magic string, version 1.0, and the length of a dictionary describing
+  // the array, padded with spaces so the data starts on a multiple of 64
+  // bytes.
+  int _npy_header(int width, int height, int channels, char * out, int capacity) {
+    char dictionary[128];
+
+    int dictionary_length = std::snprintf(
+      dictionary, sizeof(dictionary),
+      "{'descr': '|u1', 'fortran_order': False, 'shape': (%d, %d, %d), }",
+      height, width, channels
+    );
+
+    int padded = (10 + dictionary_length + 1 + 63) / 64 * 64 - 10;
+    int length = 10 + padded;
+
+    if (length > capacity) { return -1; }
+
+    std::memcpy(out, "\x93NUMPY\x01\x00", 8);
+    out[8] = static_cast<char>(padded & 0xff);
+    out[9] = static_cast<char>(padded >> 8);
+
+    std::memcpy(out + 10, dictionary, dictionary_length);
+    std::memset(out + 10 + dictionary_length, ' ', padded - dictionary_length - 1);
+    out[length - 1] = '\n';
+
+    return length;
+  }
+
+  int _raw_image_header(
+    int format,
+    int width, int height, int channels,
+    char * out, int capacity
+  )
+  {
+    if (channels != 3 && channels != 4) { return -1; }
+
+    int length = -1;
+
+    switch (format) {
+      case bmp_image_format:
+        if (bitmap_header_size(channels) > capacity) { return -1; }
+
+        write_bitmap_header(reinterpret_cast<unsigned char *>(out), width, height, channels);
+        return bitmap_header_size(channels);
+
+      case ppm_image_format:
+        if (channels != 3) { return -1; }
+
+        length = std::snprintf(out, capacity, "P6\n%d %d\n255\n", width, height);
+        break;
+
+      case pam_image_format:
+        length = std::snprintf(
+          out, capacity,
+          "P7\nWIDTH %d\nHEIGHT %d\nDEPTH %d\nMAXVAL 255\nTUPLTYPE %s\nENDHDR\n",
+          width, height, channels, channels == 4 ? "RGB_ALPHA" : "RGB"
+        );
+        break;
+
+      case npy_image_format:
+        return _npy_header(width, height, channels, out, capacity);
+    }
+
+    return 0 <= length && length < capacity ? length : -1;
+  }
+
+  // Copies rows of Pixels, stride Pixels apart, into the rows of format:
+  // channels of 3 drop alpha, BMP stores its channels as BGR(A) and pads
+  // its rows with zeros to a multiple of four bytes.
+  void _pack_raw_image_rows(
+    int format,
+    BytePixel const * in, int stride,
+    int rows, int width, int channels,
+    unsigned char * out
+  )
+  {
+    int row_bytes = _raw_image_row_bytes(format, width, channels);
+    bool bgr = format == bmp_image_format;
+
+    for (int i = 0; i < rows; ++i) {
+      BytePixel const * in_row = in + i * stride;
+      unsigned char * out_row = out + i * row_bytes;
+
+      if (!bgr && channels == 4) {
+        std::memcpy(out_row, in_row, 4 * width);
+        continue;
+      }
+
+      if (channels == 4) {
+        // Swaps red and blue a whole pixel at a time, which vectorizes.
+        for (int j = 0; j < width; ++j) {
+          uint32_t pixel;
+          std::memcpy(&pixel, in_row + j, 4);
+
+          pixel = (pixel & 0xff00ff00u)
+            | ((pixel & 0x000000ffu) << 16)
+            | ((pixel >> 16) & 0x000000ffu);
+
+          std::memcpy(out_row + 4 * j, &pixel, 4);
+        }
+
+        continue;
+      }
+
+      unsigned char * it = out_row;
+
+      for (int j = 0; j < width; ++j, it += channels) {
+        uint8_t const * pixel = in_row[j].channels;
+
+        it[0] = pixel[bgr ? 2 : 0];
+        it[1] = pixel[1];
+        it[2] = pixel[bgr ? 0 : 2];
+
+        if (channels == 4) { it[3] = pixel[3]; }
+      }
+
+      std::fill(it, out_row + row_bytes, static_cast<unsigned char>(0));
+    }
+  }
+
+    void _print_coordinates(Coordinate const * coordinates, int length) {
+        length = (std::min)(length, 64);
+
+        for (int i = 0; i < length; ++i) {
+            Coordinate const & c = coordinates[i];
+
+            std::cout << "coordinates[" << i << "] = " << c << std::endl;
+        }
+    }
+
+    void _print_vertices(Vertex const * vertices, int length) {
+        length = (std::min)(length, 64);
+
+        for (int i = 0; i < length; ++i) {
+            Vertex const & v = vertices[i];
+            std::cout << "vertices[" << i << "] = " << v << std::endl;
+        }
+    }
+}
+
+extern "C" {
+  void fill_micropolygon_mesh(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh, BoundingBox const * bounds,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    Pixel * tile
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_mesh<Pixel, _fill_micropolygon<Pixel> >(
+      mesh_rows, mesh_columns,
+      mesh, bounds,
+      0, 0,
+      tile_rows, tile_columns,
+      tile_bounds,
+      SampleGrid(tile_bounds, tile_rows, tile_columns),
+      tile,
+      0,
+      unused
+    );
+  }
+
+  // coefficients may be null, or the output of fill_inverter_coefficients
+  // for the mesh. Only this rational filler reads them; the batched and
+  // affine bin fillers take the same arguments and ignore them.
+  //
+  // coverage may be null too. Otherwise every sample written is added to
+  // it, here and in the other bin and meshes fillers.
+  void fill_micropolygon_mesh_bin(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh, BoundingBox const * bounds,
+    RationalBilinearCoefficients const * coefficients,
+    int const * cells, int cell_count,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    Pixel * tile,
+    float * depth,
+    Coverage * coverage
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_mesh_bin<Pixel, _fill_micropolygon<Pixel> >(
+      mesh_rows, mesh_columns,
+      mesh, bounds,
+      coefficients,
+      cells, cell_count,
+      tile_rows, tile_columns,
+      tile_bounds,
+      tile,
+      depth,
+      coverage ? *coverage : unused
+    );
+  }
+
+  void fill_micropolygon_mesh_batched(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh, BoundingBox const * bounds,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    Pixel * tile
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_mesh<Pixel, _fill_micropolygon_batched<Pixel> >(
+      mesh_rows, mesh_columns,
+      mesh, bounds,
+      0, 0,
+      tile_rows, tile_columns,
+      tile_bounds,
+      SampleGrid(tile_bounds, tile_rows, tile_columns),
+      tile,
+      0,
+      unused
+    );
+  }
+
+  void fill_micropolygon_mesh_bin_batched(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh, BoundingBox const * bounds,
+    RationalBilinearCoefficients const * coefficients,
+    int const * cells, int cell_count,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    Pixel * tile,
+    float * depth,
+    Coverage * coverage
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_mesh_bin<Pixel, _fill_micropolygon_batched<Pixel> >(
+      mesh_rows, mesh_columns,
+      mesh, bounds,
+      coefficients,
+      cells, cell_count,
+      tile_rows, tile_columns,
+      tile_bounds,
+      tile,
+      depth,
+      coverage ? *coverage : unused
+    );
+  }
+
+  void fill_micropolygon_mesh_affine(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh, BoundingBox const * bounds,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    Pixel * tile
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_mesh<Pixel, _fill_micropolygon_affine<Pixel> >(
+      mesh_rows, mesh_columns,
+      mesh, bounds,
+      0, 0,
+      tile_rows, tile_columns,
+      tile_bounds,
+      SampleGrid(tile_bounds, tile_rows, tile_columns),
+      tile,
+      0,
+      unused
+    );
+  }
+
+  void fill_micropolygon_mesh_bin_affine(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh, BoundingBox const * bounds,
+    RationalBilinearCoefficients const * coefficients,
+    int const * cells, int cell_count,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    Pixel * tile,
+    float * depth,
+    Coverage * coverage
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_mesh_bin<Pixel, _fill_micropolygon_affine<Pixel> >(
+      mesh_rows, mesh_columns,
+      mesh, bounds,
+      coefficients,
+      cells, cell_count,
+      tile_rows, tile_columns,
+      tile_bounds,
+      tile,
+      depth,
+      coverage ? *coverage : unused
+    );
+  }
+
+  // Fills the meshes meshes[indices[0]], ..., meshes[indices[index_count - 1]]
+  // into one tile in that order, so later meshes replace earlier ones where
+  // they overlap unless depth is given.
+  void fill_micropolygon_meshes(
+    MeshReference const * meshes,
+    int const * indices, int index_count,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    Pixel * tile,
+    float * depth,
+    Coverage * coverage
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_meshes<Pixel, _fill_micropolygon<Pixel>, _fill_micropolygon_affine<Pixel> >(
+      meshes,
+      indices, index_count,
+      tile_rows, tile_columns,
+      tile_bounds,
+      tile, depth,
+      coverage ? *coverage : unused
+    );
+  }
+
+  void fill_micropolygon_meshes_batched(
+    MeshReference const * meshes,
+    int const * indices, int index_count,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    Pixel * tile,
+    float * depth,
+    Coverage * coverage
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_meshes<Pixel, _fill_micropolygon_batched<Pixel>, _fill_micropolygon_batched<Pixel> >(
+      meshes,
+      indices, index_count,
+      tile_rows, tile_columns,
+      tile_bounds,
+      tile, depth,
+      coverage ? *coverage : unused
+    );
+  }
+
+  // The _half fillers take the same arguments as the fillers above but
+  // write HalfPixel tiles, converting each sample from float as it is
+  // stored.
+  void fill_micropolygon_mesh_bin_half(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh, BoundingBox const * bounds,
+    RationalBilinearCoefficients const * coefficients,
+    int const * cells, int cell_count,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    HalfPixel * tile,
+    float * depth,
+    Coverage * coverage
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_mesh_bin<HalfPixel, _fill_micropolygon<HalfPixel> >(
+      mesh_rows, mesh_columns,
+      mesh, bounds,
+      coefficients,
+      cells, cell_count,
+      tile_rows, tile_columns,
+      tile_bounds,
+      tile,
+      depth,
+      coverage ? *coverage : unused
+    );
+  }
+
+  void fill_micropolygon_mesh_bin_batched_half(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh, BoundingBox const * bounds,
+    RationalBilinearCoefficients const * coefficients,
+    int const * cells, int cell_count,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    HalfPixel * tile,
+    float * depth,
+    Coverage * coverage
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_mesh_bin<HalfPixel, _fill_micropolygon_batched<HalfPixel> >(
+      mesh_rows, mesh_columns,
+      mesh, bounds,
+      coefficients,
+      cells, cell_count,
+      tile_rows, tile_columns,
+      tile_bounds,
+      tile,
+      depth,
+      coverage ? *coverage : unused
+    );
+  }
+
+  void fill_micropolygon_mesh_bin_affine_half(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh, BoundingBox const * bounds,
+    RationalBilinearCoefficients const * coefficients,
+    int const * cells, int cell_count,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    HalfPixel * tile,
+    float * depth,
+    Coverage * coverage
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_mesh_bin<HalfPixel, _fill_micropolygon_affine<HalfPixel> >(
+      mesh_rows, mesh_columns,
+      mesh, bounds,
+      coefficients,
+      cells, cell_count,
+      tile_rows, tile_columns,
+      tile_bounds,
+      tile,
+      depth,
+      coverage ? *coverage : unused
+    );
+  }
+
+  void fill_micropolygon_meshes_half(
+    MeshReference const * meshes,
+    int const * indices, int index_count,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    HalfPixel * tile,
+    float * depth,
+    Coverage * coverage
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_meshes<HalfPixel, _fill_micropolygon<HalfPixel>, _fill_micropolygon_affine<HalfPixel> >(
+      meshes,
+      indices, index_count,
+      tile_rows, tile_columns,
+      tile_bounds,
+      tile, depth,
+      coverage ? *coverage : unused
+    );
+  }
+
+  void fill_micropolygon_meshes_batched_half(
+    MeshReference const * meshes,
+    int const * indices, int index_count,
+    int tile_rows, int tile_columns,
+    Rectangle tile_bounds,
+    HalfPixel * tile,
+    float * depth,
+    Coverage * coverage
+  )
+  {
+    Coverage unused(tile_rows, tile_columns);
+
+    _fill_micropolygon_meshes<HalfPixel, _fill_micropolygon_batched<HalfPixel>, _fill_micropolygon_batched<HalfPixel> >(
+      meshes,
+      indices, index_count,
+      tile_rows, tile_columns,
+      tile_bounds,
+      tile, depth,
+      coverage ? *coverage : unused
+    );
+  }
+
+  char const * batched_kernel_name() {
+    return batch_inverter_kernel();
+  }
+
+  void count_tile_bins(
+    int mesh_rows, int mesh_columns,
+    BoundingBox const * bounds,
+    int tile_width, int tile_height,
+    int bin_left, int bin_bottom,
+    int bin_columns, int bin_rows,
+    int * counts
+  )
+  {
+    _count_tile_bins(
+      mesh_rows, mesh_columns,
+      bounds,
+      tile_width, tile_height,
+      bin_left, bin_bottom,
+      bin_columns, bin_rows,
+      counts
+    );
+  }
+
+  void fill_tile_bins(
+    int mesh_rows, int mesh_columns,
+    BoundingBox const * bounds,
+    int tile_width, int tile_height,
+    int bin_left, int bin_bottom,
+    int bin_columns, int bin_rows,
+    int const * offsets,
+    int * cells
+  )
+  {
+    _fill_tile_bins(
+      mesh_rows, mesh_columns,
+      bounds,
+      tile_width, tile_height,
+      bin_left, bin_bottom,
+      bin_columns, bin_rows,
+      offsets, cells
+    );
+  }
+
+  void fill_inverter_coefficients(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh,
+    RationalBilinearCoefficients * coefficients
+  )
+  {
+    _fill_inverter_coefficients(mesh_rows, mesh_columns, mesh, coefficients);
+  }
+
+  int invert_sample(
+    RationalBilinearCoefficients const * coefficients,
+    float x, float y,
+    InverterSolution * out
+  )
+  {
+    RationalBilinearInverter rbi(Vec2(x, y), *coefficients);
+    return copy_solutions(rbi, out);
+  }
+
+  int invert_sample_reference(
+    Point const * corners,
+    float x, float y,
+    InverterSolution * out
+  )
+  {
+    RationalBilinearInverter rbi(
+      Vec2(x, y),
+      corners[0], corners[1],
+      corners[2], corners[3]
+    );
+
+    return copy_solutions(rbi, out);
+  }
+
+  // affine may be null. Otherwise it is set to whether every vertex of the
+  // mesh shares one z and w, which fill_micropolygon_mesh_affine requires.
+  Rectangle fill_bounds_buffer(
+    int mesh_rows, int mesh_columns,
+    Vertex const * mesh,
+    BoundingBox * bounds,
+    int * affine
   )
   {
     Rectangle out;
+    bool is_affine;
 
     BoundingBox b = _fill_bounds_buffer(
       mesh_rows,
       mesh_columns,
       mesh,
-      bounds
+      bounds,
+      is_affine
     );
 
+    if (affine) { *affine = is_affine; }
+
     out.left = b.x();
     out.bottom = b.y();
     out.right = b.z();
@@ -305,6 +1797,19 @@ extern "C" {
     return out;
   }
 
+  // Fills levels 1 and up of a min/max pyramid over a bounds grid, one
+  // after another. Level k has ceil(rows / 2^k) x ceil(columns / 2^k) boxes,
+  // each the union of the (up to) four boxes below it, and the last level is
+  // a single box.
+  void fill_bounds_pyramid(
+    int bounds_rows, int bounds_columns,
+    BoundingBox const * bounds,
+    BoundingBox * pyramid
+  )
+  {
+    _fill_bounds_pyramid(bounds_rows, bounds_columns, bounds, pyramid);
+  }
+
   void downsample_tile(
     Pixel const * in,
     int in_width, int in_height,
@@ -313,13 +1818,224 @@ extern "C" {
     int out_width, int out_height
   )
   {
-    _downsample_tile(
+    _downsample_tile<Pixel, Pixel>(
+      in, in_width, in_height,
+      down_width, down_height,
+      out, out_width, out_height,
+      StorePixel(), 0
+    );
+  }
+
+  void composite_over(
+    Pixel * target, int target_stride,
+    Pixel const * source, int source_stride,
+    int rows, int columns
+  )
+  {
+    _composite_over<false, Pixel, Pixel>(
+      target, target_stride,
+      source, source_stride,
+      rows, columns
+    );
+  }
+
+  void composite_over_premultiplied(
+    Pixel * target, int target_stride,
+    Pixel const * source, int source_stride,
+    int rows, int columns
+  )
+  {
+    _composite_over<true, Pixel, Pixel>(
+      target, target_stride,
+      source, source_stride,
+      rows, columns
+    );
+  }
+
+  void downsample_tile_half(
+    HalfPixel const * in,
+    int in_width, int in_height,
+    int down_width, int down_height,
+    HalfPixel * out,
+    int out_width, int out_height
+  )
+  {
+    _downsample_tile<HalfPixel, HalfPixel>(
       in, in_width, in_height,
       down_width, down_height,
-      out, out_width, out_height
+      out, out_width, out_height,
+      StorePixel(), 0
+    );
+  }
+
+  // Downsamples with a separable filter rather than a box, for output rows
+  // [out_begin, out_end). weights holds the taps weights of the filter as
+  // sampled for a downsampling step of step, the first of them at input
+  // offset first from o * step for output pixel o.
+  void downsample_tile_filtered(
+    Pixel const * in,
+    int in_width, int in_height,
+    Pixel * out,
+    int out_width,
+    int out_begin, int out_end,
+    float const * weights, int taps, int first, int step
+  )
+  {
+    SeparableKernel kernel = { weights, taps, first, step };
+
+    _downsample_tile_filtered(
+      in, in_width, in_height,
+      out, out_width,
+      out_begin, out_end,
+      kernel, StorePixel()
+    );
+  }
+
+  void downsample_tile_filtered_half(
+    HalfPixel const * in,
+    int in_width, int in_height,
+    HalfPixel * out,
+    int out_width,
+    int out_begin, int out_end,
+    float const * weights, int taps, int first, int step
+  )
+  {
+    SeparableKernel kernel = { weights, taps, first, step };
+
+    _downsample_tile_filtered(
+      in, in_width, in_height,
+      out, out_width,
+      out_begin, out_end,
+      kernel, StorePixel()
     );
   }
 
+  // Filters as downsample_tile_filtered does, straight to Pixels: each pixel
+  // is clamped to [0, 1], sRGB encoded if srgb is set, and rounded to bytes,
+  // with an ordered dither if dither is set. in holds HalfPixels if
+  // in_format is the half PixelFormat, and FloatPixels otherwise.
+  void downsample_to_pixels(
+    void const * in, int in_format,
+    int in_width, int in_height,
+    BytePixel * out,
+    int out_width,
+    int out_begin, int out_end,
+    float const * weights, int taps, int first, int step,
+    int srgb, int dither
+  )
+  {
+    SeparableKernel kernel = { weights, taps, first, step };
+    QuantizePixel quantize = { srgb != 0, dither != 0 };
+
+    // An even box of one step is summed directly, without the scratch
+    // rows of the separable passes.
+    bool box = first == 0 && taps == step;
+
+    for (int t = 1; box && t < taps; ++t) {
+      box = weights[t] == weights[0];
+    }
+
+    if (box) {
+      int in_begin = out_begin * step,
+          in_end = (std::min)(out_end * step, in_height);
+
+      if (in_format == half_pixel_format) {
+        _downsample_tile(
+          static_cast<HalfPixel const *>(in) + in_begin * in_width,
+          in_width, in_end - in_begin,
+          step, step,
+          out + out_begin * out_width,
+          out_width, out_end - out_begin,
+          quantize, out_begin
+        );
+      }
+      else {
+        _downsample_tile(
+          static_cast<Pixel const *>(in) + in_begin * in_width,
+          in_width, in_end - in_begin,
+          step, step,
+          out + out_begin * out_width,
+          out_width, out_end - out_begin,
+          quantize, out_begin
+        );
+      }
+
+      return;
+    }
+
+    if (in_format == half_pixel_format) {
+      _downsample_tile_filtered(
+        static_cast<HalfPixel const *>(in), in_width, in_height,
+        out, out_width,
+        out_begin, out_end,
+        kernel, quantize
+      );
+    }
+    else {
+      _downsample_tile_filtered(
+        static_cast<Pixel const *>(in), in_width, in_height,
+        out, out_width,
+        out_begin, out_end,
+        kernel, quantize
+      );
+    }
+  }
+
+  // As composite_over, for any mix of FloatPixel and HalfPixel buffers,
+  // each format being one of the PixelFormat values.
+  void composite_pixels(
+    void * target, int target_stride, int target_format,
+    void const * source, int source_stride, int source_format,
+    int rows, int columns,
+    int premultiplied
+  )
+  {
+    if (premultiplied) {
+      _composite_pixels<true>(
+        target, target_stride, target_format,
+        source, source_stride, source_format,
+        rows, columns
+      );
+    }
+    else {
+      _composite_pixels<false>(
+        target, target_stride, target_format,
+        source, source_stride, source_format,
+        rows, columns
+      );
+    }
+  }
+
+  // The bytes a row of a width pixel image takes in format, one of the
+  // RawImageFormat values.
+  int raw_image_row_bytes(int format, int width, int channels) {
+    return _raw_image_row_bytes(format, width, channels);
+  }
+
+  // Writes the header of a width x height image of 3 or 4 channels in
+  // format to out, which holds capacity bytes. Returns the length of the
+  // header, or -1 if it does not fit or format cannot hold the channels.
+  int raw_image_header(
+    int format,
+    int width, int height, int channels,
+    char * out, int capacity
+  )
+  {
+    return _raw_image_header(format, width, height, channels, out, capacity);
+  }
+
+  // Packs rows of Pixels into out, rows * raw_image_row_bytes bytes long,
+  // as they follow the header of format.
+  void pack_raw_image_rows(
+    int format,
+    BytePixel const * in, int stride,
+    int rows, int width, int channels,
+    unsigned char * out
+  )
+  {
+    _pack_raw_image_rows(format, in, stride, rows, width, channels, out);
+  }
+
   void print_coordinates(Coordinate const * coordinates, int length) {
     _print_coordinates(coordinates, length);
   }
@@ -1,12 +1,41 @@
 __all__ = [
+    'batched_kernel_name',
+    'composite_over',
+    'composite_over_premultiplied',
+    'composite_pixels',
+    'count_tile_bins',
     'downsample_tile',
+    'downsample_tile_filtered',
+    'downsample_tile_filtered_half',
+    'downsample_tile_half',
+    'downsample_to_pixels',
     'fill_micropolygon_mesh',
+    'fill_micropolygon_mesh_affine',
+    'fill_micropolygon_mesh_batched',
+    'fill_micropolygon_mesh_bin',
+    'fill_micropolygon_mesh_bin_affine',
+    'fill_micropolygon_mesh_bin_affine_half',
+    'fill_micropolygon_mesh_bin_batched',
+    'fill_micropolygon_mesh_bin_batched_half',
+    'fill_micropolygon_mesh_bin_half',
+    'fill_micropolygon_meshes',
+    'fill_micropolygon_meshes_batched',
+    'fill_micropolygon_meshes_batched_half',
+    'fill_micropolygon_meshes_half',
     'fill_bounds_buffer',
+    'fill_bounds_pyramid',
+    'fill_inverter_coefficients',
+    'fill_tile_bins',
     'generate_numpy_begin',
     'generate_numpy_span',
+    'invert_sample',
+    'invert_sample_reference',
+    'pack_raw_image_rows',
     'Rectangle',
     'print_coordinates',
     'print_vertices',
+    'raw_image_header',
+    'raw_image_row_bytes',
 ]
 
 import os
@@ -32,6 +61,9 @@ def build_capi_lib():
     sources = list(map(str, [
         HERE / '_capi.cpp',
         HERE / 'cpp_src' / 'RationalBilinearInverter.cpp',
+        HERE / 'cpp_src' / 'BatchInverter.cpp',
+        HERE / 'cpp_src' / 'BilinearInverter.cpp',
+        HERE / 'cpp_src' / 'BitmapWriter.cpp',
     ]))
 
     extension_args = generate_extension_args(DLL_FUNCS)
@@ -91,11 +123,40 @@ class Rectangle(ctypes.Structure):
 
 
 DLL_FUNCS = [
+    'batched_kernel_name',
+    'composite_over',
+    'composite_over_premultiplied',
+    'composite_pixels',
+    'count_tile_bins',
     'downsample_tile',
+    'downsample_tile_filtered',
+    'downsample_tile_filtered_half',
+    'downsample_tile_half',
+    'downsample_to_pixels',
     'fill_micropolygon_mesh',
+    'fill_micropolygon_mesh_affine',
+    'fill_micropolygon_mesh_batched',
+    'fill_micropolygon_mesh_bin',
+    'fill_micropolygon_mesh_bin_affine',
+    'fill_micropolygon_mesh_bin_affine_half',
+    'fill_micropolygon_mesh_bin_batched',
+    'fill_micropolygon_mesh_bin_batched_half',
+    'fill_micropolygon_mesh_bin_half',
+    'fill_micropolygon_meshes',
+    'fill_micropolygon_meshes_batched',
+    'fill_micropolygon_meshes_batched_half',
+    'fill_micropolygon_meshes_half',
     'fill_bounds_buffer',
+    'fill_bounds_pyramid',
+    'fill_inverter_coefficients',
+    'fill_tile_bins',
+    'invert_sample',
+    'invert_sample_reference',
+    'pack_raw_image_rows',
     'print_coordinates',
     'print_vertices',
+    'raw_image_header',
+    'raw_image_row_bytes',
 ]
 
 def update_globals():
@@ -106,6 +167,11 @@ def update_globals():
     }
 
     functions['fill_bounds_buffer'].restype = Rectangle
+    functions['batched_kernel_name'].restype = ctypes.c_char_p
+
+    for name in ('invert_sample', 'invert_sample_reference'):
+        functions[name].restype = ctypes.c_int
+        functions[name].argtypes = [ c_void_p, ctypes.c_float, ctypes.c_float, c_void_p ]
 
     globals().update(functions)
 
@@ -0,0 +1,198 @@
+#include "BatchInverter.hpp"
+
+#include <cmath>
+#include <cstring>
+
+#if (defined(__GNUC__) || defined(__clang__)) && defined(__SSE2__)
+	#define HANDSOME_BATCH_X86 1
+	#include <immintrin.h>
+#endif
+
+namespace {
+	inline void cross(double const * left, double const * right, double * out) {
+		out[0] = left[1] * right[2] - left[2] * right[1];
+		out[1] = left[2] * right[0] - left[0] * right[2];
+		out[2] = left[0] * right[1] - left[1] * right[0];
+	}
+
+	template <int n>
+	inline void copy_to_float(double const (&in)[n], float (&out)[n]) {
+		for (int i = 0; i < n; ++i) { out[i] = static_cast<float>(in[i]); }
+	}
+}
+
+void BatchInverterCoefficients::setup(
+	Vec4 const & p00, Vec4 const & p10,
+	Vec4 const & p01, Vec4 const & p11,
+	float origin_x, float origin_y
+)
+{
+	this->origin_x = origin_x;
+	this->origin_y = origin_y;
+
+	Vec4 const * corners[4] = { &p00, &p10, &p01, &p11 };
+	double p[4][4];
+
+	// Moving the screen origin to (origin_x, origin_y) maps x to x - origin_x * z
+	// in homogeneous coordinates, and likewise for y.
+	for (int c = 0; c < 4; ++c) {
+		Vec4 const & corner = *corners[c];
+
+		p[c][0] = corner.x() - static_cast<double>(origin_x) * corner.z();
+		p[c][1] = corner.y() - static_cast<double>(origin_y) * corner.z();
+		p[c][2] = corner.z();
+		p[c][3] = corner.w();
+	}
+
+	double o[4], u[4], v[4], t[4];
+
+	for (int i = 0; i < 4; ++i) {
+		o[i] = p[0][i];
+		u[i] = p[1][i] - p[0][i];
+		v[i] = p[2][i] - p[0][i];
+		t[i] = p[0][i] - p[1][i] - p[2][i] + p[3][i];
+	}
+
+	double q[3][3], s[3];
+
+	cross(t, u, q[0]);
+
+	cross(t, o, q[1]);
+	cross(v, u, s);
+	for (int i = 0; i < 3; ++i) { q[1][i] += s[i]; }
+
+	cross(v, o, q[2]);
+
+	for (int i = 0; i < 3; ++i) { copy_to_float(q[i], quadratic[i]); }
+
+	copy_to_float(o, origin);
+	copy_to_float(u, u_axis);
+	copy_to_float(v, v_axis);
+	copy_to_float(t, twist);
+}
+
+namespace batch_scalar {
+	int const lanes = 1;
+
+	typedef float Pack;
+	typedef bool Mask;
+
+	inline Pack splat(float x) { return x; }
+	inline Pack load(float const * p) { return *p; }
+	inline void store(float * p, Pack const & x) { *p = x; }
+	inline void store_mask(int * p, Mask m) { *p = m; }
+
+	inline Pack select(Mask m, Pack const & a, Pack const & b) { return m ? a : b; }
+	inline Pack sqrt_pack(Pack const & x) { return std::sqrt(x); }
+
+	inline Mask mask_and(Mask a, Mask b) { return a && b; }
+	inline Mask mask_or(Mask a, Mask b) { return a || b; }
+	inline Mask mask_not(Mask a) { return !a; }
+
+	#include "BatchInverterKernel.inl"
+}
+
+#ifdef HANDSOME_BATCH_X86
+
+namespace batch_sse2 {
+	int const lanes = 4;
+
+	typedef float Pack __attribute__((vector_size(16)));
+	typedef int Mask __attribute__((vector_size(16)));
+
+	#include "BatchInverterVector.inl"
+
+	inline Pack sqrt_pack(Pack const & x) { return (Pack)_mm_sqrt_ps((__m128)x); }
+
+	#include "BatchInverterKernel.inl"
+}
+
+#if defined(__clang__)
+	#pragma clang attribute push (__attribute__((target("avx"))), apply_to = function)
+#else
+	#pragma GCC push_options
+	#pragma GCC target("avx")
+#endif
+
+namespace batch_avx {
+	int const lanes = 8;
+
+	typedef float Pack __attribute__((vector_size(32)));
+	typedef int Mask __attribute__((vector_size(32)));
+
+	#include "BatchInverterVector.inl"
+
+	inline Pack sqrt_pack(Pack const & x) { return (Pack)_mm256_sqrt_ps((__m256)x); }
+
+	#include "BatchInverterKernel.inl"
+}
+
+#if defined(__clang__)
+	#pragma clang attribute pop
+#else
+	#pragma GCC pop_options
+#endif
+
+#endif
+
+namespace {
+	typedef int (*PackFunction)(
+		BatchInverterCoefficients const &,
+		int,
+		float const *, float const *,
+		int *,
+		float *, float *, float *
+	);
+
+	struct Kernel {
+		char const * name;
+		PackFunction invert_packs;
+	};
+
+	Kernel select_kernel() {
+		#ifdef HANDSOME_BATCH_X86
+			__builtin_cpu_init();
+
+			if (__builtin_cpu_supports("avx")) {
+				Kernel out = { "avx", batch_avx::invert_packs };
+				return out;
+			}
+
+			Kernel out = { "sse2", batch_sse2::invert_packs };
+			return out;
+		#else
+			Kernel out = { "scalar", batch_scalar::invert_packs };
+			return out;
+		#endif
+	}
+
+	Kernel const & get_kernel() {
+		static Kernel const kernel = select_kernel();
+		return kernel;
+	}
+}
+
+void invert_batch(
+	BatchInverterCoefficients const & coefficients,
+	int count,
+	float const * xs, float const * ys,
+	int * hits,
+	float * us, float * vs, float * alphas
+)
+{
+	int done = get_kernel().invert_packs(
+		coefficients, count,
+		xs, ys,
+		hits, us, vs, alphas
+	);
+
+	batch_scalar::invert_packs(
+		coefficients, count - done,
+		xs + done, ys + done,
+		hits + done, us + done, vs + done, alphas + done
+	);
+}
+
+char const * batch_inverter_kernel() {
+	return get_kernel().name;
+}
@@ -0,0 +1,46 @@
+#pragma once
+
+#include "Vec.hpp"
+
+// Single-precision form of RationalBilinearCoefficients for inverting many
+// samples against one patch at a time.
+//
+// The patch is translated so that (origin_x, origin_y) becomes the screen
+// origin before the coefficients are formed, which keeps every term close
+// to the patch's own size and avoids cancellation in float lanes.
+struct BatchInverterCoefficients {
+	BatchInverterCoefficients() { }
+
+	BatchInverterCoefficients(
+		Vec4 const & p00, Vec4 const & p10,
+		Vec4 const & p01, Vec4 const & p11,
+		float origin_x, float origin_y
+	)
+	{ setup(p00, p10, p01, p11, origin_x, origin_y); }
+
+	void setup(
+		Vec4 const & p00, Vec4 const & p10,
+		Vec4 const & p01, Vec4 const & p11,
+		float origin_x, float origin_y
+	);
+
+	float origin_x, origin_y;
+	float quadratic[3][3];
+	float origin[4], u_axis[4], v_axis[4], twist[4];
+};
+
+// Inverts count samples (xs[i], ys[i]) against one patch. For every sample
+// hits[i] is nonzero when the patch covers it, in which case (us[i], vs[i])
+// and alphas[i] hold the nearest solution, as RationalBilinearInverter::front
+// would.
+void invert_batch(
+	BatchInverterCoefficients const & coefficients,
+	int count,
+	float const * xs, float const * ys,
+	int * hits,
+	float * us, float * vs, float * alphas
+);
+
+// Name of the kernel invert_batch dispatches to on this CPU:
+// "avx", "sse2" or "scalar".
+char const * batch_inverter_kernel();
@@ -0,0 +1,124 @@
+// Lane-generic body of invert_batch.
+//
+// BatchInverter.cpp includes this once per instruction set, inside a
+// namespace that defines Pack, Mask, lanes and the helpers used below
+// (splat, load, store, store_mask, select, sqrt_pack, mask_and, mask_or,
+// mask_not). The arithmetic mirrors RationalBilinearInverter::solve for
+// RationalBilinearCoefficients, evaluated in float.
+
+inline Pack abs_pack(Pack const & x) {
+	return select(x < splat(0.f), -x, x);
+}
+
+inline Pack dot_xy1(float const (&k)[3], Pack const & x, Pack const & y) {
+	return splat(k[0]) * x + splat(k[1]) * y + splat(k[2]);
+}
+
+inline Pack project(float const (&axis)[4], int i, Pack const & s) {
+	return splat(axis[i]) - s * splat(axis[2]);
+}
+
+inline Pack evaluate(BatchInverterCoefficients const & k, int i, Pack const & u, Pack const & v) {
+	return splat(k.origin[i]) + u * splat(k.u_axis[i]) + v * splat(k.v_axis[i]) + u * v * splat(k.twist[i]);
+}
+
+inline Mask check_candidate(
+	BatchInverterCoefficients const & k,
+	Pack const & x, Pack const & y,
+	Pack const & u, Mask valid,
+	Pack & v, Pack & alpha
+)
+{
+	Pack n1 = project(k.origin, 0, x) + u * project(k.u_axis, 0, x),
+		m1 = project(k.v_axis, 0, x) + u * project(k.twist, 0, x),
+		n2 = project(k.origin, 1, y) + u * project(k.u_axis, 1, y),
+		m2 = project(k.v_axis, 1, y) + u * project(k.twist, 1, y);
+
+	v = select(abs_pack(m1) >= abs_pack(m2), -n1 / m1, -n2 / m2);
+
+	Pack low = splat(-1e-3f),
+		high = splat(1.f - 1e-3f);
+
+	Mask ok = mask_and(valid, mask_and(
+		mask_and(u >= low, u < high),
+		mask_and(v >= low, v < high)
+	));
+
+	Pack hz = evaluate(k, 2, u, v),
+		hw = evaluate(k, 3, u, v);
+
+	alpha = hz / hw;
+
+	return mask_and(ok, mask_and(hw != splat(0.f), alpha >= splat(1.f - 1e-3f)));
+}
+
+inline void invert_pack(
+	BatchInverterCoefficients const & k,
+	Pack x, Pack y,
+	Mask & hit,
+	Pack & u, Pack & v, Pack & alpha
+)
+{
+	x = x - splat(k.origin_x);
+	y = y - splat(k.origin_y);
+
+	Pack zero = splat(0.f),
+		quad_a = dot_xy1(k.quadratic[0], x, y),
+		quad_b = dot_xy1(k.quadratic[1], x, y),
+		quad_c = dot_xy1(k.quadratic[2], x, y);
+
+	Mask linear = quad_a == zero;
+
+	Pack d = quad_b * quad_b - splat(4.f) * quad_a * quad_c;
+	Mask real = d >= zero;
+
+	Pack s = sqrt_pack(select(real, d, zero)),
+		q = splat(-.5f) * (quad_b + select(quad_b < zero, -s, s));
+
+	Pack u0 = select(linear, -quad_c / quad_b, q / quad_a),
+		u1 = quad_c / q,
+		v0, v1, alpha0, alpha1;
+
+	Mask ok0 = check_candidate(k, x, y, u0, mask_or(linear, real), v0, alpha0),
+		ok1 = check_candidate(k, x, y, u1, mask_and(mask_not(linear), d > zero), v1, alpha1);
+
+	Mask second = mask_and(ok1, mask_or(
+		mask_not(ok0),
+		mask_or(
+			alpha1 < alpha0,
+			mask_and(alpha1 == alpha0, u1 * v1 < u0 * v0)
+		)
+	));
+
+	hit = mask_or(ok0, ok1);
+	u = select(second, u1, u0);
+	v = select(second, v1, v0);
+	alpha = select(second, alpha1, alpha0);
+}
+
+// Inverts the longest prefix of the samples that fills whole packs and
+// returns its length.
+int invert_packs(
+	BatchInverterCoefficients const & k,
+	int count,
+	float const * xs, float const * ys,
+	int * hits,
+	float * us, float * vs, float * alphas
+)
+{
+	int i = 0;
+
+	for (; i + lanes <= count; i += lanes) {
+		Mask hit;
+		Pack u, v, alpha;
+
+		invert_pack(k, load(xs + i), load(ys + i), hit, u, v, alpha);
+
+		store_mask(hits + i, hit);
+		store(us + i, u);
+		store(vs + i, v);
+		store(alphas + i, alpha);
+	}
+
+	return i;
+}
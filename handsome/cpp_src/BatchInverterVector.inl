@@ -0,0 +1,26 @@
+// Pack helpers for the vector namespaces in BatchInverter.cpp, written
+// against GCC/Clang vector extensions so they work for any lane count.
+// Expects Pack, Mask and lanes to be defined by the including namespace.
+
+inline Pack splat(float x) {
+	Pack out;
+	for (int i = 0; i < lanes; ++i) { out[i] = x; }
+	return out;
+}
+
+inline Pack load(float const * p) {
+	Pack out;
+	std::memcpy(&out, p, sizeof(out));
+	return out;
+}
+
+inline void store(float * p, Pack const & x) { std::memcpy(p, &x, sizeof(x)); }
+inline void store_mask(int * p, Mask const & m) { std::memcpy(p, &m, sizeof(m)); }
+
+inline Pack select(Mask const & m, Pack const & a, Pack const & b) {
+	return (Pack)(((Mask)a & m) | ((Mask)b & ~m));
+}
+
+inline Mask mask_and(Mask const & a, Mask const & b) { return a & b; }
+inline Mask mask_or(Mask const & a, Mask const & b) { return a | b; }
+inline Mask mask_not(Mask const & a) { return ~a; }
@@ -0,0 +1,92 @@
+#include "BilinearInverter.hpp"
+
+#include <cmath>
+
+namespace {
+	inline double cross(double const * left, double const * right) {
+		return left[0] * right[1] - left[1] * right[0];
+	}
+
+	inline bool in_range(double t) {
+		return !(t != t || t < -1e-3 || t >= 1.0-1e-3);
+	}
+
+	// Recovers v from u, using whichever coordinate of
+	// v_axis + u * twist is larger.
+	inline bool solve_v(BilinearCoefficients const & k, double const * r, double u, double & v) {
+		double m1 = k.v_axis[0] + u * k.twist[0],
+			m2 = k.v_axis[1] + u * k.twist[1];
+
+		if (fabs(m1) >= fabs(m2)) {
+			if (m1 == 0.) { return false; }
+			v = (r[0] - u * k.u_axis[0]) / m1;
+		}
+		else { v = (r[1] - u * k.u_axis[1]) / m2; }
+
+		return in_range(v);
+	}
+}
+
+void BilinearCoefficients::setup(
+	Vec2 const & p00, Vec2 const & p10,
+	Vec2 const & p01, Vec2 const & p11
+)
+{
+	for (int i = 0; i < 2; ++i) {
+		origin[i] = p00[i];
+		u_axis[i] = static_cast<double>(p10[i]) - p00[i];
+		v_axis[i] = static_cast<double>(p01[i]) - p00[i];
+		twist[i]  = static_cast<double>(p00[i]) - p10[i] - p01[i] + p11[i];
+	}
+
+	quad_a = cross(u_axis, twist);
+	quad_b = cross(u_axis, v_axis);
+}
+
+bool BilinearCoefficients::invert(Vec2 const & p, Vec2 & uv) const {
+	double r[2] = { p.x() - origin[0], p.y() - origin[1] };
+
+	double b = quad_b - cross(r, twist),
+		c = -cross(r, v_axis);
+
+	double roots[2];
+	int root_count = 0;
+
+	if (quad_a == 0.) {
+		if (b != 0.) { roots[root_count++] = -c / b; }
+	}
+	else {
+		double d = b * b - 4. * quad_a * c;
+		if (d < 0.) { return false; }
+
+		double q = -.5 * (b + std::copysign(std::sqrt(d), b));
+
+		if (q == 0.) { roots[root_count++] = 0.; }
+		else {
+			roots[root_count++] = q / quad_a;
+			if (d > 0.) { roots[root_count++] = c / q; }
+		}
+	}
+
+	bool found = false;
+	double best_u = 0., best_v = 0.;
+
+	for (int i = 0; i < root_count; ++i) {
+		double u = roots[i], v;
+
+		if (!in_range(u) || !solve_v(*this, r, u, v)) { continue; }
+
+		if (!found || u * v < best_u * best_v) {
+			found = true;
+			best_u = u;
+			best_v = v;
+		}
+	}
+
+	if (found) {
+		uv.x() = static_cast<float>(best_u);
+		uv.y() = static_cast<float>(best_v);
+	}
+
+	return found;
+}
@@ -0,0 +1,36 @@
+#pragma once
+
+#include "Vec.hpp"
+
+// Inverse of a bilinear patch in the plane, for micropolygons whose corners
+// share one z and w.
+//
+// Such a patch projects to P(u, v) = origin + u * u_axis + v * v_axis + u * v * twist
+// on screen, and every point on it has the same depth. Crossing
+// p - P(u, v) = 0 with v_axis + u * twist leaves
+//
+//     (u_axis x twist) u^2 + (u_axis x v_axis - r x twist) u - r x v_axis = 0
+//
+// for r = p - origin, whose leading coefficient does not depend on p at all.
+struct BilinearCoefficients {
+	BilinearCoefficients() { }
+
+	BilinearCoefficients(
+		Vec2 const & p00, Vec2 const & p10,
+		Vec2 const & p01, Vec2 const & p11
+	)
+	{ setup(p00, p10, p01, p11); }
+
+	void setup(
+		Vec2 const & p00, Vec2 const & p10,
+		Vec2 const & p01, Vec2 const & p11
+	);
+
+	// Finds the (u, v) of the patch covering p, preferring the smaller u * v
+	// where a folded patch covers it twice, as RationalBilinearInverter does
+	// for solutions of equal depth. Returns false when p is not covered.
+	bool invert(Vec2 const & p, Vec2 & uv) const;
+
+	double origin[2], u_axis[2], v_axis[2], twist[2];
+	double quad_a, quad_b;
+};
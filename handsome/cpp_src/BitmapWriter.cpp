@@ -1,3 +1,4 @@
+#include "BitmapWriter.hpp"
 #include "Integer.hpp"
 #include "SampleBuffer.hpp"
 #include <cstring>
@@ -41,6 +42,26 @@ namespace {
 		uint32 nimpcolors;
 	};
 
+	// BITMAPV4HEADER, a BitmapInfo followed by the masks of each channel
+	// and a colour space
+	struct BitmapV4Info {
+		BitmapV4Info() :
+			red_mask(0), green_mask(0), blue_mask(0), alpha_mask(0),
+			color_space(0), endpoints(), gamma()
+		{
+			info.header_sz = sizeof(*this);
+		}
+
+		BitmapInfo info;
+		uint32 red_mask;
+		uint32 green_mask;
+		uint32 blue_mask;
+		uint32 alpha_mask;
+		uint32 color_space;
+		uint32 endpoints[9];
+		uint32 gamma[3];
+	};
+
 	BitmapInfo make_info(uint32 width, uint32 height) {
 		BitmapInfo info;
 		info.width = width;
@@ -70,3 +91,47 @@ void write_bitmap(char const * path, SampleBuffer const & buffer) {
 
 	fclose(fd);
 }
+
+int bitmap_header_size(int channels) {
+	return sizeof(BitmapHeader) + (channels == 4 ? sizeof(BitmapV4Info) : sizeof(BitmapInfo));
+}
+
+int bitmap_row_bytes(int width, int channels) {
+	return (width * channels + 3) & ~3;
+}
+
+void write_bitmap_header(unsigned char * out, int width, int height, int channels) {
+	int header_size = bitmap_header_size(channels);
+
+	BitmapHeader header;
+	header.size() = header_size + bitmap_row_bytes(width, channels) * height;
+	header.offset() = header_size;
+
+	// A negative height puts the first row at the top.
+	BitmapInfo info = make_info(width, static_cast<uint32>(-height));
+	info.bitspp = 8 * channels;
+	info.bmp_bytesz = bitmap_row_bytes(width, channels) * height;
+
+	std::memcpy(out, &header, sizeof(header));
+	out += sizeof(header);
+
+	if (channels != 4) {
+		std::memcpy(out, &info, sizeof(info));
+		return;
+	}
+
+	BitmapV4Info v4;
+	uint32 header_sz = v4.info.header_sz;
+
+	v4.info = info;
+	v4.info.header_sz = header_sz;
+	v4.info.compress_type = 3; // BI_BITFIELDS
+
+	v4.blue_mask  = 0x000000ff;
+	v4.green_mask = 0x0000ff00;
+	v4.red_mask   = 0x00ff0000;
+	v4.alpha_mask = 0xff000000;
+	v4.color_space = 0x73524742; // LCS_sRGB
+
+	std::memcpy(out, &v4, sizeof(v4));
+}
@@ -3,3 +3,15 @@
 struct SampleBuffer;
 
 void write_bitmap(char const * path, SampleBuffer const & Buffer);
+
+//! @brief the length of the header write_bitmap_header writes for channels of 3 or 4
+int bitmap_header_size(int channels);
+
+//! @brief the bytes a row of width pixels takes, padded to a multiple of four
+int bitmap_row_bytes(int width, int channels);
+
+//! @brief writes the headers of a top down width x height bitmap to out
+//!
+//! Three channels make a 24 bit BGR bitmap, and four a 32 bit BGRA one,
+//! whose header carries the channel masks readers need to find its alpha.
+void write_bitmap_header(unsigned char * out, int width, int height, int channels);
@@ -0,0 +1,89 @@
+#pragma once
+
+#include "Vec.hpp"
+
+#include <cmath>
+#include <cstdint>
+#include <cstring>
+
+// IEEE 754 binary16 storage, laid out as numpy.float16. Conversions round
+// to nearest even, as numpy does, and all arithmetic happens in float.
+inline float half_to_float(uint16_t h) {
+	uint32_t sign = static_cast<uint32_t>(h & 0x8000) << 16,
+		exponent = (h >> 10) & 0x1f,
+		mantissa = h & 0x3ff;
+
+	if (exponent == 0) {
+		// Zero or subnormal, mantissa * 2^-24 exactly
+		float value = static_cast<float>(mantissa) * 5.9604644775390625e-8f;
+		return sign ? -value : value;
+	}
+
+	uint32_t bits = exponent == 0x1f
+		? sign | 0x7f800000 | (mantissa << 13)
+		: sign | ((exponent + 112) << 23) | (mantissa << 13);
+
+	float out;
+	std::memcpy(&out, &bits, sizeof(out));
+
+	return out;
+}
+
+inline uint16_t float_to_half(float f) {
+	uint32_t bits;
+	std::memcpy(&bits, &f, sizeof(bits));
+
+	uint16_t sign = static_cast<uint16_t>((bits >> 16) & 0x8000);
+	uint32_t magnitude = bits & 0x7fffffff;
+
+	if (magnitude >= 0x7f800000) {
+		// Infinity, or NaN kept quiet with its high mantissa bits
+		uint16_t nan = magnitude > 0x7f800000
+			? static_cast<uint16_t>(0x200 | ((magnitude >> 13) & 0x3ff))
+			: 0;
+
+		return sign | 0x7c00 | nan;
+	}
+
+	if (magnitude < 0x38800000) {
+		// Below the smallest normal half. Scaling by 2^24 is exact, and
+		// nearbyint rounds ties to even; 1024 comes out as the smallest
+		// normal half, which has the same bits.
+		float scaled = std::fabs(f) * 16777216.f;
+		return sign | static_cast<uint16_t>(std::nearbyint(scaled));
+	}
+
+	// Rebias the exponent from 127 to 15 and round away the low 13 bits.
+	// Values too large for a half carry into the exponent and come out as
+	// infinity.
+	uint32_t rebiased = magnitude - 0x38000000;
+	rebiased += 0xfff + ((rebiased >> 13) & 1);
+
+	if (rebiased >= 0x0f800000) { return sign | 0x7c00; }
+
+	return sign | static_cast<uint16_t>(rebiased >> 13);
+}
+
+struct HalfPixel {
+	uint16_t channels[4];
+};
+
+inline Vec4 load_pixel(Vec4 const & pixel) { return pixel; }
+
+inline Vec4 load_pixel(HalfPixel const & pixel) {
+	return Vec4(
+		half_to_float(pixel.channels[0]),
+		half_to_float(pixel.channels[1]),
+		half_to_float(pixel.channels[2]),
+		half_to_float(pixel.channels[3])
+	);
+}
+
+inline void store_pixel(Vec4 & out, Vec4 const & pixel) { out = pixel; }
+
+inline void store_pixel(HalfPixel & out, Vec4 const & pixel) {
+	out.channels[0] = float_to_half(pixel.x());
+	out.channels[1] = float_to_half(pixel.y());
+	out.channels[2] = float_to_half(pixel.z());
+	out.channels[3] = float_to_half(pixel.w());
+}
@@ -0,0 +1,54 @@
+#pragma once
+
+#include "Vec.hpp"
+
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+
+// Pixel as numpy lays it out, four unsigned bytes
+struct BytePixel {
+	uint8_t channels[4];
+};
+
+// The sRGB transfer function, for linear values in [0, 1]
+inline float srgb_encode(float linear) {
+	return linear <= 0.0031308f
+		? 12.92f * linear
+		: 1.055f * std::pow(linear, 1.f / 2.4f) - 0.055f;
+}
+
+// Thresholds of an 8 x 8 Bayer ordered dither, in 64ths
+static int const bayer_8x8[8][8] = {
+	{  0, 32,  8, 40,  2, 34, 10, 42 },
+	{ 48, 16, 56, 24, 50, 18, 58, 26 },
+	{ 12, 44,  4, 36, 14, 46,  6, 38 },
+	{ 60, 28, 52, 20, 62, 30, 54, 22 },
+	{  3, 35, 11, 43,  1, 33,  9, 41 },
+	{ 51, 19, 59, 27, 49, 17, 57, 25 },
+	{ 15, 47,  7, 39, 13, 45,  5, 37 },
+	{ 63, 31, 55, 23, 61, 29, 53, 21 },
+};
+
+// Clamps a pixel to [0, 1], sRGB encodes its colour channels if asked, and
+// stores it as bytes. Bytes are rounded to nearest, or with dither set,
+// rounded at a threshold that varies over an 8 x 8 Bayer pattern, which
+// trades banding in smooth gradients for fine, regular noise.
+struct QuantizePixel {
+	bool srgb, dither;
+
+	void operator () (BytePixel & out, Vec4 const & pixel, int row, int column) const {
+		float offset = dither
+			? (static_cast<float>(bayer_8x8[row & 7][column & 7]) + .5f) / 64.f
+			: .5f;
+
+		for (int k = 0; k < 4; ++k) {
+			float value = (std::min)((std::max)(pixel[k], 0.f), 1.f);
+
+			if (srgb && k < 3) { value = srgb_encode(value); }
+
+			float scaled = (std::min)(255.f * value + offset, 255.f);
+			out.channels[k] = static_cast<uint8_t>(scaled);
+		}
+	}
+};
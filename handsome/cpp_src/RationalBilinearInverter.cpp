@@ -29,6 +29,16 @@ namespace {
 			{ *out_begin += scale * *in_begin; }
 	}
 
+	inline void cross(double const * left, double const * right, double * out) {
+		out[0] = left[1] * right[2] - left[2] * right[1];
+		out[1] = left[2] * right[0] - left[0] * right[2];
+		out[2] = left[0] * right[1] - left[1] * right[0];
+	}
+
+	inline double evaluate(double const (&k)[3], double x, double y) {
+		return k[0] * x + k[1] * y + k[2];
+	}
+
 	template <class T, int m, int n>
 	void print_matrix(T (&M)[m][n]) {
 		for (int j = 0; j < m; ++j) {
@@ -126,3 +136,103 @@ void RationalBilinearInverter::solve(
 	if (size_ == 2 && solutions_[0].first > solutions_[1].first)
 		{ std::swap(solutions_[0], solutions_[1]); }
 }
+
+void RationalBilinearCoefficients::setup(
+	Vec4 const & p00, Vec4 const & p10,
+	Vec4 const & p01, Vec4 const & p11
+)
+{
+	for (int i = 0; i < 4; ++i) {
+		origin[i] = p00[i];
+		u_axis[i] = static_cast<double>(p10[i]) - p00[i];
+		v_axis[i] = static_cast<double>(p01[i]) - p00[i];
+		twist[i] = static_cast<double>(p00[i]) - p10[i] - p01[i] + p11[i];
+	}
+
+	double t[3];
+
+	cross(twist, u_axis, quadratic[0]);
+
+	cross(twist, origin, quadratic[1]);
+	cross(v_axis, u_axis, t);
+	for (int i = 0; i < 3; ++i) { quadratic[1][i] += t[i]; }
+
+	cross(v_axis, origin, quadratic[2]);
+}
+
+void RationalBilinearInverter::solve(
+	Vec2 const & p,
+	RationalBilinearCoefficients const & coefficients
+)
+{
+	double x = p.x(), y = p.y(),
+		quad_a = evaluate(coefficients.quadratic[0], x, y),
+		quad_b = evaluate(coefficients.quadratic[1], x, y),
+		quad_c = evaluate(coefficients.quadratic[2], x, y);
+
+	if (quad_a == 0.) {
+		if (quad_b != 0.) { push_solution(p, coefficients, -quad_c / quad_b); }
+	}
+	else {
+		double d = quad_b * quad_b - 4. * quad_a * quad_c;
+		if (d < 0.) { return; }
+
+		// Stable form of the quadratic formula, so nearly affine patches
+		// with quad_a close to zero do not lose their meaningful root.
+		double q = -.5 * (quad_b + std::copysign(std::sqrt(d), quad_b));
+
+		if (q == 0.) { push_solution(p, coefficients, 0.); }
+		else {
+			push_solution(p, coefficients, q / quad_a);
+			if (d > 0.) { push_solution(p, coefficients, quad_c / q); }
+		}
+	}
+
+	if (size_ < 2) { return; }
+
+	// Ties in depth (folded affine patches) are broken on u * v, which
+	// orders them the way the elimination solver's root D does.
+	value_type & s0 = solutions_[0], & s1 = solutions_[1];
+
+	bool swap = s0.first > s1.first
+		|| (s0.first == s1.first && s0.second.x() * s0.second.y() > s1.second.x() * s1.second.y());
+
+	if (swap) { std::swap(s0, s1); }
+}
+
+void RationalBilinearInverter::push_solution(
+	Vec2 const & p,
+	RationalBilinearCoefficients const & k,
+	double u
+)
+{
+	if (u != u || u < -1e-3 || u >= 1.0-1e-3) { return; }
+
+	double x = p.x(), y = p.y();
+
+	double n1 = (k.origin[0] - x * k.origin[2]) + u * (k.u_axis[0] - x * k.u_axis[2]),
+		m1 = (k.v_axis[0] - x * k.v_axis[2]) + u * (k.twist[0] - x * k.twist[2]),
+		n2 = (k.origin[1] - y * k.origin[2]) + u * (k.u_axis[1] - y * k.u_axis[2]),
+		m2 = (k.v_axis[1] - y * k.v_axis[2]) + u * (k.twist[1] - y * k.twist[2]);
+
+	double v;
+
+	if (fabs(m1) >= fabs(m2)) {
+		if (m1 == 0.) { return; }
+		v = -n1 / m1;
+	}
+	else { v = -n2 / m2; }
+
+	if (v != v || v < -1e-3 || v >= 1.0-1e-3) { return; }
+
+	double uv = u * v,
+		hz = k.origin[2] + u * k.u_axis[2] + v * k.v_axis[2] + uv * k.twist[2],
+		hw = k.origin[3] + u * k.u_axis[3] + v * k.v_axis[3] + uv * k.twist[3];
+
+	if (!hw) { return; }
+
+	double alpha = hz / hw;
+	if (alpha != alpha || alpha < 1.0 - 1e-3) { return; }
+
+	solutions_[size_++] = std::make_pair(alpha, Vec2(u, v));
+}
@@ -4,6 +4,31 @@
 
 #include <utility>
 
+// Per-patch setup for RationalBilinearInverter.
+//
+// Writing the patch as H(u, v) = origin + u * u_axis + v * v_axis + u * v * twist,
+// a sample p = (x, y) lies on it where H_x - x * H_z = 0 and H_y - y * H_z = 0.
+// Eliminating v leaves a quadratic in u whose coefficients are linear in
+// (x, y, 1), so only those three dot products and one root solve depend on
+// the sample.
+struct RationalBilinearCoefficients {
+	RationalBilinearCoefficients() { }
+
+	RationalBilinearCoefficients(
+		Vec4 const & p00, Vec4 const & p10,
+		Vec4 const & p01, Vec4 const & p11
+	)
+	{ setup(p00, p10, p01, p11); }
+
+	void setup(
+		Vec4 const & p00, Vec4 const & p10,
+		Vec4 const & p01, Vec4 const & p11
+	);
+
+	double quadratic[3][3];
+	double origin[4], u_axis[4], v_axis[4], twist[4];
+};
+
 struct RationalBilinearInverter {
 	typedef std::pair<float, Vec2> value_type;
 	typedef unsigned int size_type;
@@ -21,6 +46,12 @@ struct RationalBilinearInverter {
 	) : size_(0)
 	{ solve(p, p00, p10, p01, p11); }
 
+	RationalBilinearInverter(
+		Vec2 const & p,
+		RationalBilinearCoefficients const & coefficients
+	) : size_(0)
+	{ solve(p, coefficients); }
+
 	iterator begin() { return solutions_; }
 	const_iterator begin() const { return solutions_; }
 
@@ -43,6 +74,17 @@ struct RationalBilinearInverter {
 			Vec4 const & p01, Vec4 const & p11
 		);
 
+		void solve(
+			Vec2 const & p,
+			RationalBilinearCoefficients const & coefficients
+		);
+
+		void push_solution(
+			Vec2 const & p,
+			RationalBilinearCoefficients const & coefficients,
+			double u
+		);
+
 		value_type solutions_[2];
 		size_type size_;
 };
@@ -49,3 +49,38 @@ BOOST_AUTO_TEST_CASE(TEST_RATIONAL_BILINEAR_INVERTER) {
 		}
 	}
 }
+
+BOOST_AUTO_TEST_CASE(TEST_RATIONAL_BILINEAR_COEFFICIENTS) {
+	BilinearPatch<Vec4> patch(
+		Vec4(0, 0, 1, 1),
+		Vec4(2, 2, 2, 1),
+		Vec4(0, 1, 1, 1),
+		Vec4(3, 6, 3, 1)
+	);
+
+	RationalBilinearCoefficients coefficients(
+		patch[0], patch[1], patch[2], patch[3]
+	);
+
+	for (int j = 0; j < 64; ++j) {
+		float v = static_cast<float>(j) / 64.0f;
+
+		for (int i = 0; i < 64; ++i) {
+			float u = static_cast<float>(i) / 64.0f;
+
+			Vec4 p4 = patch(u, v);
+			Vec2 p2 = Vec2(p4.x(), p4.y()) / p4.z();
+
+			RationalBilinearInverter expected(p2,
+				patch[0], patch[1], patch[2], patch[3]
+			);
+
+			RationalBilinearInverter actual(p2, coefficients);
+
+			BOOST_REQUIRE_EQUAL(actual.size(), expected.size());
+			BOOST_CHECK_SMALL(actual.front().first - p4.z() / p4.w(), 1e-4f);
+			BOOST_CHECK_SMALL(actual.front().second.x() - u, 1e-4f);
+			BOOST_CHECK_SMALL(actual.front().second.y() - v, 1e-4f);
+		}
+	}
+}
@@ -0,0 +1,86 @@
+__all__ = [ 'FILTERS', 'box', 'filter_taps', 'gaussian', 'lanczos', 'mitchell' ]
+
+from .Exceptions import HandsomeException
+
+import math
+import numpy as np
+
+# Reconstruction filters for Tile.downsample. Each takes distances in output
+# pixels and the filter radius, and is zero from the radius on.
+
+def box(x, radius):
+    return np.where(np.abs(x) < radius, 1., 0.)
+
+
+def gaussian(x, radius):
+    # The radius is three standard deviations.
+    sigma = radius / 3.
+    return np.exp(-.5 * (x / sigma) ** 2)
+
+
+def mitchell(x, radius, b=1/3., c=1/3.):
+    # Mitchell-Netravali, stretched from its natural radius of 2 to radius
+    x = np.abs(2. * x / radius)
+
+    near = (
+        (12 - 9 * b - 6 * c) * x ** 3
+        + (-18 + 12 * b + 6 * c) * x ** 2
+        + (6 - 2 * b)
+    )
+
+    far = (
+        (-b - 6 * c) * x ** 3
+        + (6 * b + 30 * c) * x ** 2
+        + (-12 * b - 48 * c) * x
+        + (8 * b + 24 * c)
+    )
+
+    return np.where(x < 1, near, np.where(x < 2, far, 0.)) / 6.
+
+
+def lanczos(x, radius):
+    return np.where(np.abs(x) < radius, np.sinc(x) * np.sinc(x / radius), 0.)
+
+
+# Filters by name, with their default radii in output pixels
+FILTERS = {
+    'box'      : (box,      .5),
+    'gaussian' : (gaussian, 1.5),
+    'mitchell' : (mitchell, 2.),
+    'lanczos'  : (lanczos,  3.),
+}
+
+
+def filter_taps(name, step, radius=None):
+    '''Samples filter name for downsampling by the integer step
+
+    Returns the weights of the input samples output pixel o reads along
+    each axis, normalized to sum to one, and the offset of the first of
+    them from o * step.
+    '''
+    if name not in FILTERS:
+        raise HandsomeException(
+            'unknown filter',
+            { 'filter' : name, 'filters' : tuple(FILTERS) }
+        )
+
+    function, default_radius = FILTERS[name]
+
+    if radius is None:
+        radius = default_radius
+
+    if radius <= 0:
+        raise HandsomeException('filter radius must be positive', { 'radius' : radius })
+
+    # Output pixel o is centred on input sample coordinate (o + 1/2) * step,
+    # and reads the input samples whose centres lie strictly within radius
+    # output pixels of it.
+    center = step / 2.
+    first = int(math.floor(center - radius * step - .5)) + 1
+    last = int(math.ceil(center + radius * step - .5)) - 1
+
+    offsets = np.arange(first, last + 1, dtype=np.float64)
+    weights = function((offsets + .5 - center) / step, radius)
+    weights /= weights.sum()
+
+    return weights.astype(np.float32), first
@@ -0,0 +1,95 @@
+__all__ = [ 'TILE_ORDERS', 'hilbert_index', 'morton_index', 'order_origins' ]
+
+from .Exceptions import HandsomeException
+
+import numpy as np
+
+# Orders in which a TileCache visits tiles. 'rows' walks the tiles row by
+# row, bottom up, and 'columns' column by column, left to right. 'morton' and 'hilbert' follow space
+# filling curves, so tiles visited one after another are near each other in
+# both directions and fill from the same parts of a mesh's arrays.
+TILE_ORDERS = ( 'rows', 'columns', 'morton', 'hilbert' )
+
+
+def morton_index(x, y):
+    '''Interleaves the bits of non-negative integer arrays x and y, x lowest'''
+    return spread_bits(x) | (spread_bits(y) << 1)
+
+
+def hilbert_index(x, y, side):
+    '''Distance along the Hilbert curve over a side by side grid, side a
+    power of two, of the cells at non-negative integer arrays x and y
+    '''
+    x = np.array(x, dtype=np.int64)
+    y = np.array(y, dtype=np.int64)
+    d = np.zeros_like(x)
+
+    s = side // 2
+
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+
+        d += s * s * ((3 * rx) ^ ry)
+
+        # Rotate the quadrant so the curve inside it runs the right way.
+        flip = ~ry & rx
+        x = np.where(flip, s - 1 - x, x)
+        y = np.where(flip, s - 1 - y, y)
+
+        x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+
+        s //= 2
+
+    return d
+
+
+def order_origins(origins, tile_shape, order='columns'):
+    '''Returns the tile origins in origins sorted into order, one of TILE_ORDERS'''
+    if order not in TILE_ORDERS:
+        raise HandsomeException(
+            'unknown tile order',
+            { 'order' : order, 'orders' : TILE_ORDERS }
+        )
+
+    origins = list(origins)
+
+    if len(origins) < 2:
+        return origins
+
+    width, height = tile_shape
+
+    xy = np.array(origins, dtype=np.int64)
+    x = xy[:,0] // width
+    y = xy[:,1] // height
+
+    x -= x.min()
+    y -= y.min()
+
+    if order == 'rows':
+        keys = np.lexsort((x, y))
+    elif order == 'columns':
+        keys = np.lexsort((y, x))
+    else:
+        if order == 'morton':
+            index = morton_index(x, y)
+        else:
+            side = 1 << int(max(x.max(), y.max())).bit_length()
+            index = hilbert_index(x, y, side)
+
+        keys = np.argsort(index, kind='stable')
+
+    return [ origins[k] for k in keys ]
+
+
+def spread_bits(v):
+    # Moves bit i of each 32 bit value to bit 2 * i.
+    v = np.array(v, dtype=np.uint64) & 0xffffffff
+
+    v = (v | (v << 16)) & 0x0000ffff0000ffff
+    v = (v | (v << 8))  & 0x00ff00ff00ff00ff
+    v = (v | (v << 4))  & 0x0f0f0f0f0f0f0f0f
+    v = (v | (v << 2))  & 0x3333333333333333
+    v = (v | (v << 1))  & 0x5555555555555555
+
+    return v
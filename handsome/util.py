@@ -1,17 +1,50 @@
 import math
 import numpy as np
 import functools
+import os
 
 memoize = functools.lru_cache()
 
+# Pixels go to the uncompressed formats of ImageWriter natively, without
+# building a PIL image; everything else is saved through PIL.
 def save_array_as_image(array, path, mode):
-    from PIL import Image
+    from .ImageWriter import RawImageWriter, image_writers
+    from .Pixel import Pixel
     height, width = array.shape
 
+    extension = os.path.splitext(str(path))[1].lower()
+    cls = image_writers.get(extension)
+
+    if array.dtype == Pixel and cls is not None and issubclass(cls, RawImageWriter):
+        with cls(path, width, height, mode) as writer:
+            writer.write_rows(array)
+
+        return
+
+    from PIL import Image
+
     image = Image.frombuffer(mode, (width, height), np.ascontiguousarray(array).data, 'raw', mode, 0, 1)
     image.save(path)
 
 
+# Writes tile's pixels to path a band of rows at a time, each resolved as
+# Tile.downsample_to_pixels does with resolve, so neither a float nor an 8
+# bit copy of the whole image is ever held. The format follows the
+# extension, as for open_image_writer, and bands are encoded on a thread of
+# their own while the next is resolved.
+def save_tile_as_image(tile, path, mode='RGBA', sample_rate=1, band_rows=64, **resolve):
+    from .ImageWriter import open_image_writer
+
+    downrate = int(math.ceil(tile.sample_rate / sample_rate))
+    width = int(math.ceil(tile.shape[0] * tile.sample_rate / downrate))
+    height = int(math.ceil(tile.shape[1] * tile.sample_rate / downrate))
+
+    with open_image_writer(path, width, height, mode, background=True) as writer:
+        for begin in range(0, height, band_rows):
+            end = min(begin + band_rows, height)
+            writer.write_rows(tile.downsample_to_pixels(sample_rate, rows=(begin, end), **resolve))
+
+
 def read_image(path):
     from PIL import Image
     image = Image.open(path)
@@ -71,39 +104,438 @@ def parse_color(string):
         A = 'ff' if len(double) == 6 else double[6:8]
         return tuple(int(v, 16) for v in (R, G, B, A))
 
-def render_mesh(mesh, tile_shape=(16, 16), sample_rate=4):
+def render_mesh(
+    mesh, tile_shape=(16, 16), sample_rate=4,
+    batched=False, workers=None, cache=None, depth=False, dtype=None
+):
     from .Pixel import FloatPixel
     from .TileCache import TileCache
-    from .capi import fill_micropolygon_mesh, generate_numpy_begin
+    from . import capi
 
-    cache = TileCache(tile_shape, sample_rate, FloatPixel)
+    generate_numpy_begin = capi.generate_numpy_begin
+
+    if cache is None:
+        cache = TileCache(tile_shape, sample_rate, FloatPixel if dtype is None else dtype)
+    else:
+        check_cache(cache, tile_shape, sample_rate)
+
+    fill_micropolygon_mesh_bin, coefficients_ptr = mesh_bin_filler(mesh, batched, cache.dtype)
 
-    mesh_bounds = mesh.outer_bounds
     mesh_rows, mesh_columns = mesh.buffer.shape
 
-    for tile in cache.get_tiles_for_bounds(mesh_bounds):
+    mesh_buffer_ptr = generate_numpy_begin(mesh.buffer)
+    mesh_bounds_ptr = generate_numpy_begin(mesh.bounds)
+    bins = mesh.tile_bins(tile_shape)
+
+    # Only tiles with cells binned to them are created, and the fill
+    # records which of their samples it writes, so compositing skips the
+    # rest of each tile.
+    def fill_tile(origin):
+        tile = cache.get_tile(origin)
+        cells = bins.get_cells(origin)
+
+        coverage_ptr = generate_numpy_begin(tile.coverage_buffer)
         tile_rows, tile_columns = tile.buffer.shape
 
-        mesh_buffer_ptr = generate_numpy_begin(mesh.buffer)
-        mesh_bounds_ptr = generate_numpy_begin(mesh.bounds)
-        coordinate_image_ptr = generate_numpy_begin(tile.coordinate_image)
-        tile_bounds = tile.bounds
-        tile_buffer_ptr = tile.buffer_ptr
         tile_buffer_ptr = generate_numpy_begin(tile.buffer)
 
-        fill_micropolygon_mesh(
+        # With depth, a sample keeps the nearest hit of every mesh rendered
+        # into this cache rather than the last one drawn.
+        depth_buffer_ptr = generate_numpy_begin(tile.depth_buffer) if depth else None
+
+        fill_micropolygon_mesh_bin(
             mesh_rows, mesh_columns,
             mesh_buffer_ptr,
             mesh_bounds_ptr,
+            coefficients_ptr,
+            generate_numpy_begin(cells), len(cells),
             tile_rows, tile_columns,
-            tile_bounds,
-            coordinate_image_ptr,
-            tile_buffer_ptr
+            tile.bounds,
+            tile_buffer_ptr,
+            depth_buffer_ptr,
+            coverage_ptr
         )
 
+    map_tiles(fill_tile, cache.order_origins(bins.origins()), workers, cache)
+
     return cache
 
 
+def check_cache(cache, tile_shape, sample_rate):
+    from .Exceptions import HandsomeException
+
+    if tuple(cache.tile_shape) != tuple(tile_shape) or cache.sample_rate != sample_rate:
+        raise HandsomeException(
+            'cache does not match the requested tiles',
+            {
+                'tile_shape'        : tile_shape,
+                'sample_rate'       : sample_rate,
+                'cache.tile_shape'  : cache.tile_shape,
+                'cache.sample_rate' : cache.sample_rate,
+            }
+        )
+
+
+# Returns the bin filler for mesh along with the inverter coefficients it
+# reads. Only the rational filler uses them, so the others get None. The
+# filler writes tiles of dtype, either FloatPixel or HalfPixel.
+def mesh_bin_filler(mesh, batched=False, dtype=None):
+    from . import capi
+
+    suffix = fill_suffix(dtype)
+
+    if batched:
+        return getattr(capi, 'fill_micropolygon_mesh_bin_batched' + suffix), None
+
+    if mesh.is_affine:
+        return getattr(capi, 'fill_micropolygon_mesh_bin_affine' + suffix), None
+
+    coefficients_ptr = capi.generate_numpy_begin(mesh.inverter_coefficients)
+
+    return getattr(capi, 'fill_micropolygon_mesh_bin' + suffix), coefficients_ptr
+
+
+# The fillers write FloatPixel tiles, and HalfPixel ones through their
+# _half variants.
+def fill_suffix(dtype):
+    from .Exceptions import HandsomeException
+    from .Pixel import FloatPixel, HalfPixel
+
+    if dtype is None or dtype == FloatPixel:
+        return ''
+
+    if dtype == HalfPixel:
+        return '_half'
+
+    raise HandsomeException(
+        'tiles must hold FloatPixels or HalfPixels',
+        { 'dtype' : dtype }
+    )
+
+
+# Renders straight onto a FloatPixel or HalfPixel canvas tile, with the same
+# result as compositing render_mesh's cache into it. Each tile is filled into a pooled
+# scratch buffer and blended over its region of the canvas natively, so no
+# TileCache is built for the mesh.
+def render_mesh_to_canvas(
+    mesh, canvas, tile_shape=(16, 16), batched=False, workers=None,
+    tile_order='hilbert'
+):
+    from .Exceptions import HandsomeException
+    from .Pixel import FloatPixel, HalfPixel
+    from .Tile import Tile, clip_slices, composite_buffers, coverage_slice
+    from .tile_order import order_origins
+    from . import capi
+
+    if canvas.dtype not in (FloatPixel, HalfPixel):
+        raise HandsomeException(
+            'canvas must hold FloatPixels or HalfPixels',
+            { 'canvas.dtype' : canvas.dtype }
+        )
+
+    generate_numpy_begin = capi.generate_numpy_begin
+    fill_micropolygon_mesh_bin, coefficients_ptr = mesh_bin_filler(mesh, batched)
+
+    sample_rate = canvas.sample_rate
+    scratch_shape = (tile_shape[1] * sample_rate, tile_shape[0] * sample_rate)
+    pool = canvas.pool
+
+    mesh_rows, mesh_columns = mesh.buffer.shape
+
+    mesh_buffer_ptr = generate_numpy_begin(mesh.buffer)
+    mesh_bounds_ptr = generate_numpy_begin(mesh.bounds)
+    bins = mesh.tile_bins(tile_shape)
+
+    def fill_tile(origin):
+        tile = Tile(origin, tile_shape, sample_rate, FloatPixel)
+        slices = canvas.intersection_slices(tile)
+
+        if slices is None:
+            return
+
+        cells = bins.get_cells(origin)
+        scratch_ptr, scratch, slot = pool.acquire(scratch_shape, FloatPixel)
+        coverage = np.array((scratch_shape[0], 0, scratch_shape[1], 0), dtype=np.int32)
+
+        try:
+            fill_micropolygon_mesh_bin(
+                mesh_rows, mesh_columns,
+                mesh_buffer_ptr,
+                mesh_bounds_ptr,
+                coefficients_ptr,
+                generate_numpy_begin(cells), len(cells),
+                scratch_shape[0], scratch_shape[1],
+                tile.bounds,
+                scratch_ptr,
+                None,
+                generate_numpy_begin(coverage)
+            )
+
+            dirty = coverage_slice(coverage)
+
+            if dirty is not None:
+                slices = clip_slices(*slices, dirty)
+
+            if dirty is not None and slices is not None:
+                target_slice, source_slice = slices
+                composite_buffers(canvas.buffer[target_slice], scratch[source_slice])
+        finally:
+            pool.release(slot)
+
+    # Only tiles over the canvas are filled, so a canvas that is one bucket of
+    # a larger image costs the mesh cells over that bucket.
+    origins = bins.origins(canvas.bounds)
+
+    map_tiles(fill_tile, order_origins(origins, tile_shape, tile_order), workers)
+
+
+# Fills every mesh with one C call per tile rather than one per mesh and
+# tile, which is what dominates scenes made of many small meshes. Meshes are
+# filled into the same tiles in order, so later ones replace earlier ones
+# where they overlap unless depth is set. With origins given, only the tiles
+# at those origins are filled.
+def render_meshes(
+    meshes, tile_shape=(16, 16), sample_rate=4,
+    batched=False, workers=None, cache=None, depth=False, dtype=None,
+    origins=None
+):
+    from .MicropolygonMesh import MeshReference, Position
+    from .Pixel import FloatPixel
+    from .TileBins import TileBins
+    from .TileCache import TileCache
+    from . import capi
+
+    generate_numpy_begin = capi.generate_numpy_begin
+
+    if cache is None:
+        cache = TileCache(tile_shape, sample_rate, FloatPixel if dtype is None else dtype)
+    else:
+        check_cache(cache, tile_shape, sample_rate)
+
+    suffix = fill_suffix(cache.dtype)
+
+    if batched:
+        fill_micropolygon_meshes = getattr(capi, 'fill_micropolygon_meshes_batched' + suffix)
+    else:
+        fill_micropolygon_meshes = getattr(capi, 'fill_micropolygon_meshes' + suffix)
+    meshes = list(meshes)
+
+    if not meshes:
+        return cache
+
+    references = np.zeros(len(meshes), dtype=MeshReference)
+    mesh_bounds = np.zeros((1, len(meshes)), dtype=Position)
+
+    for i, mesh in enumerate(meshes):
+        rows, columns = mesh.buffer.shape
+        b = mesh.outer_bounds
+
+        # The fill only descends pyramids over more than 8 x 8 blocks of
+        # cells, so smaller meshes skip building one.
+        if max(rows, columns) > 9:
+            pyramid_ptr = generate_numpy_begin(mesh.bounds_pyramid).value
+        else:
+            pyramid_ptr = 0
+
+        if batched or mesh.is_affine:
+            coefficients_ptr = 0
+        else:
+            coefficients_ptr = generate_numpy_begin(mesh.inverter_coefficients).value
+
+        references[i] = (
+            generate_numpy_begin(mesh.buffer).value,
+            generate_numpy_begin(mesh.bounds).value,
+            pyramid_ptr,
+            coefficients_ptr,
+            rows, columns,
+            mesh.is_affine
+        )
+
+        mesh_bounds[0, i] = (b.left, b.bottom, b.right, b.top)
+
+    outer_bounds = capi.Rectangle(
+        mesh_bounds['x'].min(), mesh_bounds['y'].min(),
+        mesh_bounds['z'].max(), mesh_bounds['w'].max()
+    )
+
+    # Whole meshes are binned as the cells of a one row grid, which keeps
+    # them in order within every bin.
+    bins = TileBins(mesh_bounds, outer_bounds, tile_shape)
+    references_ptr = generate_numpy_begin(references)
+
+    def fill_tile(origin):
+        tile = cache.get_tile(origin)
+        indices = bins.get_cells(origin)
+
+        coverage_ptr = generate_numpy_begin(tile.coverage_buffer)
+        tile_rows, tile_columns = tile.buffer.shape
+
+        depth_buffer_ptr = generate_numpy_begin(tile.depth_buffer) if depth else None
+
+        fill_micropolygon_meshes(
+            references_ptr,
+            generate_numpy_begin(indices), len(indices),
+            tile_rows, tile_columns,
+            tile.bounds,
+            generate_numpy_begin(tile.buffer),
+            depth_buffer_ptr,
+            coverage_ptr
+        )
+
+    binned = bins.origins()
+
+    if origins is not None:
+        binned = set(map(tuple, binned)) & set(map(tuple, origins))
+
+    map_tiles(fill_tile, cache.order_origins(binned), workers, cache)
+
+    return cache
+
+
+# Renders meshes onto canvas, a FloatPixel or HalfPixel tile of sample rate 1
+# holding the background, spending sample_rate samples per unit only where
+# the image needs them. The meshes are first rendered at base_rate and
+# resolved onto the canvas. Tiles holding a pixel that differs from one of
+# its neighbours, or whose own samples differ, by more than threshold in
+# any channel are then rendered again at sample_rate, and their resolved
+# pixels replace the base rate ones. Pixels of flat colour come out as a
+# full rate render would make them, so on scenes of mostly flat colour the
+# samples go to the edges. Returns the origins of the tiles re-sampled.
+def render_meshes_adaptive(
+    meshes, canvas, tile_shape=(8, 8), base_rate=1, sample_rate=4,
+    threshold=1/256., batched=False, workers=None
+):
+    from .Exceptions import HandsomeException
+    from .Pixel import FloatPixel, HalfPixel, array_view
+    from .Tile import Tile
+
+    if canvas.sample_rate != 1 or canvas.dtype not in (FloatPixel, HalfPixel):
+        raise HandsomeException(
+            'canvas must be resolved FloatPixels or HalfPixels',
+            { 'canvas.sample_rate' : canvas.sample_rate, 'canvas.dtype' : canvas.dtype }
+        )
+
+    meshes = list(meshes)
+    background = array_view(canvas.buffer).astype(np.float32)
+    height, width = background.shape[:2]
+
+    base = Tile(canvas.origin, canvas.shape, base_rate, FloatPixel)
+    array_view(base.buffer)[:] = upsample(background, base_rate)
+
+    # Base rate tiles hold as many samples as the full rate ones, so the
+    # coarse pass is not dominated by the overhead of many small tiles.
+    scale = max(sample_rate // base_rate, 1)
+    base_tile_shape = (tile_shape[0] * scale, tile_shape[1] * scale)
+
+    render_meshes(meshes, base_tile_shape, base_rate, batched, workers).composite_into(base)
+    resolved = array_view(base.downsample(1))
+
+    flagged = contrast_mask(resolved, threshold)
+
+    if base_rate > 1:
+        samples = array_view(base.buffer).reshape(height, base_rate, width, base_rate, 4)
+        spread = samples.max(axis=(1, 3)) - samples.min(axis=(1, 3))
+        flagged |= spread.max(axis=2) > threshold
+
+    base.release()
+    array_view(canvas.buffer)[:] = resolved
+
+    # Buffer rows run top down, so the pixel in row i covers y from
+    # top - i - 1 to top - i.
+    rows, columns = np.nonzero(flagged)
+    x = canvas.origin[0] + columns
+    y = canvas.origin[1] + canvas.shape[1] - 1 - rows
+
+    tile_width, tile_height = tile_shape
+    origins = sorted(set(zip(
+        (x // tile_width * tile_width).tolist(),
+        (y // tile_height * tile_height).tolist()
+    )))
+
+    if not origins:
+        return origins
+
+    cache = render_meshes(meshes, tile_shape, sample_rate, batched, workers, origins=origins)
+
+    for origin in origins:
+        tile = Tile(origin, tile_shape, sample_rate, FloatPixel)
+        target_slice, patch_slice = canvas.intersection_slices(Tile(origin, tile_shape))
+
+        patch = np.zeros((tile_height, tile_width, 4), dtype=np.float32)
+        patch[patch_slice] = background[target_slice]
+
+        array_view(tile.buffer)[:] = upsample(patch, sample_rate)
+
+        if origin in cache.tiles:
+            tile.composite_from(cache.tiles[origin])
+
+        array_view(canvas.buffer)[target_slice] = array_view(tile.downsample(1))[patch_slice]
+        tile.release()
+
+    cache.clear()
+
+    return origins
+
+
+# Repeats each pixel of a (rows, columns, channels) array into a block of
+# sample_rate x sample_rate samples.
+def upsample(pixels, sample_rate):
+    if sample_rate == 1:
+        return pixels
+
+    return np.repeat(np.repeat(pixels, sample_rate, axis=0), sample_rate, axis=1)
+
+
+# Flags the pixels of a (rows, columns, channels) array that differ from the
+# pixel beside, above or below them by more than threshold in any channel,
+# along with their eight neighbours: an edge crossing a pixel between its
+# samples still changes some pixel next to it.
+def contrast_mask(pixels, threshold):
+    edges = np.zeros(pixels.shape[:2], dtype=bool)
+
+    vertical = (np.abs(np.diff(pixels, axis=0)) > threshold).any(axis=2)
+    edges[1:] |= vertical
+    edges[:-1] |= vertical
+
+    horizontal = (np.abs(np.diff(pixels, axis=1)) > threshold).any(axis=2)
+    edges[:, 1:] |= horizontal
+    edges[:, :-1] |= horizontal
+
+    flagged = edges.copy()
+    flagged[1:] |= edges[:-1]
+    flagged[:-1] |= edges[1:]
+
+    grown = flagged.copy()
+    grown[:, 1:] |= flagged[:, :-1]
+    grown[:, :-1] |= flagged[:, 1:]
+
+    return grown
+
+
+def map_tiles(function, tiles, workers=None, cache=None):
+    if workers is None or workers <= 1:
+        for tile in tiles:
+            function(tile)
+        return
+
+    if cache is not None and cache.max_resident_tiles is not None:
+        from .Exceptions import HandsomeException
+
+        raise HandsomeException(
+            'tiles of a bounded TileCache must be filled serially',
+            {
+                'workers'            : workers,
+                'max_resident_tiles' : cache.max_resident_tiles,
+            }
+        )
+
+    # ctypes releases the GIL around foreign calls, so tiles fill in parallel
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(function, tiles))
+
+
 def read_texture(path):
     from PIL import Image
     from .Pixel import FloatPixel
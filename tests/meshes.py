@@ -0,0 +1,28 @@
+from handsome.MicropolygonMesh import MicropolygonMesh
+
+import numpy as np
+
+# Builds a mesh of shape (rows, columns) cells. x, y, z and each channel of
+# color are either numbers or functions of the mesh coordinates u and v,
+# which run from 0 to 1 along the columns and from 1 down to 0 along the
+# rows.
+def make_mesh(shape, x, y, z=1, color=(0, 0, 0, 1)):
+    rows, columns = shape
+    mesh = MicropolygonMesh(shape)
+
+    u, v = np.meshgrid(np.linspace(0, 1, columns + 1), np.linspace(1, 0, rows + 1))
+
+    def evaluate(value):
+        return value(u, v) if callable(value) else value
+
+    position = mesh.buffer[:,:]['position']
+
+    position['x'] = evaluate(x)
+    position['y'] = evaluate(y)
+    position['z'] = evaluate(z)
+    position['w'] = 1
+
+    for channel, value in zip('RGBA', color):
+        mesh.buffer[:,:]['color'][channel] = evaluate(value)
+
+    return mesh
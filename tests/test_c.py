@@ -3,6 +3,8 @@ from handsome.Pixel import FloatPixel, array_view
 from handsome.capi import generate_numpy_begin, fill_micropolygon_mesh
 from handsome.util import color
 
+from .meshes import make_mesh
+
 from pathlib import Path
 
 import ctypes
@@ -58,10 +60,13 @@ def test_tile_render():
     black  = color(0, 0, 0, 1)
     zero   = color(0, 0, 0, 0)
 
-    mesh.buffer[:,:]['color'] = [
-        [ green, orange, ],
-        [ black, red, ],
-    ]
+    mesh.buffer[:,:]['color'] = np.array(
+        [
+            [ tuple(green), tuple(orange), ],
+            [ tuple(black), tuple(red), ],
+        ],
+        dtype=FloatPixel
+    )
 
     mesh_rows, mesh_columns = mesh.buffer.shape
 
@@ -75,7 +80,6 @@ def test_tile_render():
         generate_numpy_begin(mesh.bounds),
         tile_rows, tile_columns,
         tile.bounds,
-        generate_numpy_begin(tile.coordinate_image),
         generate_numpy_begin(tile.buffer),
     )
 
@@ -107,6 +111,99 @@ def test_tile_render():
         assert points_are_close(image(*index), c)
 
 
+def render_test_tile(fill, mesh, origin=(0, 0), shape=(32, 16), sample_rate=4):
+    mesh_rows, mesh_columns = mesh.buffer.shape
+
+    tile = Tile(origin, shape, sample_rate, FloatPixel)
+    tile_rows, tile_columns = tile.buffer.shape
+
+    fill(
+        mesh_rows, mesh_columns,
+        generate_numpy_begin(mesh.buffer),
+        generate_numpy_begin(mesh.bounds),
+        tile_rows, tile_columns,
+        tile.bounds,
+        generate_numpy_begin(tile.buffer),
+    )
+
+    return array_view(tile.buffer)
+
+
+def make_flat_mesh():
+    from handsome.MicropolygonMesh import MicropolygonMesh, Position
+
+    mesh = MicropolygonMesh((1, 1))
+
+    mesh.buffer[:,:]['position'] = np.array(
+        [
+            [ (16, 16, 1, 1), (32, 16, 1, 1) ],
+            [ (0, 0, 1, 1),   (16, 0, 1, 1) ],
+        ],
+        dtype=Position
+    )
+
+    mesh.buffer[:,:]['color'] = np.array(
+        [
+            [ tuple(color(0, 1, 0)), tuple(color(1, 1, 0)), ],
+            [ tuple(color(0, 0, 0)), tuple(color(1, 0, 0)), ],
+        ],
+        dtype=FloatPixel
+    )
+
+    return mesh
+
+
+def make_perspective_mesh():
+    def z(u, v):
+        return 1 + u + v * v
+
+    # Screen positions are x / z and y / z.
+    return make_mesh(
+        (3, 4),
+        x=lambda u, v: (1 + 11 * u + 2 * v * u) * z(u, v),
+        y=lambda u, v: (1 + 5 * v + u * u) * z(u, v),
+        z=z,
+        color=(lambda u, v: u, lambda u, v: v, 0, 1)
+    )
+
+
+def test_tile_render_batched():
+    from handsome.capi import fill_micropolygon_mesh_batched
+
+    mesh = make_flat_mesh()
+
+    expected = render_test_tile(fill_micropolygon_mesh, mesh)
+    actual = render_test_tile(fill_micropolygon_mesh_batched, mesh)
+
+    np.testing.assert_array_equal(expected[:,:,3], actual[:,:,3])
+    np.testing.assert_allclose(expected, actual, atol=1e-5)
+
+    # 39 x 21 samples leave a partial batch, and the varying depth runs the
+    # rational inverter rather than the affine one.
+    mesh = make_perspective_mesh()
+
+    expected = render_test_tile(fill_micropolygon_mesh, mesh, shape=(13, 7), sample_rate=3)
+    actual = render_test_tile(fill_micropolygon_mesh_batched, mesh, shape=(13, 7), sample_rate=3)
+
+    assert expected[:,:,3].any()
+    np.testing.assert_array_equal(expected[:,:,3], actual[:,:,3])
+    np.testing.assert_allclose(expected, actual, atol=1e-5)
+
+
+def test_tile_render_affine():
+    from handsome.capi import fill_micropolygon_mesh_affine
+
+    mesh = make_flat_mesh()
+    assert mesh.is_affine
+
+    expected = render_test_tile(fill_micropolygon_mesh, mesh)
+    actual = render_test_tile(fill_micropolygon_mesh_affine, mesh)
+
+    assert expected[:,:,3].any()
+    np.testing.assert_array_equal(expected[:,:,3], actual[:,:,3])
+    np.testing.assert_allclose(expected, actual, atol=1e-5)
+
+
 def build_test_so(tmpdir):
     from phillip.build import build_so, generate_extension_args, load_library
 
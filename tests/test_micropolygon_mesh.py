@@ -50,3 +50,143 @@ def test_bounds():
     assert mesh.bounds is not None
 
     print(mesh.bounds)
+
+
+def test_tile_bins():
+    mesh = MicropolygonMesh((1, 2))
+
+    mesh.buffer[:,:]['position'] = np.array(
+        [
+            [
+                (2, 2, 1, 1),
+                (12, 2, 1, 1),
+                (40, 2, 1, 1)
+            ],
+            [
+                (1, 1, 1, 1),
+                (12, 1, 1, 1),
+                (40, 1, 1, 1),
+            ]
+        ],
+        dtype=Position
+    )
+
+    bins = mesh.tile_bins((16, 16))
+
+    assert bins is mesh.tile_bins((16, 16))
+    assert (bins.columns, bins.rows) == (3, 1)
+
+    assert list(bins.get_cells((0, 0))) == [ 0, 1 ]
+    assert list(bins.get_cells((16, 0))) == [ 1 ]
+    assert list(bins.get_cells((32, 0))) == [ 1 ]
+    assert list(bins.get_cells((48, 0))) == [ ]
+
+    from handsome.capi import Rectangle
+
+    assert list(bins.origins()) == [ (0, 0), (16, 0), (32, 0) ]
+    assert list(bins.origins(Rectangle(10, -5, 33, 4))) == [ (0, 0), (16, 0), (32, 0) ]
+    assert list(bins.origins(Rectangle(16, 0, 32, 16))) == [ (16, 0) ]
+    assert list(bins.origins(Rectangle(48, 0, 96, 16))) == [ ]
+
+
+def test_is_affine():
+    mesh = MicropolygonMesh((1, 1))
+
+    mesh.buffer[:,:]['position'] = np.array(
+        [
+            [ (0, 4, 2, 1), (4, 4, 2, 1) ],
+            [ (0, 0, 2, 1), (4, 0, 2, 1) ],
+        ],
+        dtype=Position
+    )
+
+    assert mesh.is_affine
+
+    mesh = MicropolygonMesh((1, 1))
+
+    mesh.buffer[:,:]['position'] = np.array(
+        [
+            [ (0, 4, 2, 1), (4, 4, 2, 1) ],
+            [ (0, 0, 1, 1), (4, 0, 2, 1) ],
+        ],
+        dtype=Position
+    )
+
+    assert not mesh.is_affine
+
+
+def test_inverter_coefficients():
+    from handsome.capi import generate_numpy_begin, invert_sample, invert_sample_reference
+
+    mesh = MicropolygonMesh((1, 1))
+
+    mesh.buffer[:,:]['position'] = np.array(
+        [
+            [ (0, 2, 1, 1), (6, 6, 2, 1) ],
+            [ (0, 0, 1, 1), (4, 2, 2, 1) ],
+        ],
+        dtype=Position
+    )
+
+    coefficients = mesh.inverter_coefficients
+    assert coefficients.shape == (1, 1)
+
+    corners = np.ascontiguousarray(np.array([
+        mesh.buffer[1,0]['position'],
+        mesh.buffer[1,1]['position'],
+        mesh.buffer[0,0]['position'],
+        mesh.buffer[0,1]['position'],
+    ]))
+
+    coefficients_ptr = generate_numpy_begin(coefficients)
+    corners_ptr = generate_numpy_begin(corners)
+
+    for x in np.linspace(-.5, 3.5, 17):
+        for y in np.linspace(-.5, 3.5, 17):
+            actual = np.zeros((2, 3), dtype=np.float32)
+            expected = np.zeros((2, 3), dtype=np.float32)
+
+            actual_count = invert_sample(coefficients_ptr, x, y, generate_numpy_begin(actual))
+            expected_count = invert_sample_reference(corners_ptr, x, y, generate_numpy_begin(expected))
+
+            assert actual_count == expected_count
+
+            if actual_count:
+                np.testing.assert_allclose(actual[0], expected[0], atol=1e-4)
+
+
+def test_bounds_pyramid():
+    mesh = MicropolygonMesh((5, 3))
+
+    rng = np.random.default_rng(0)
+    positions = mesh.buffer[:,:]['position']
+
+    positions['x'] = rng.uniform(0, 32, positions.shape)
+    positions['y'] = rng.uniform(0, 32, positions.shape)
+    positions['z'] = 1
+    positions['w'] = 1
+
+    level = mesh.bounds
+    pyramid = mesh.bounds_pyramid
+    offset = 0
+
+    while level.shape != (1, 1):
+        rows, columns = (level.shape[0] + 1) // 2, (level.shape[1] + 1) // 2
+        expected = np.zeros((rows, columns), dtype=Position)
+
+        for i in range(rows):
+            for j in range(columns):
+                block = level[2 * i:2 * i + 2, 2 * j:2 * j + 2]
+                expected[i,j] = (
+                    block['x'].min(), block['y'].min(),
+                    block['z'].max(), block['w'].max()
+                )
+
+        actual = pyramid[offset:offset + rows * columns].reshape(rows, columns)
+        np.testing.assert_array_equal(actual, expected)
+
+        offset += rows * columns
+        level = expected
+
+    assert offset == len(pyramid)
+    assert mesh.bounds_pyramid is pyramid
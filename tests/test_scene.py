@@ -0,0 +1,95 @@
+from handsome.Pixel import FloatPixel, Pixel, array_view
+from handsome.Scene import bucket_meshes, render_scene, render_scene_buckets
+from handsome.Tile import Tile
+
+from .meshes import make_mesh
+
+import numpy as np
+
+def make_quad(left, bottom, right, top, color):
+    return make_mesh(
+        (2, 3),
+        x=lambda u, v: left + (right - left) * u + 2 * v,
+        y=lambda u, v: bottom + (top - bottom) * v,
+        color=color
+    )
+
+
+# Stands in for a sweatervest scene and its MeshExtractor, handing
+# render_scene the meshes directly over a canvas tile.
+class Scene:
+    def __init__(self, canvas):
+        self.data = { 'canvas' : canvas, 'top' : None }
+
+
+class Meshes:
+    def __init__(self, meshes):
+        self.meshes = meshes
+
+    def extract_meshes(self, top):
+        return iter(self.meshes)
+
+
+def make_canvas(sample_rate):
+    canvas = Tile((0, 0), (100, 70), sample_rate, FloatPixel)
+    canvas.buffer[:,:] = (0.25, 0.5, 0.75, 1)
+    return canvas
+
+
+# Meshes over one bucket, over several, and off the image, with the later
+# ones translucent so the compositing order shows.
+meshes = [
+    make_quad(3, 4, 20, 25, (1, 0, 0, 1)),
+    make_quad(10, 12, 75, 50, (0, 1, 0, .5)),
+    make_quad(60, 40, 99, 69, (0, 0, 1, .75)),
+    make_quad(140, 10, 160, 30, (1, 1, 1, 1)),
+]
+
+
+def test_bucket_meshes():
+    image = Tile((0, 0), (100, 70))
+    buckets = bucket_meshes(meshes, image, (32, 32))
+
+    # Every bucket over the image is listed, those at the right and top
+    # edges hanging off it.
+    assert set(buckets) == { (x, y) for x in (0, 32, 64, 96) for y in (0, 32, 64) }
+
+    assert buckets[(0, 0)] == [ 0, 1 ]
+    assert buckets[(32, 32)] == [ 1, 2 ]
+    assert buckets[(96, 64)] == [ 2 ]
+    assert buckets[(0, 64)] == [ ]
+
+    assert not any(3 in indices for indices in buckets.values())
+
+
+def test_render_scene_buckets(tmpdir):
+    from handsome.ImageWriter import open_image_writer
+
+    direct = render_scene(Scene(make_canvas(4)), 4, Meshes(meshes), direct=True)
+    expected = array_view(direct.downsample(1))
+
+    for bucket_shape in ((32, 32), (24, 40)):
+        scene = Scene(make_canvas(4))
+        out = render_scene_buckets(scene, 4, Meshes(meshes), bucket_shape, (8, 8))
+
+        assert out.sample_rate == 1
+        np.testing.assert_allclose(array_view(out.buffer), expected, atol=1e-6)
+
+    # Memory mapped output is written back to its file
+    path = str(tmpdir.join('buckets.raw'))
+    out = render_scene_buckets(Scene(make_canvas(4)), 4, Meshes(meshes), (32, 32), path=path)
+
+    np.testing.assert_allclose(array_view(out.buffer), expected, atol=1e-6)
+
+    written = np.fromfile(path, dtype=np.float32).reshape(expected.shape)
+    np.testing.assert_allclose(written, expected, atol=1e-6)
+
+    # With a writer, the rows of buckets are resolved to Pixels and
+    # streamed out, and nothing is returned
+    path = str(tmpdir.join('buckets.npy'))
+
+    with open_image_writer(path, 100, 70) as writer:
+        assert render_scene_buckets(Scene(make_canvas(4)), 4, Meshes(meshes), (32, 32), writer=writer) is None
+
+    pixels = array_view(direct.downsample_to_pixels(1))
+    np.testing.assert_array_equal(np.load(path), pixels)
@@ -61,3 +61,280 @@ def test_downsample():
 
     actual = tile.downsample(1)
     np.testing.assert_array_equal(expected, array_view(actual))
+
+
+def test_composite_from():
+    rng = np.random.default_rng(0)
+
+    for premultiplied in (False, True):
+        target = Tile((0, 0), (8, 4), 2, FloatPixel)
+        source = Tile((3, 1), (8, 4), 2, FloatPixel)
+
+        array_view(target.buffer)[:] = rng.random((8, 16, 4), dtype=np.float32)
+        array_view(source.buffer)[:] = rng.random((8, 16, 4), dtype=np.float32)
+        source.buffer[:2,:5]['A'] = 0
+
+        before = array_view(target.buffer).copy()
+
+        target.composite_from(source, premultiplied)
+
+        # The tiles overlap on x in [3, 8), y in [1, 4)
+        s = array_view(source.buffer)[2:, :10]
+        t = before[:6, 6:]
+        alpha = s[..., 3:]
+
+        if premultiplied:
+            expected = s + (1 - alpha) * t
+        else:
+            expected = (1 - alpha) * t + alpha * s
+
+        actual = array_view(target.buffer)
+
+        np.testing.assert_allclose(actual[:6, 6:], expected, rtol=1e-6)
+        np.testing.assert_array_equal(actual[6:], before[6:])
+        np.testing.assert_array_equal(actual[:, :6], before[:, :6])
+
+
+def test_downsample_coverage():
+    tile = Tile((0, 0), (4, 4), dtype=FloatPixel, sample_rate=2)
+    tile.coverage_buffer
+
+    assert tile.is_empty
+    assert tile.dirty_slice is None
+    assert not tile.is_resident
+
+    out = tile.downsample(1)
+    assert not tile.is_resident
+    assert (array_view(out) == 0).all()
+
+    tile.buffer[3:5, 2:7]['R'] = 1
+    tile.coverage_buffer[:] = (3, 5, 2, 7)
+
+    clipped = array_view(tile.downsample(1)).copy()
+
+    tile.mark_dirty()
+    full = array_view(tile.downsample(1))
+
+    np.testing.assert_array_equal(clipped, full)
+
+
+def test_composite_into_empty_fill():
+    from handsome.TileCache import TileCache
+
+    source = Tile((2, 0), (4, 4), 2, dtype=FloatPixel)
+    source.buffer[:,:] = (1, 1, 1, 1)
+
+    # A fill that wrote no samples leaves the tile covering nothing
+    cache = TileCache((4, 4), 2, FloatPixel)
+    tile = cache.get_tile((0, 0))
+    tile.coverage_buffer
+
+    assert tile.dirty_slice is None
+
+    tile.composite_from(source)
+
+    assert tile.dirty_slice == np.s_[0:8, 4:8]
+    assert array_view(tile.buffer)[..., 0].sum() == 32
+
+    np.testing.assert_array_equal(
+        array_view(tile.downsample(1))[..., 0],
+        [ [ 0, 0, 1, 1 ] ] * 4
+    )
+
+    canvas = Tile((0, 0), (4, 4), 2, dtype=FloatPixel)
+    cache.composite_into(canvas)
+
+    assert array_view(canvas.buffer)[..., 0].sum() == 32
+
+
+def test_file_backed_tile(tmpdir):
+    from handsome.TileCache import TileCache
+
+    path = str(tmpdir / 'canvas.bin')
+
+    canvas = Tile((0, 0), (48, 40), 2, FloatPixel, path=path)
+    expected = Tile((0, 0), (48, 40), 2, FloatPixel)
+
+    for tile in (canvas, expected):
+        for band in tile.row_bands(band_bytes=1000):
+            tile.buffer[band] = (0, 0, 1, 1)
+
+    cache = TileCache((16, 16), 2, FloatPixel)
+
+    for k in range(4):
+        source = cache.get_tile((12 * k, 9 * k))
+        source.buffer[:,:] = (k / 4, 1, 0, .5)
+
+    cache.composite_into(canvas)
+    cache.composite_into(expected)
+
+    np.testing.assert_array_equal(canvas.buffer, expected.buffer)
+    np.testing.assert_array_equal(canvas.downsample(1), expected.downsample(1))
+
+    canvas.release()
+
+    reopened = Tile((0, 0), (48, 40), 2, FloatPixel, path=path)
+    np.testing.assert_array_equal(reopened.buffer, expected.buffer)
+
+
+def test_half_tiles():
+    from handsome.Pixel import HalfPixel
+
+    rng = np.random.default_rng(1)
+
+    target = Tile((0, 0), (8, 4), 2, FloatPixel)
+    half_target = Tile((0, 0), (8, 4), 2, HalfPixel)
+    source = Tile((3, 1), (8, 4), 2, HalfPixel)
+
+    array_view(target.buffer)[:] = rng.random((8, 16, 4), dtype=np.float32)
+    array_view(half_target.buffer)[:] = array_view(target.buffer)
+    array_view(source.buffer)[:] = rng.random((8, 16, 4), dtype=np.float32)
+
+    expected = Tile((3, 1), (8, 4), 2, FloatPixel)
+    array_view(expected.buffer)[:] = array_view(source.buffer)
+
+    float_target = Tile((0, 0), (8, 4), 2, FloatPixel)
+    array_view(float_target.buffer)[:] = array_view(half_target.buffer)
+    float_target.composite_from(expected)
+
+    # Half sources blend into float targets exactly as their float values
+    # would, and half targets round the float result once.
+    target_copy = array_view(target.buffer).copy()
+    target.composite_from(source)
+
+    reference = Tile((0, 0), (8, 4), 2, FloatPixel)
+    array_view(reference.buffer)[:] = target_copy
+    reference.composite_from(expected)
+
+    np.testing.assert_array_equal(target.buffer, reference.buffer)
+
+    half_target.composite_from(source)
+
+    np.testing.assert_array_equal(
+        array_view(half_target.buffer),
+        array_view(float_target.buffer).astype(np.float16)
+    )
+
+    out = half_target.downsample(1)
+    assert out.dtype == HalfPixel
+
+    float_target.buffer[:] = half_target.buffer.astype(FloatPixel)
+    expected_out = array_view(float_target.downsample(1)).astype(np.float16)
+
+    np.testing.assert_array_equal(array_view(out), expected_out)
+
+
+def test_downsample_filters():
+    from handsome.filters import FILTERS, filter_taps
+
+    rng = np.random.default_rng(2)
+
+    tile = Tile((0, 0), (7, 5), dtype=FloatPixel, sample_rate=3)
+    samples = rng.random((15, 21, 4), dtype=np.float32)
+    array_view(tile.buffer)[:] = samples
+
+    def reference(samples, weights, first, step, axis):
+        samples = np.moveaxis(samples.astype(np.float64), axis, 0)
+        out = [ ]
+
+        for o in range(samples.shape[0] // step):
+            offsets = o * step + first + np.arange(len(weights))
+            inside = (offsets >= 0) & (offsets < samples.shape[0])
+            w = weights[inside] / weights[inside].sum()
+
+            out.append(np.tensordot(w, samples[offsets[inside]], axes=1))
+
+        return np.moveaxis(np.array(out), 0, axis)
+
+    for name in FILTERS:
+        for radius in (None, 1.):
+            weights, first = filter_taps(name, 3, radius)
+
+            expected = reference(samples, weights.astype(np.float64), first, 3, 1)
+            expected = reference(expected, weights.astype(np.float64), first, 3, 0)
+
+            actual = array_view(tile.downsample(1, filter=name, radius=radius))
+
+            assert actual.shape == (5, 7, 4)
+            np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-6)
+
+    # Filters keep flat regions flat, edges included
+    array_view(tile.buffer)[:] = .5
+
+    for name in FILTERS:
+        np.testing.assert_allclose(array_view(tile.downsample(1, filter=name)), .5, rtol=1e-6)
+
+
+def test_downsample_threads(tmpdir):
+    from handsome.Pixel import HalfPixel
+
+    rng = np.random.default_rng(3)
+    samples = rng.random((64, 96, 4), dtype=np.float32)
+
+    for k, dtype in enumerate((FloatPixel, HalfPixel)):
+        for path in (None, str(tmpdir.join('tile_{}.raw'.format(k)))):
+            tile = Tile((0, 0), (24, 16), 4, dtype=dtype, path=path)
+            array_view(tile.buffer)[:] = samples
+
+            for name in ('box', 'lanczos'):
+                serial = tile.downsample(1, filter=name)
+                threaded = tile.downsample(1, filter=name, threads=3)
+
+                np.testing.assert_array_equal(serial, threaded)
+
+            tile.release()
+
+
+def test_downsample_to_pixels():
+    from handsome.Exceptions import HandsomeException
+    from handsome.Pixel import HalfPixel, Pixel
+    import pytest
+
+    rng = np.random.default_rng(4)
+    samples = rng.random((32, 48, 4), dtype=np.float32) * 1.4 - .2
+
+    for dtype in (FloatPixel, HalfPixel):
+        tile = Tile((0, 0), (12, 8), 4, dtype=dtype)
+        array_view(tile.buffer)[:] = samples
+
+        for name in ('box', 'mitchell'):
+            # The separable box, as downsample_to_pixels uses
+            radius = .5 if name == 'box' else None
+
+            linear = array_view(tile.downsample(1, filter=name, radius=radius))
+            linear = np.clip(linear, 0, 1).astype(np.float64)
+
+            encoded = linear.copy()
+            encoded[..., :3] = np.where(
+                linear[..., :3] <= 0.0031308,
+                12.92 * linear[..., :3],
+                1.055 * linear[..., :3] ** (1 / 2.4) - 0.055
+            )
+
+            for srgb, expected in ((False, linear), (True, encoded)):
+                pixels = tile.downsample_to_pixels(1, filter=name, srgb=srgb)
+
+                assert pixels.dtype == Pixel
+                difference = array_view(pixels).astype(int) - np.floor(255 * expected + .5)
+
+                assert np.abs(difference).max() <= 1
+
+    # A flat value dithers to its two nearest bytes, in proportion
+    tile = Tile((0, 0), (16, 16), 1, dtype=FloatPixel)
+    tile.buffer[:,:] = (.3, .3, .3, 1)
+
+    dithered = array_view(tile.downsample_to_pixels(1, dither=True))
+
+    assert set(np.unique(dithered[..., 0])) == { 76, 77 }
+    assert abs(dithered[..., 0].mean() - 76.5) < .05
+    assert (dithered[..., 3] == 255).all()
+
+    # Rows outside the output are refused
+    for rows in ((0, 17), (-3, 4), (5, 2)):
+        with pytest.raises(HandsomeException):
+            tile.downsample_to_pixels(1, rows=rows)
+
+    np.testing.assert_array_equal(
+        array_view(tile.downsample_to_pixels(1, dither=True, rows=(3, 16))),
+        dithered[3:]
+    )
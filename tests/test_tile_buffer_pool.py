@@ -0,0 +1,106 @@
+from handsome.Exceptions import HandsomeException
+from handsome.Pixel import FloatPixel
+from handsome.Tile import Tile
+from handsome.TileBufferPool import TileBufferPool
+from handsome.TileCache import TileCache
+
+import pytest
+
+def test_release_reuses_buffer():
+    pool = TileBufferPool()
+
+    tile = Tile((0, 0), (16, 16), 4, FloatPixel, pool)
+    tile.buffer[:,:]['R'] = 1
+    address = tile.buffer.ctypes.data
+
+    tile.release()
+
+    other = Tile((16, 0), (16, 16), 4, FloatPixel, pool)
+
+    assert other.buffer.ctypes.data == address
+    assert (other.buffer['R'] == 0).all()
+
+
+def test_stats():
+    tile_bytes = 64 * 64 * FloatPixel.itemsize
+    pool = TileBufferPool(slab_size=2 * tile_bytes)
+
+    cache = TileCache((16, 16), 4, FloatPixel, pool)
+
+    for x in range(3):
+        cache.get_tile((16 * x, 0)).buffer
+
+    assert pool.stats() == {
+        'bytes_in_use' : 3 * tile_bytes,
+        'bytes_free'   : tile_bytes,
+        'slab_count'   : 2,
+    }
+
+    cache.clear()
+
+    assert cache.tiles == { }
+    assert pool.stats() == {
+        'bytes_in_use' : 0,
+        'bytes_free'   : 4 * tile_bytes,
+        'slab_count'   : 2,
+    }
+
+    pool.trim()
+
+    assert pool.stats()['slab_count'] == 0
+
+
+def test_max_bytes():
+    tile_bytes = 64 * 64 * FloatPixel.itemsize
+    pool = TileBufferPool(slab_size=tile_bytes, max_bytes=2 * tile_bytes)
+
+    tiles = [ Tile((16 * x, 0), (16, 16), 4, FloatPixel, pool) for x in range(3) ]
+
+    tiles[0].buffer
+    tiles[1].buffer
+
+    with pytest.raises(HandsomeException):
+        tiles[2].buffer
+
+    tiles[0].release()
+    tiles[2].buffer
+
+    assert pool.stats()['slab_count'] == 2
+
+
+def test_collected_tiles_return_buffers():
+    import gc
+
+    pool = TileBufferPool()
+
+    cache = TileCache((16, 16), 4, FloatPixel, pool)
+
+    for x in range(3):
+        cache.get_tile((16 * x, 0)).buffer
+
+    assert pool.stats()['bytes_in_use'] > 0
+
+    del cache
+    gc.collect()
+
+    assert pool.stats()['bytes_in_use'] == 0
+
+    # A buffer still referenced keeps its slot after its tile is collected
+    def make_buffer():
+        tile = Tile((0, 0), (16, 16), 4, FloatPixel, pool)
+        return tile.buffer['R'][:4]
+
+    kept = make_buffer()
+    gc.collect()
+
+    assert pool.stats()['bytes_in_use'] > 0
+
+    other = Tile((16, 0), (16, 16), 4, FloatPixel, pool)
+    other.buffer[:,:]['R'] = 7
+
+    assert (kept == 0).all()
+
+    del kept, other
+    gc.collect()
+
+    assert pool.stats()['bytes_in_use'] == 0
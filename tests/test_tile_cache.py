@@ -0,0 +1,98 @@
+from handsome.Pixel import FloatPixel
+from handsome.TileBufferPool import TileBufferPool
+from handsome.TileCache import TileCache
+
+import os
+
+def test_spill_to_disk(tmpdir):
+    pool = TileBufferPool()
+    cache = TileCache(
+        (16, 16), 4, FloatPixel, pool,
+        max_resident_tiles=2, scratch_directory=str(tmpdir)
+    )
+
+    for k in range(5):
+        cache.get_tile((16 * k, 0)).buffer[:,:]['R'] = k + 1
+
+    resident = [ tile.is_resident for tile in cache.tiles.values() ]
+    assert resident.count(True) == 2
+
+    path = cache.spill_file.path
+    assert os.path.dirname(path) == str(tmpdir)
+
+    for k in range(5):
+        tile = cache.get_tile((16 * k, 0))
+        assert (tile.buffer['R'] == k + 1).all()
+
+    cache.clear()
+
+    assert not os.path.exists(path)
+    assert pool.stats()['bytes_in_use'] == 0
+
+
+def test_spilled_tiles_stay_bounded(tmpdir):
+    pool = TileBufferPool()
+    cache = TileCache(
+        (16, 16), 4, FloatPixel, pool,
+        max_resident_tiles=2, scratch_directory=str(tmpdir)
+    )
+
+    for k in range(5):
+        tile = cache.get_tile((16 * k, 0))
+        tile.buffer[:,:]['R'] = k + 1
+        tile.depth_buffer[:,:] = k
+
+    tiles = list(cache.tiles.values())
+
+    # Touching buffers directly, rather than through get_tile, still pages
+    # tiles in and out within the bound.
+    for k, tile in enumerate(tiles):
+        assert (tile.buffer['R'] == k + 1).all()
+        assert (tile.depth_buffer == k).all()
+
+        resident = [ tile.is_resident for tile in tiles ]
+        assert resident.count(True) <= 2
+
+    cache.clear()
+
+    assert pool.stats()['bytes_in_use'] == 0
+
+
+def test_tile_orders():
+    from handsome.Exceptions import HandsomeException
+    from handsome.capi import Rectangle
+    from handsome.tile_order import TILE_ORDERS
+    import pytest
+
+    bounds = Rectangle(-20, 3, 90, 70)
+    expected = None
+
+    for order in TILE_ORDERS:
+        cache = TileCache((16, 8), 1, FloatPixel, tile_order=order)
+        origins = [ tile.origin for tile in cache.get_tiles_for_bounds(bounds) ]
+
+        # Every order visits the same tiles, once each
+        assert len(set(origins)) == len(origins)
+
+        if expected is None:
+            expected = sorted(origins)
+
+        assert sorted(origins) == expected
+
+        if order == 'hilbert':
+            # Consecutive tiles of the Hilbert curve share an edge, inside
+            # the square grid the curve covers.
+            steps = [
+                abs(a[0] - b[0]) // 16 + abs(a[1] - b[1]) // 8
+                for a, b in zip(origins, origins[1:])
+            ]
+
+            assert steps.count(1) > .8 * len(steps)
+
+    cache = TileCache((16, 8), 1, FloatPixel, tile_order='columns')
+    origins = [ tile.origin for tile in cache.get_tiles_for_bounds(bounds) ]
+
+    assert origins == sorted(origins)
+
+    with pytest.raises(HandsomeException):
+        TileCache((16, 8), 1, FloatPixel, tile_order='spiral').order_origins([ (0, 0), (16, 0) ])
@@ -1,5 +1,7 @@
 from handsome.util import parse_color
 
+from .meshes import make_mesh
+
 def test_parse_color():
     tests = [
         ('#f00',      (255, 0, 0, 255)),
@@ -14,3 +16,378 @@ def test_parse_color():
 
     for input, expected in tests:
         assert parse_color(input) == expected
+
+
+def test_render_mesh_workers():
+    from handsome.util import render_mesh
+    import numpy as np
+
+    mesh = make_mesh(
+        (4, 4),
+        x=lambda u, v: 4 + 56 * u + 8 * v,
+        y=lambda u, v: 2 + 44 * v,
+        color=(lambda u, v: u, lambda u, v: v, 0, 1)
+    )
+
+    serial = render_mesh(mesh)
+    threaded = render_mesh(mesh, workers=4)
+
+    assert serial.tiles.keys() == threaded.tiles.keys()
+
+    for origin, tile in serial.tiles.items():
+        np.testing.assert_array_equal(tile.buffer, threaded.tiles[origin].buffer)
+
+
+def test_render_mesh_depth():
+    from handsome.util import render_mesh
+    import numpy as np
+
+    def make_quad(z, red):
+        return make_mesh(
+            (1, 1),
+            x=lambda u, v: z * (4 + 24 * u),
+            y=lambda u, v: z * (4 + 24 * v),
+            z=z,
+            color=(red, 0, 0, 1)
+        )
+
+    near, far = make_quad(2, 1), make_quad(3, .5)
+
+    cache = render_mesh(near, depth=True)
+    render_mesh(far, cache=cache, depth=True)
+
+    tile = cache.get_tile((16, 16))
+    covered = tile.buffer['A'] > 0
+
+    assert covered.any()
+    np.testing.assert_array_equal(tile.buffer['R'][covered], 1)
+    np.testing.assert_array_equal(tile.depth_buffer[covered], 2)
+
+
+def test_render_meshes():
+    from handsome.util import render_mesh, render_meshes
+    import numpy as np
+
+    def make_quad(k):
+        left, bottom = 3 + 13 * k, 2 + 7 * (k % 3)
+
+        return make_mesh(
+            (1, 1),
+            x=lambda u, v: left + 9 * u + 2 * v,
+            y=lambda u, v: bottom + 6 * v,
+            color=(lambda u, v: u, k / 6, 0, 1)
+        )
+
+    meshes = [ make_quad(k) for k in range(6) ]
+
+    batch = render_meshes(meshes)
+
+    for mesh in meshes:
+        single = render_mesh(mesh)
+
+        for origin, tile in single.tiles.items():
+            covered = tile.buffer['A'] > 0
+
+            if not covered.any():
+                continue
+
+            np.testing.assert_array_equal(
+                batch.tiles[origin].buffer[covered],
+                tile.buffer[covered]
+            )
+
+
+def test_render_mesh_to_canvas():
+    from handsome.Pixel import FloatPixel
+    from handsome.Tile import Tile
+    from handsome.util import render_mesh, render_mesh_to_canvas
+    import numpy as np
+
+    def make_strip(k):
+        return make_mesh(
+            (2, 3),
+            x=lambda u, v: -5 + 11 * k + 30 * u + 3 * v,
+            y=lambda u, v: 4 + 20 * v,
+            color=(lambda u, v: u, 0, k / 3, 0.5)
+        )
+
+    meshes = [ make_strip(k) for k in range(3) ]
+
+    expected = Tile((0, 0), (40, 24), 4, dtype=FloatPixel)
+    direct = Tile((0, 0), (40, 24), 4, dtype=FloatPixel)
+
+    for canvas in (expected, direct):
+        canvas.buffer[:,:] = (0.25, 0.5, 0.75, 1)
+
+    for mesh in meshes:
+        cache = render_mesh(mesh)
+        cache.composite_into(expected)
+        cache.clear()
+
+        render_mesh_to_canvas(mesh, direct)
+
+    np.testing.assert_allclose(
+        direct.buffer.view(np.float32),
+        expected.buffer.view(np.float32),
+        rtol=1e-6
+    )
+
+
+def test_render_meshes_pyramid():
+    from handsome.util import render_mesh, render_meshes
+    import numpy as np
+
+    # Meshes this large are culled through their bounds pyramids, and the
+    # folds make cells overlap, so the fill order of cells is visible.
+    for rows, columns, z in ((37, 53, 1), (9, 120, 2)):
+        def depth(u, v):
+            return z + u * (z - 1)
+
+        mesh = make_mesh(
+            (rows, columns),
+            x=lambda u, v: (4 + 50 * u + 12 * np.sin(9 * v)) * depth(u, v),
+            y=lambda u, v: (3 + 30 * v + 10 * np.sin(11 * u)) * depth(u, v),
+            z=depth,
+            color=(lambda u, v: u, lambda u, v: v, 0, 1)
+        )
+
+        single = render_mesh(mesh)
+        batch = render_meshes([ mesh ])
+
+        for origin, tile in single.tiles.items():
+            if origin not in batch.tiles:
+                assert not tile.buffer['A'].any()
+                continue
+
+            np.testing.assert_array_equal(batch.tiles[origin].buffer, tile.buffer)
+
+
+def test_render_mesh_cache_mismatch():
+    from handsome.Exceptions import HandsomeException
+    from handsome.MicropolygonMesh import MicropolygonMesh
+    from handsome.Pixel import FloatPixel
+    from handsome.TileCache import TileCache
+    from handsome.util import render_mesh
+    import pytest
+
+    mesh = MicropolygonMesh((1, 1))
+    mesh.buffer[:,:]['position'] = (1, 1, 1, 1)
+
+    cache = TileCache((16, 16), 2, FloatPixel)
+
+    with pytest.raises(HandsomeException):
+        render_mesh(mesh, sample_rate=4, cache=cache)
+
+    with pytest.raises(HandsomeException):
+        render_mesh(mesh, tile_shape=(32, 32), sample_rate=2, cache=cache)
+
+    render_mesh(mesh, sample_rate=2, cache=cache)
+
+
+def test_render_mesh_coverage():
+    from handsome.Pixel import FloatPixel
+    from handsome.Tile import Tile
+    from handsome.util import render_mesh
+    import numpy as np
+
+    # A thin diagonal strip leaves most tiles of its bounds untouched.
+    mesh = make_mesh(
+        (1, 40),
+        x=lambda u, v: 2 + 90 * u + v,
+        y=lambda u, v: 3 + 60 * u + v,
+        color=(0, 1, 0, 1)
+    )
+
+    cache = render_mesh(mesh)
+
+    assert len(cache.tiles) < 6 * 4
+
+    for tile in cache.tiles.values():
+        covered = np.argwhere(tile.buffer['A'] > 0)
+
+        if not len(covered):
+            continue
+
+        row_begin, row_end, column_begin, column_end = tile.coverage_buffer
+
+        assert (covered[:,0] >= row_begin).all() and (covered[:,0] < row_end).all()
+        assert (covered[:,1] >= column_begin).all() and (covered[:,1] < column_end).all()
+
+    clipped = Tile((0, 0), (100, 70), 4, FloatPixel)
+    full = Tile((0, 0), (100, 70), 4, FloatPixel)
+
+    cache.composite_into(clipped)
+
+    for tile in cache.tiles.values():
+        tile.mark_dirty()
+
+    cache.composite_into(full)
+
+    np.testing.assert_array_equal(clipped.buffer, full.buffer)
+    np.testing.assert_array_equal(
+        clipped.downsample(1).view(np.float32),
+        full.downsample(1).view(np.float32)
+    )
+
+
+def test_render_mesh_half():
+    from handsome.Exceptions import HandsomeException
+    from handsome.Pixel import HalfPixel, Pixel
+    from handsome.Tile import Tile
+    from handsome.TileCache import TileCache
+    from handsome.util import render_mesh, render_mesh_to_canvas, render_meshes
+    import numpy as np
+    import pytest
+
+    mesh = make_mesh(
+        (3, 4),
+        x=lambda u, v: 3 + 40 * u + 5 * v * v,
+        y=lambda u, v: 2 + 30 * v,
+        color=(lambda u, v: u, lambda u, v: v, 0, 0.75)
+    )
+
+    for batched in (False, True):
+        full = render_mesh(mesh, batched=batched)
+        half = render_mesh(mesh, batched=batched, dtype=HalfPixel)
+        meshes = render_meshes([ mesh ], batched=batched, dtype=HalfPixel)
+
+        assert full.tiles.keys() == half.tiles.keys()
+
+        for origin, tile in meshes.tiles.items():
+            expected = full.get_tile(origin).buffer.view(np.float32).astype(np.float16)
+
+            assert tile.buffer.dtype == half.get_tile(origin).buffer.dtype == HalfPixel
+            np.testing.assert_array_equal(half.get_tile(origin).buffer.view(np.float16), expected)
+            np.testing.assert_array_equal(tile.buffer.view(np.float16), expected)
+
+    canvas = Tile((0, 0), (48, 32), 4, dtype=HalfPixel)
+    canvas.buffer[:,:] = (0.25, 0.5, 0.75, 1)
+
+    expected = Tile((0, 0), (48, 32), 4, dtype=HalfPixel)
+    expected.buffer[:,:] = (0.25, 0.5, 0.75, 1)
+
+    render_mesh(mesh).composite_into(expected)
+    render_mesh_to_canvas(mesh, canvas)
+
+    np.testing.assert_array_equal(canvas.buffer, expected.buffer)
+
+    with pytest.raises(HandsomeException):
+        render_mesh(mesh, cache=TileCache((16, 16), 4, Pixel))
+
+
+def test_save_tile_as_image(tmpdir):
+    from handsome.ImageWriter import open_image_writer
+    from handsome.Pixel import FloatPixel, Pixel, array_view
+    from handsome.Tile import Tile
+    from handsome.util import save_tile_as_image
+    from PIL import Image
+    import numpy as np
+
+    rng = np.random.default_rng(5)
+
+    tile = Tile((0, 0), (37, 29), 2, dtype=FloatPixel)
+    array_view(tile.buffer)[:] = rng.random((58, 74, 4), dtype=np.float32)
+
+    expected = array_view(tile.downsample_to_pixels(1))
+
+    for extension in ('png', 'tiff'):
+        for mode in ('RGBA', 'RGB'):
+            path = str(tmpdir.join('tile_{}.{}'.format(mode, extension)))
+            save_tile_as_image(tile, path, mode, band_rows=7)
+
+            image = np.asarray(Image.open(path))
+            np.testing.assert_array_equal(image, expected[..., :len(mode)])
+
+    # Bands of any height make whole strips
+    path = str(tmpdir.join('bands.tiff'))
+    pixels = np.ascontiguousarray(expected).view(Pixel)[..., 0]
+
+    with open_image_writer(path, 37, 29, background=True) as writer:
+        for begin, end in ((0, 5), (5, 7), (7, 20), (20, 29)):
+            writer.write_rows(pixels[begin:end])
+
+    np.testing.assert_array_equal(np.asarray(Image.open(path)), expected)
+
+
+def test_raw_image_writers(tmpdir):
+    from handsome.ImageWriter import open_image_writer
+    from handsome.Pixel import Pixel
+    from handsome.util import save_array_as_image
+    from PIL import Image
+    import io
+    import numpy as np
+
+    rng = np.random.default_rng(7)
+
+    # An odd width, so 24 bit BMP rows need padding
+    channels = rng.integers(0, 256, (29, 37, 4), dtype=np.uint8)
+    pixels = channels.view(Pixel)[..., 0]
+
+    for extension, mode in (('bmp', 'RGBA'), ('bmp', 'RGB'), ('ppm', 'RGB')):
+        path = str(tmpdir.join('pixels_{}.{}'.format(mode, extension)))
+        save_array_as_image(pixels, path, mode)
+
+        image = Image.open(path)
+        assert image.mode == mode
+        np.testing.assert_array_equal(np.asarray(image), channels[..., :len(mode)])
+
+    for mode in ('RGBA', 'RGB'):
+        path = str(tmpdir.join('pixels_{}.npy'.format(mode)))
+        save_array_as_image(pixels, path, mode)
+
+        np.testing.assert_array_equal(np.load(path), channels[..., :len(mode)])
+
+    # A PAM written in bands to a file object, as to a pipe
+    stream = io.BytesIO()
+
+    with open_image_writer(stream, 37, 29, 'RGBA', background=True, format='pam') as writer:
+        writer.write_rows(pixels[:10])
+        writer.write_rows(pixels[10:])
+
+    data = stream.getvalue()
+    header, body = data.split(b'ENDHDR\n')
+
+    assert header == b'P7\nWIDTH 37\nHEIGHT 29\nDEPTH 4\nMAXVAL 255\nTUPLTYPE RGB_ALPHA\n'
+    assert body == channels.tobytes()
+
+
+def test_render_meshes_adaptive():
+    from handsome.Pixel import FloatPixel, array_view
+    from handsome.Tile import Tile
+    from handsome.util import render_meshes, render_meshes_adaptive
+    import numpy as np
+
+    def make_rectangle(left, bottom, right, top, color):
+        return make_mesh(
+            (1, 1),
+            x=lambda u, v: left + (right - left) * u,
+            y=lambda u, v: bottom + (top - bottom) * v,
+            color=color
+        )
+
+    meshes = [
+        make_rectangle(10.3, 6.6, 150.8, 100.2, (1, 0, 0, 1)),
+        make_rectangle(80.5, 60.25, 180.4, 121.7, (0, .5, 1, .5)),
+    ]
+
+    def make_canvas(sample_rate):
+        canvas = Tile((0, 0), (192, 128), sample_rate, FloatPixel)
+        array_view(canvas.buffer)[:] = (1, 1, 1, 1)
+        return canvas
+
+    full = make_canvas(4)
+    render_meshes(meshes, (16, 16), 4).composite_into(full)
+    expected = array_view(full.downsample(1))
+
+    for base_rate in (1, 2):
+        canvas = make_canvas(1)
+        origins = render_meshes_adaptive(meshes, canvas, (8, 8), base_rate, 4)
+
+        # Only the tiles along the edges are sampled at the full rate
+        assert 0 < len(origins) < (192 // 8) * (128 // 8) // 2
+
+        np.testing.assert_allclose(array_view(canvas.buffer), expected, atol=1e-6)
+
+    canvas = make_canvas(1)
+    assert render_meshes_adaptive([ ], canvas) == [ ]
+    assert (array_view(canvas.buffer) == 1).all()